@@ -1,5 +1,17 @@
 # Assembler: Converts RISC-V assembly to binary
 
+import os
+import re
+import sys
+import zlib
+import pickle
+import hashlib
+import operator
+from array import array
+from collections import deque
+from itertools import chain, compress, islice
+from concurrent.futures import ProcessPoolExecutor
+
 # Dictionary for register mapping 
 # Each register has a 5-bit binary code used instruction 
 registers = {
@@ -36,271 +48,700 @@ registers = {
     "t5": "11110",
     "t6": "11111"
     }
-# Dictionary for opcode mapping 
-# Each instruction type (R, I, S, B, U) has a different opcode used 
-opcodes = {
-    "add": "0110011",
-    "sub": "0110011",
-    "slt": "0110011",
-    "srl": "0110011",
-    "or": "0110011",
-    "and": "0110011",
-    "lw": "0000011",
-    "addi": "0010011",
-    "jalr": "1100111",
-    "sw": "0100011",
-    "beq": "1100011",
-    "bne": "1100011",
-    "blt": "1100011",
-    "jal": "1101111"
-    }
 
-# Function to convert register name to binary
-# Returns a 5-bit binary representation of the register name
-def regis_to_bi(name):
-    if name in registers:
-        return registers[name]
-    else:
-        return "00000"
-def i_type(parts):
-    if len(parts) != 4:
-        return "ERROR"
-    rd, rs1, imm = regis_to_bi(parts[1]), regis_to_bi(parts[2]), format(int(parts[3]), "012b")
-    funct3 = "000"
-    return imm + rs1 + funct3 + rd + opcodes[parts[0]]
-def assemble(liners):
-    parts = liners.replace(",", "").split()
+
+# ===== TABLE-DRIVEN ENCODER =====
+# Instructions are built as integers with shifts and masks and only turned
+# into a binary string at output time.
+
+# Instruction spec table: mnemonic -> (format, opcode, funct3, funct7)
+SPECS = {
+    "add":  ("R", 0b0110011, 0b000, 0b0000000),
+    "sub":  ("R", 0b0110011, 0b000, 0b0100000),
+    "slt":  ("R", 0b0110011, 0b010, 0b0000000),
+    "sltu": ("R", 0b0110011, 0b011, 0b0000000),
+    "xor":  ("R", 0b0110011, 0b100, 0b0000000),
+    "srl":  ("R", 0b0110011, 0b101, 0b0000000),
+    "or":   ("R", 0b0110011, 0b110, 0b0000000),
+    "and":  ("R", 0b0110011, 0b111, 0b0000000),
+    "addi": ("I", 0b0010011, 0b000, 0),
+    "lw":   ("I", 0b0000011, 0b010, 0),
+    "jalr": ("I", 0b1100111, 0b000, 0),
+    "sw":   ("S", 0b0100011, 0b010, 0),
+    "beq":  ("B", 0b1100011, 0b000, 0),
+    "bne":  ("B", 0b1100011, 0b001, 0),
+    "jal":  ("J", 0b1101111, 0, 0),
+}
+
+# Register numbers by ABI name (from the registers table), by xN name and
+# by the rN names the original encoders accepted
+REG_NUMBERS = {name: int(code, 2) for name, code in registers.items()}
+REG_NUMBERS.update((f"x{i}", i) for i in range(32))
+REG_NUMBERS.update((f"r{i}", i) for i in range(32))
+
+
+def reg_number(tok):
+    if tok not in REG_NUMBERS:
+        raise ValueError(f"Invalid register '{tok}'")
+    return REG_NUMBERS[tok]
+
+
+def immediate(tok, bits):
+    """
+    Parse a decimal (or 0x/0b prefixed) immediate that must fit in a
+    signed field of the given width; returns it masked to that width.
+    """
+    try:
+        val = int(tok, 0) if tok.lstrip("-")[:2].lower() in ("0x", "0b") else int(tok)
+    except ValueError:
+        raise ValueError(f"Invalid immediate '{tok}'")
+    if not -(1 << (bits - 1)) <= val < (1 << (bits - 1)):
+        raise ValueError(f"Immediate {val} out of range for {bits} bits")
+    return val & ((1 << bits) - 1)
+
+
+# Label names: an identifier, optionally with dots (loop, .L1, end_2)
+LABEL = re.compile(r"[A-Za-z_.][\w.]*")
+
+
+def target_offset(tok, bits, pc, symbols):
+    """
+    The halfword offset field of a branch or jal: either a number of
+    halfwords, or a label resolved relative to pc and range-checked
+    against the (bits + 1)-bit byte offset it encodes.
+    """
+    if symbols is not None and tok in symbols:
+        delta = symbols[tok] - pc
+        if not -(1 << bits) <= delta < (1 << bits):
+            raise ValueError(f"Label '{tok}' is {delta} bytes away, "
+                             f"out of range for a {bits + 1}-bit offset")
+        return (delta >> 1) & ((1 << bits) - 1)
+    if LABEL.fullmatch(tok):
+        raise ValueError(f"Undefined label '{tok}'")
+    return immediate(tok, bits)
+
+
+def encode(line, pc=0, symbols=None):
+    """
+    Encode one instruction as a 32-bit integer. Raises ValueError.
+
+    Operands may be separated by commas and/or spaces. Loads, stores and
+    jalr accept "rd, imm(rs1)"; lw/addi/jalr also accept "rd rs1 imm".
+    Branch and jal offsets are given in halfwords (the value of the
+    imm[12:1] / imm[20:1] field), or as a label from symbols, resolved
+    relative to pc; beq/bne put their first register in the rs2 field,
+    as the original encoders always did.
+    """
+    parts = line.replace(",", " ").replace("(", " ").replace(")", " ").split()
     if not parts:
-        return "ERROR: Empty instruction"
-    if parts[0] not in opcodes:
-        return "ERROR: Invalid instruction"
-    opcode = opcodes[parts[0]]
-    if opcode in ["0000011", "0010011", "1100111"]:
-        return i_type(parts)
-    else:
-        return "ERROR: Unsupported instruction format"
-def mod(x):
-    if x>=0:
-        return x
-    else:
-        return -x
-def t(n):
-    a=0
-    while(n>0):
-        n=n//2
-        if n==0:
-            break
+        raise ValueError("Empty instruction")
+    if parts[0] not in SPECS:
+        raise ValueError("Invalid instruction")
+    fmt, opcode, funct3, funct7 = SPECS[parts[0]]
+    ops = parts[1:]
+    if len(ops) != (2 if fmt == "J" else 3):
+        raise ValueError(f"Wrong number of operands for {parts[0]}")
+
+    if fmt == "R":
+        rd, rs1, rs2 = (reg_number(tok) for tok in ops)
+        return funct7 << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | rd << 7 | opcode
+    if fmt == "I":
+        if "(" in line:  # rd, imm(rs1)
+            rd, imm, rs1 = reg_number(ops[0]), immediate(ops[1], 12), reg_number(ops[2])
+        else:            # rd rs1 imm
+            rd, rs1, imm = reg_number(ops[0]), reg_number(ops[1]), immediate(ops[2], 12)
+        return imm << 20 | rs1 << 15 | funct3 << 12 | rd << 7 | opcode
+    if fmt == "S":       # rs2, imm(rs1)
+        rs2, imm, rs1 = reg_number(ops[0]), immediate(ops[1], 12), reg_number(ops[2])
+        return (imm >> 5) << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | (imm & 0x1F) << 7 | opcode
+    if fmt == "B":       # rs2, rs1, halfword offset
+        rs2, rs1, imm = reg_number(ops[0]), reg_number(ops[1]), target_offset(ops[2], 12, pc, symbols)
+        return ((imm >> 11) & 1) << 31 | ((imm >> 4) & 0x3F) << 25 | rs2 << 20 | rs1 << 15 | \
+               funct3 << 12 | (imm & 0xF) << 8 | ((imm >> 10) & 1) << 7 | opcode
+    # J: rd, halfword offset
+    rd, imm = reg_number(ops[0]), target_offset(ops[1], 20, pc, symbols)
+    return ((imm >> 19) & 1) << 31 | (imm & 0x3FF) << 21 | ((imm >> 10) & 1) << 20 | \
+           ((imm >> 11) & 0xFF) << 12 | rd << 7 | opcode
+
+
+def f1(s):
+    """
+    Assemble one line into a 32-character binary string, or an
+    "ERROR: ..." message.
+    """
+    try:
+        return format(encode(s), "032b")
+    except ValueError as e:
+        return f"ERROR: {e}"
+
+
+# ===== LIBRARY API =====
+
+def source_lines(lines, first_line=1):
+    """
+    Yield (line number, instruction text) for every line of source that
+    holds an instruction, dropping comments (from #) and blank lines.
+    """
+    for lineno, line in enumerate(lines, first_line):
+        line = line.split("#", 1)[0].strip()
+        if line:
+            yield lineno, line
+
+
+def program_lines(lines, symbols, first_line=1, label_lines=None, first_pc=0):
+    """
+    Yield (line number, instruction) for every instruction of a source,
+    recording each label ("name:", alone or before an instruction on the
+    same line) into symbols as a byte address, one instruction per word
+    from instruction first_pc. Lines are numbered from first_line;
+    label_lines, if a dict, is filled with the line number of each label.
+    """
+    instructions = first_pc
+    for lineno, line in source_lines(lines, first_line):
+        while ":" in line:
+            label, _, rest = line.partition(":")
+            label = label.strip()
+            if not LABEL.fullmatch(label):
+                raise ValueError(f"line {lineno}: Invalid label '{label}'")
+            if label in symbols:
+                raise ValueError(f"line {lineno}: Duplicate label '{label}'")
+            symbols[label] = 4 * instructions
+            if label_lines is not None:
+                label_lines[label] = lineno
+            line = rest.strip()
+        if line:
+            instructions += 1
+            yield lineno, line
+
+
+def first_pass(lines, first_line=1, label_lines=None):
+    """
+    Pass 1: collect labels into a symbol table (see program_lines()).
+    Returns (symbols, [(line number, instruction)]).
+    """
+    symbols = {}
+    program = list(program_lines(lines, symbols, first_line, label_lines))
+    return symbols, program
+
+
+def resolve_labels(lines):
+    """
+    Pass 1 for assemble_lines and assemble_chunks: (symbols, iterable of
+    (line number, instruction)). A seekable file is read twice, keeping
+    only its labels between the passes, so memory stays bounded however
+    long the source is; any other iterable (stdin, a list) is buffered.
+    """
+    if not getattr(lines, "seekable", lambda: False)():
+        return first_pass(lines)
+    start = lines.tell()
+    symbols = {}
+    deque(program_lines(lines, symbols), 0)
+    lines.seek(start)
+    return symbols, program_lines(lines, {})
+
+
+def assemble_lines(lines, symbols=None, cache=None):
+    """
+    Assemble an iterable of source lines, yielding one 32-bit instruction
+    word per instruction. Labels are collected in a first pass over the
+    source (see resolve_labels()), then words are encoded lazily. If
+    symbols is a dict it is filled with the label table before the first
+    word is yielded. Raises ValueError naming the line number of the first
+    line that does not assemble. With an AssemblyCache, the program is
+    looked up in (or added to) the cache instead; the cache holds the
+    whole source in memory.
+    """
+    if cache is not None:
+        yield from cache.assemble(lines, symbols)
+        return
+    table, program = resolve_labels(lines)
+    if symbols is not None:
+        symbols.update(table)
+    for pc, (lineno, line) in enumerate(program):
+        try:
+            yield encode(line, 4 * pc, table)
+        except ValueError as e:
+            raise ValueError(f"line {lineno}: {e}") from None
+
+
+# Source lines per chunk handed to a worker by the parallel path
+CHUNK_LINES = 4096
+
+# A line holding no instruction: blank, or only a comment
+BLANK_LINE = re.compile(r"^[^\S\n]*(?:#.*)?$", re.M)
+
+# Symbol table of the program being assembled, set in each worker process
+_worker_symbols = None
+
+
+def _init_worker(symbols):
+    global _worker_symbols
+    _worker_symbols = symbols
+
+
+def usable_cpus():
+    """
+    Number of CPUs this process may run on.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on every platform
+        return os.cpu_count() or 1
+
+
+def read_chunks(lines, chunk_lines):
+    """
+    Yield (first line number, text) for each run of chunk_lines source
+    lines, the lines of a run joined by newlines into one string.
+    """
+    lineno = 1
+    while True:
+        chunk = list(islice(lines, chunk_lines))
+        if not chunk:
+            return
+        yield lineno, "\n".join(line.removesuffix("\n") for line in chunk)
+        lineno += len(chunk)
+
+
+def scan_chunk(text, first_line, first_pc, symbols):
+    """
+    Pass 1 for one chunk of source text from read_chunks(), starting at
+    instruction first_pc: add its labels to symbols and return its number
+    of instructions. A chunk without labels is only counted.
+    """
+    if ":" not in text:
+        return text.count("\n") + 1 - len(BLANK_LINE.findall(text))
+    program = program_lines(text.split("\n"), symbols, first_line, first_pc=first_pc)
+    return sum(1 for _ in program)
+
+
+def encode_chunk(chunk):
+    """
+    Encode (index of first instruction, first line number, source text,
+    fmt) into the output of the chunk as bytes: one binary string per line,
+    or for fmt "raw" little-endian words. Runs in a worker process.
+    """
+    first, first_line, text, fmt = chunk
+    words = array("I")
+    for pc, (lineno, line) in enumerate(program_lines(text.split("\n"), {}, first_line), first):
+        try:
+            words.append(encode(line, 4 * pc, _worker_symbols))
+        except ValueError as e:
+            raise ValueError(f"line {lineno}: {e}") from None
+    if fmt == "raw":
+        if sys.byteorder == "big":
+            words.byteswap()
+        return words.tobytes()
+    return "".join(f"{word:032b}\n" for word in words).encode("ascii")
+
+
+def assemble_chunks(lines, jobs, chunk_lines=CHUNK_LINES, symbols=None, fmt="text"):
+    """
+    Assemble like assemble_lines, but encode chunks of chunk_lines source
+    lines across a pool of jobs processes once labels are resolved. Each
+    worker is sent the text of its chunk and returns its output (see
+    encode_chunk()); yields those bytes in program order. Pass 1 reads a
+    seekable file twice, as resolve_labels() does. jobs is capped at
+    usable_cpus(): with fewer than two, or a single chunk, the chunks are
+    encoded in this process, as a pool would only add overhead.
+    """
+    seekable = getattr(lines, "seekable", lambda: False)()
+    if seekable:
+        start = lines.tell()
+    table = {}
+    firsts = []
+    texts = []
+    pc = 0
+    for first_line, text in read_chunks(lines, chunk_lines):
+        firsts.append((pc, first_line))
+        pc += scan_chunk(text, first_line, pc, table)
+        if not seekable:
+            texts.append(text)
+    if symbols is not None:
+        symbols.update(table)
+    if seekable:
+        lines.seek(start)
+        texts = (text for _, text in read_chunks(lines, chunk_lines))
+    chunks = ((first, first_line, text, fmt) for (first, first_line), text in zip(firsts, texts))
+    jobs = min(jobs, usable_cpus())
+    if len(firsts) < 2 or jobs < 2:
+        _init_worker(table)
+        yield from map(encode_chunk, chunks)
+        return
+    # At most two chunks per worker are in flight, so a long source is
+    # never held in memory at once
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(table,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(encode_chunk, chunk))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ===== ASSEMBLY CACHE =====
+
+# Bump whenever encode() may produce a different word for the same source,
+# or the cache layout changes, so cached programs from older assemblers
+# are never reused
+ASSEMBLER_VERSION = "4"
+
+# The cache splits a source into blocks of lines at content-defined
+# boundaries: after every line whose CRC-32 has its low BLOCK_BITS bits
+# clear (one line in 64 on average), and after at most MAX_BLOCK_LINES
+# lines. An edit changes only the block it falls in, and an inserted or
+# deleted line does not move the boundaries of any other block.
+BLOCK_BITS = 6
+MAX_BLOCK_LINES = 1024
+
+
+def split_blocks(lines):
+    """
+    Content-defined blocks of a list of source lines, as (index of first
+    line, index past last line) pairs.
+    """
+    # Lines ending a block, found without a Python-level loop per line
+    mask = (1 << BLOCK_BITS) - 1
+    ends = compress(range(1, len(lines) + 1),
+                    map(operator.not_, map(mask.__and__, map(zlib.crc32, map(str.encode, lines)))))
+    blocks = []
+    first = 0
+    for stop in chain(ends, [len(lines)]):
+        while stop - first > MAX_BLOCK_LINES:
+            blocks.append((first, first + MAX_BLOCK_LINES))
+            first += MAX_BLOCK_LINES
+        if stop > first:
+            blocks.append((first, stop))
+            first = stop
+    return blocks
+
+
+def label_operands(program):
+    """
+    The distinct last operands of a first-pass program that could name a
+    label: the only operands whose encoding depends on the symbol table.
+    """
+    refs = set()
+    for _, line in program:
+        tok = line[max(line.rfind(" "), line.rfind(",")) + 1:]
+        if LABEL.fullmatch(tok):
+            refs.add(tok)
+    return tuple(sorted(refs))
+
+
+class AssemblyCache:
+    """
+    On-disk cache of assembled programs in a directory. Whole programs are
+    found by a hash of their source text and ASSEMBLER_VERSION; entries are
+    evicted least recently used first once the directory holds more than
+    max_bytes.
+
+    A program that misses is assembled a block at a time (see
+    split_blocks()) through a memo of blocks, also kept in the directory
+    and counted in max_bytes. A block's labels and instruction count are
+    reused whenever its text is unchanged, and its words whenever the
+    labels it refers to are also at the same offsets from it, so a lightly
+    edited file only re-parses and re-encodes the blocks it touched.
+    """
+    MEMO_FILE = "blocks.memo"
+
+    def __init__(self, directory, max_bytes=64 << 20):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memo = None
+        self.hits = self.misses = 0
+        self.line_hits = self.line_misses = 0
+        self.evictions = 0
+
+    def load(self, key):
+        path = os.path.join(self.directory, key + ".asm")
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return entry
+
+    def assemble(self, lines, symbols=None):
+        """
+        The instruction words of a source, as an array of 32-bit words.
+        Raises ValueError like assemble_lines.
+        """
+        lines = list(lines)
+        key = hashlib.sha256(ASSEMBLER_VERSION.encode())
+        key.update("\n".join(lines).encode())
+        key = key.hexdigest()
+        entry = self.load(key)
+        if entry is None:
+            entry = self.assemble_blocks(lines)
+            self.misses += 1
+            self.save(key, entry)
+            self.save_memo()
+            self.evict()
         else:
-            a+=1
-    return a
-def bin(n):
-    m=0
-    while(n>0):
-        m+=10**t(n)
-        n=n-2**t(n)
-    return str(m)
-def dec(n):
-    m=0
-    while(n>0):
-        m+=10**t(n)
-        n=n-2**t(n)
-    return '0'*(5-len(str(m)))+str(m)
-def f(s):
-    a=int(s[1:])
-    m=0
-    while(a>0):
-        m+=10**t(a)
-        a=a-2**t(a)
-    return '0'*(5-len(str(m)))+str(m)
-def j(n,b):
-    if n>0:
-        return "0"*(b-len(bin(mod(n))))+bin((n))
+            self.hits += 1
+        if symbols is not None:
+            symbols.update(entry[0])
+        return entry[1]
+
+    def load_memo(self):
+        """
+        The block memo: {block text hash: [instructions, labels (name,
+        index of the instruction it labels, line number), label operands,
+        their offsets when encoded, words as bytes]}, least recently used
+        first.
+        """
+        if self.memo is None:
+            try:
+                with open(os.path.join(self.directory, self.MEMO_FILE), "rb") as f:
+                    self.memo = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                self.memo = {}
+        return self.memo
+
+    def assemble_blocks(self, lines):
+        """
+        (symbol table, words) of a source, through the block memo.
+        """
+        memo = self.load_memo()
+        blocks = []
+        table = {}
+        pc = 0
+
+        # Pass 1: labels and instruction counts, parsing changed blocks only
+        for first, stop in split_blocks(lines):
+            digest = hashlib.sha1("".join(lines[first:stop]).encode()).digest()
+            block = memo.pop(digest, None)
+            program = None
+            if block is None:
+                label_lines = {}
+                labels, program = first_pass(lines[first:stop], first + 1, label_lines)
+                block = [len(program), [(name, addr >> 2, label_lines[name])
+                                        for name, addr in labels.items()],
+                         label_operands(program), None, None]
+            memo[digest] = block  # Most recently used last
+            for name, index, lineno in block[1]:
+                if name in table:
+                    raise ValueError(f"line {lineno}: Duplicate label '{name}'")
+                table[name] = 4 * (pc + index)
+            blocks.append((first, stop, pc, block, program))
+            pc += block[0]
+
+        # Pass 2: words, encoding the blocks whose text or label offsets changed
+        words = array("I")
+        for first, stop, pc, block, program in blocks:
+            offsets = tuple(table[tok] - 4 * pc if tok in table else None for tok in block[2])
+            if block[3] != offsets:
+                if program is None:
+                    program = first_pass(lines[first:stop], first + 1)[1]
+                encoded = array("I")
+                for i, (lineno, line) in enumerate(program, pc):
+                    try:
+                        encoded.append(encode(line, 4 * i, table))
+                    except ValueError as e:
+                        raise ValueError(f"line {lineno}: {e}") from None
+                block[3], block[4] = offsets, encoded.tobytes()
+                self.line_misses += block[0]
+            else:
+                self.line_hits += block[0]
+            words.frombytes(block[4])
+        return table, words
+
+    def trim_memo(self, max_bytes):
+        """
+        Drop least recently used blocks until the words in the memo total
+        at most max_bytes.
+        """
+        memo = self.memo
+        total = 0
+        for block in memo.values():
+            total += len(block[4] or b"")
+        for digest in list(memo):
+            if total <= max_bytes:
+                break
+            total -= len(memo.pop(digest)[4] or b"")
+
+    def save(self, key, entry):
+        self.write(os.path.join(self.directory, key + ".asm"), entry)
+
+    def save_memo(self):
+        # The memo gets at most half of the cache; programs the rest
+        self.trim_memo(self.max_bytes // 2)
+        self.write(os.path.join(self.directory, self.MEMO_FILE), self.memo)
+
+    def write(self, path, obj):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def entries(self):
+        """
+        (last use, size, path) of every cached program, oldest first, and
+        the total size of the programs and the block memo.
+        """
+        found = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".asm"):
+                    st = entry.stat()
+                    found.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+                elif entry.name == self.MEMO_FILE:
+                    total += entry.stat().st_size
+        found.sort()
+        return found, total
+
+    def evict(self):
+        entries, total = self.entries()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        entries, total = self.entries()
+        return {
+            "hits": self.hits, "misses": self.misses,
+            "line_hits": self.line_hits, "line_misses": self.line_misses,
+            "evictions": self.evictions, "entries": len(entries),
+            "bytes": total,
+        }
+
+
+def assemble_image(lines, symbols=None, cache=None):
+    """
+    Assemble source lines into a raw program image: the instruction words
+    as little-endian bytes, ready for Simulator.load(image, fmt='raw').
+    """
+    if cache is not None:
+        words = array("I", cache.assemble(lines, symbols))
     else:
-        t=n+1
-        l="0"*(b-len(bin(mod(t))))+bin(mod(t))
-        l1=[]
-        for i in l:
-            l1.append(i)
-        l2=[]
-        for i in l1:
-            l2.append(str(mod(int(i)-1)))
-        s1=("").join(l2)
-        return s1
-def sum(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    s1="0000000"+f(l2[3])+f(l2[2])+"000"+f(l2[1])+"0110011"
-    return s1
-def sub(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    s1="0100000"+f(l2[3])+f(l2[2])+"000"+f(l2[1])+"0110011"
-    return s1
-def slt(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    s1="0000000"+f(l2[3])+f(l2[2])+"010"+f(l2[1])+"0110011"
-    return s1
-def sltu(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    s1="0000000"+f(l2[3])+f(l2[2])+"011"+f(l2[1])+"0110011"
-    return s1
-def xor(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    s1="0000000"+f(l2[3])+f(l2[2])+"100"+f(l2[1])+"0110011"
-    return s1
-def or1(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    s1="0000000"+f(l2[3])+f(l2[2])+"110"+f(l2[1])+"0110011"
-    return s1
-def and1(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    s1="0000000"+f(l2[3])+f(l2[2])+"111"+f(l2[1])+"0110011"
-    return s1   
-
-# b type instruction
-
-def set_register_binary(r):
-    register_no=int(r[1:])       # input wouk dbe r1, r2 so taking integers from 1st pace till end
-    #binary_of_reg=p.bin(register_no) 
-    return j(register_no,5)  # gives reg in 5 bits
-def beq(r1,r2,immediate):
-    imm=j(immediate,12)
-    register_1=set_register_binary(r1)
-    register_2=set_register_binary(r2)
-    register_1==register_2
-    final_instruction=imm[0]+imm[2]+imm[3]+imm[4]+imm[5]+imm[6]+imm[7]+set_register_binary(r1)+set_register_binary(r2)+"000"+imm[8]+imm[9]+imm[10]+imm[11]+imm[1]+"1100011"
-    return final_instruction
-
-def bne(r1,r2,immediate):
-    #immediate=p.bin(immediate)
-    imm=j(immediate,12)
-    register_1=set_register_binary(r1)
-    register_2=set_register_binary(r2)
-
-        # imm[0] is imm[12th bit] and imm[8:12]=imm[4:1 wala bit] and imm[]
-    final_instruction=imm[0]+imm[2]+imm[3]+imm[4]+imm[5]+imm[6]+imm[7]+set_register_binary(r1)+set_register_binary(r2)+"001"+imm[8]+imm[9]+imm[10]+imm[11]+imm[1]+"1100011"
-    return final_instruction
-print(beq("r2","r2",7))
-
-print(bne("r4","r2",7))
-# j type instruction
-def jal(rd,immediate):      # immediat value in jal instru tion is a 21 bit offset
-    register=set_register_binary(rd)    #  rd to binary
-    imm=j(immediate,21)
-    final_instruction=imm[1]+imm[11:21]+imm[10]+imm[2:10]+register+"1101111"
-    return final_instruction
-def beq1(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    st1=beq(l2[1],l2[2],int(l2[3]))
-    return st1
-def bne1(s):
-    l=[]
-    for i in s:
-        if i!=" ":
-            l.append(i)
-        elif i==" ":
-            l.append(",")
-    s2=("").join(l)
-    l2=s2.split(",")
-    st1=bne(l2[1],l2[2],int(l2[3]))
-    return st1
-def rev(s):
-    l=[]
-    for i in s:
-        l.append(i)
-    l.reverse()
-    s2=("").join(l)
-    return s2
-def sw(s):
-    a=s.index(",")
-    b=s.index("(")
-    c=s.index(")")
-    l=[s[3:a],s[a+1:b],s[b+1:c]]
-    s1=j(int(l[1]),12)[:7]+f(l[0])+f(l[2])+"010"+(rev(j(int(l[1]),12)))[0:5]+"0100011"
-    return s1
-def f1(s):
-    i=s[0:3]
-    j=s[0:4]
-    k=s[0:2]
-    if i=="add" and j!="addi":
-        return sum(s)
-    elif i=="sub":
-        return sub(s)
-    elif i=="slt" and j!="sltu":
-        return slt(s)
-    elif j=="sltu":
-        return sltu(s)
-    elif i=="xor":
-        return xor(s)
-    elif k=="or":
-        return or1(s)
-    elif i=="and":
-        return and1(s)
-    elif k=="sw":
-        return sw(s)
-    elif i=="beq":
-        return beq1(s)
-    elif i=="bne":
-        return bne1(s)
+        words = array("I", assemble_lines(lines, symbols))
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words.tobytes()
+
+
+def assemble_file(src, dst, mode="w", symbols=None, jobs=1, chunk_lines=CHUNK_LINES,
+                  cache=None, fmt="text"):
+    """
+    Assemble src into dst, one binary string per line, or for fmt "raw" a
+    raw little-endian image (see assemble_image). Each may be a path or an
+    open file (binary for a raw dst). symbols is filled as by
+    assemble_lines. With jobs > 1, chunks of the source are encoded in
+    parallel (see assemble_chunks()); the output is identical. With an
+    AssemblyCache, the words come from the cache (jobs is then unused).
+    """
+    if fmt == "raw":
+        mode += "b"
+    fsrc = open(src, "r") if isinstance(src, str) else src
+    try:
+        fdst = open(dst, mode) if isinstance(dst, str) else dst
+        try:
+            if jobs > 1 and cache is None:
+                write = fdst.write if fmt == "raw" else lambda out: fdst.write(out.decode("ascii"))
+                for out in assemble_chunks(fsrc, jobs, chunk_lines, symbols, fmt):
+                    write(out)
+            elif fmt == "raw":
+                fdst.write(assemble_image(fsrc, symbols, cache))
+            elif cache is not None:
+                words = cache.assemble(fsrc, symbols)
+                fdst.write("".join(f"{word:032b}\n" for word in words))
+            else:
+                for word in assemble_lines(fsrc, symbols):
+                    fdst.write(format(word, "032b"))
+                    fdst.write("\n")
+        finally:
+            if fdst is not dst:
+                fdst.close()
+    finally:
+        if fsrc is not src:
+            fsrc.close()
+
+
+def write_symbols(symbols, f):
+    """
+    Write a symbol table as "address label" lines in address order.
+    """
+    for name, addr in sorted(symbols.items(), key=lambda item: item[1]):
+        f.write(f"{addr:08x} {name}\n")
+
+
+def read_symbols(f):
+    """
+    Read a symbol table written by write_symbols: {label: address}.
+    """
+    symbols = {}
+    for line in f:
+        if line.strip():
+            addr, name = line.split()
+            symbols[name] = int(addr, 16)
+    return symbols
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RISC-V assembler")
+    parser.add_argument("input", nargs="?", default="input.txt",
+                        help="Assembly source (default: input.txt, - for stdin)")
+    parser.add_argument("output", nargs="?", default="assembly.txt",
+                        help="Binary output (default: assembly.txt, - for stdout)")
+    parser.add_argument("--append", action="store_true",
+                        help="Append to the output file instead of replacing it")
+    parser.add_argument("--output-format", choices=["text", "raw"], default="text",
+                        help="One binary string per line, or a raw little-endian image "
+                             "for simulator.py --format raw (default: text)")
+    parser.add_argument("--symbols", metavar="FILE",
+                        help="Also write the symbol table (address label per line) to FILE")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Encode in parallel across N processes, at most one per "
+                             "usable CPU (default: 1)")
+    parser.add_argument("--chunk-lines", type=int, default=CHUNK_LINES,
+                        help=f"Source lines per parallel chunk (default: {CHUNK_LINES})")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="Reuse assembled programs and lines cached in DIR")
+    parser.add_argument("--cache-size", type=int, default=64,
+                        help="Cache size cap in MiB (default: 64)")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="Print cache hit/miss statistics")
+    args = parser.parse_args()
+
+    src = sys.stdin if args.input == "-" else args.input
+    if args.output == "-":
+        dst = sys.stdout.buffer if args.output_format == "raw" else sys.stdout
     else:
-        return(assemble(s))
-f2=open("assembly.txt","a")
-with open("input.txt", "r") as file:
-    data = file.readlines()
-    for line in data:
-        f2.write(f1(line.strip()))
-        f2.write("\n")
+        dst = args.output
+    symbols = {}
+    cache = AssemblyCache(args.cache, args.cache_size << 20) if args.cache else None
+    try:
+        assemble_file(src, dst, "a" if args.append else "w", symbols,
+                      jobs=args.jobs, chunk_lines=args.chunk_lines, cache=cache,
+                      fmt=args.output_format)
+    except FileNotFoundError:
+        print(f"Error: Could not open input file '{args.input}'")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {args.input}: {e}")
+        sys.exit(1)
+    if args.symbols:
+        with open(args.symbols, "w") as f:
+            write_symbols(symbols, f)
+    if cache is not None and args.cache_stats:
+        print("cache: " + ", ".join(f"{k} {v}" for k, v in cache.stats().items()),
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
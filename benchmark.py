@@ -0,0 +1,595 @@
+"""
+Benchmarks for the RISC-V simulator.
+
+Runs a long-running loop program and reports simulated instructions per
+second with and without the decoded-instruction cache, and with the
+basic-block translation engine, both with per-step tracing and with
+final-only tracing. Also times word loads and stores through the memory
+subsystem against the original byte-by-byte read/write, and assembler
+throughput of the table-driven encoder against the original f1 dispatch,
+and the speedup of parallel chunked assembly per chunk size.
+
+The suite subcommand runs a fixed, seeded set of synthetic workloads
+(arithmetic loops, memory streaming over DATA, branch-heavy code and
+large straight-line sources for the assembler) and reports simulated
+instructions/s, assembled lines/s, trace bytes/s and peak RSS, optionally
+as JSON. With --compare it checks the results against a stored baseline
+and exits with status 1 if any metric regressed beyond the threshold.
+
+Usage: python benchmark.py [--steps N] [--repeat N] [--jobs N]
+       python benchmark.py suite [--json FILE] [--compare BASELINE] [--threshold PCT]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import assembler_project
+import benchmark_legacy_f1
+from simulator import BinaryTraceWriter, Simulator, TraceWriter, parse_memory_map
+
+# Memory map the original read/write hardcoded
+CODE_START, CODE_END = 0x00000000, 0x000000FF
+STACK_START, STACK_END = 0x00000100, 0x0000017F
+DATA_START, DATA_END = 0x00010000, 0x0001007F
+
+# ===== INSTRUCTION ENCODING HELPERS =====
+
+def r_type(funct7, rs2, rs1, funct3, rd):
+    return (funct7 << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | 0x33
+
+def i_type(imm, rs1, funct3, rd, opcode):
+    return ((imm & 0xFFF) << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+def s_type(imm, rs2, rs1):
+    imm &= 0xFFF
+    return ((imm >> 5) << 25) | (rs2 << 20) | (rs1 << 15) | (0x2 << 12) | ((imm & 0x1F) << 7) | 0x23
+
+def b_type(imm, rs2, rs1, funct3):
+    imm &= 0x1FFF
+    return (((imm >> 12) & 1) << 31) | (((imm >> 5) & 0x3F) << 25) | (rs2 << 20) | \
+           (rs1 << 15) | (funct3 << 12) | (((imm >> 1) & 0xF) << 8) | (((imm >> 11) & 1) << 7) | 0x63
+
+
+def loop_program():
+    """
+    A loop that never terminates on its own: the instruction budget ends it.
+    """
+    words = [
+        i_type(1, 0, 0x0, 2, 0x13),     # 0x00: addi x2, x0, 1
+        i_type(256, 0, 0x0, 5, 0x13),   # 0x04: addi x5, x0, 256 (stack)
+        r_type(0x00, 2, 3, 0x0, 3),     # 0x08: add  x3, x3, x2
+        s_type(0, 3, 5),                # 0x0c: sw   x3, 0(x5)
+        i_type(0, 5, 0x2, 4, 0x03),     # 0x10: lw   x4, 0(x5)
+        r_type(0x00, 3, 4, 0x2, 6),     # 0x14: slt  x6, x4, x3
+        b_type(8, 0, 3, 0x0),           # 0x18: beq  x3, x0, 8 (never taken)
+        i_type(8, 0, 0x0, 0, 0x67),     # 0x1c: jalr x0, 8(x0)
+    ]
+    return [format(w, '032b') for w in words]
+
+
+def bench_run(prog, steps, repeat, **kwargs):
+    """
+    Best-of-repeat instructions per second for a full run of prog.
+    """
+    best = 0.0
+    for _ in range(repeat):
+        sim = Simulator(**kwargs)
+        sim.load(prog)
+        start = time.perf_counter()
+        sim.run(max=steps)
+        elapsed = time.perf_counter() - start
+        best = max(best, sim.count / elapsed)
+    return best
+
+
+# ===== MEMORY MICROBENCHMARKS =====
+
+def legacy_read(mem, addr, size=4):
+    """
+    Simulator.read as originally written, for comparison.
+    """
+    if addr < 0 or addr + size > len(mem):
+        return 0
+    if not (CODE_START <= addr <= CODE_END or
+            STACK_START <= addr <= STACK_END or
+            DATA_START <= addr <= DATA_END):
+        return 0
+    return sum(mem[addr + i] << (i * 8) for i in range(size))
+
+
+def legacy_write(mem, addr, val, size=4):
+    """
+    Simulator.write as originally written, for comparison.
+    """
+    if addr < 0 or addr + size > len(mem):
+        return
+    if not (CODE_START <= addr <= CODE_END or
+            STACK_START <= addr <= STACK_END or
+            DATA_START <= addr <= DATA_END):
+        return
+    for i in range(size):
+        mem[addr + i] = (val >> (i * 8)) & 0xFF
+
+
+def bench_memory(n):
+    """
+    Word loads and stores per second over the data segment, by each path.
+    """
+    addrs = [DATA_START + (i * 4) % (DATA_END + 1 - DATA_START) for i in range(n)]
+    mem = bytearray(DATA_END + 1)
+    sim = Simulator()
+    memory = sim.memory
+
+    def timed(fn):
+        start = time.perf_counter()
+        fn()
+        return n / (time.perf_counter() - start)
+
+    def legacy_loads():
+        for addr in addrs:
+            legacy_read(mem, addr)
+
+    def legacy_stores():
+        for addr in addrs:
+            legacy_write(mem, addr, addr)
+
+    def loads():
+        read = memory.read
+        for addr in addrs:
+            read(addr)
+
+    def stores():
+        write = memory.write
+        for addr in addrs:
+            write(addr, addr)
+
+    def sim_stores():
+        write = sim.write
+        for addr in addrs:
+            write(addr, addr)
+
+    return [
+        ('legacy read()', timed(legacy_loads)),
+        ('Memory.read()', timed(loads)),
+        ('legacy write()', timed(legacy_stores)),
+        ('Memory.write()', timed(stores)),
+        ('Simulator.write()', timed(sim_stores)),
+    ]
+
+
+# ===== ASSEMBLER BENCHMARK =====
+
+def assembly_lines(n, seed=0):
+    """
+    n random instructions in the syntax the original f1 dispatch accepts.
+    """
+    rng = random.Random(seed)
+    abi = list(assembler_project.registers)
+    lines = []
+    for _ in range(n):
+        op = rng.choice(['add', 'sub', 'slt', 'xor', 'or', 'and', 'addi', 'jalr', 'beq', 'bne'])
+        if op in ('addi', 'jalr'):
+            lines.append(f"{op} {rng.choice(abi)} {rng.choice(abi)} {rng.randrange(2048)}")
+        elif op in ('beq', 'bne'):
+            lines.append(f"{op} x{rng.randrange(1, 32)},x{rng.randrange(1, 32)},{rng.randrange(1, 2048)}")
+        else:
+            lines.append(f"{op} x{rng.randrange(32)},x{rng.randrange(32)},x{rng.randrange(32)}")
+    return lines
+
+
+def bench_assembler(n):
+    """
+    Lines per second through the original f1 dispatch (a frozen copy, see
+    benchmark_legacy_f1.py) and each entry point of the table-driven
+    encoder.
+    """
+    lines = assembly_lines(n)
+    results = []
+    for name, fn in (('original f1()', benchmark_legacy_f1.f1),
+                     ('f1()', assembler_project.f1),
+                     ('encode()', assembler_project.encode)):
+        start = time.perf_counter()
+        for line in lines:
+            fn(line)
+        results.append((name, n / (time.perf_counter() - start)))
+    return results
+
+
+def bench_parallel(n, jobs, chunk_sizes=(1024, 4096, 16384, 65536)):
+    """
+    Seconds to assemble n lines serially, then (chunk size, seconds,
+    speedup) with jobs processes for each chunk size. Parallel output is
+    checked against the serial output.
+    """
+    lines = assembly_lines(n, seed=1)
+
+    def timed(**kwargs):
+        out = io.StringIO()
+        start = time.perf_counter()
+        assembler_project.assemble_file(io.StringIO("\n".join(lines)), out, **kwargs)
+        return time.perf_counter() - start, out.getvalue()
+
+    serial, expected = timed()
+    results = []
+    for size in chunk_sizes:
+        elapsed, text = timed(jobs=jobs, chunk_lines=size)
+        if text != expected:
+            raise AssertionError(f'parallel output differs at chunk size {size}')
+        results.append((size, elapsed, serial / elapsed))
+    return serial, results
+
+
+# ===== BENCHMARK SUITE =====
+
+# Every workload loops forever; the instruction budget ends the run.
+# Each is (assembly source, memory map spec or None for the default).
+
+ARITH_SOURCE = """
+    addi x1 x0 1
+    addi x2 x0 3
+loop:
+    add x3 x3 x1
+    sub x4 x3 x2
+    slt x5 x4 x3
+    or x6 x5 x4
+    and x7 x6 x3
+    add x2 x2 x7
+    addi x1 x1 1
+    beq x0, x0, loop
+"""
+
+# Sums and rewrites 4096 words of a 16 KiB data segment, then starts over
+STREAM_SOURCE = """
+    addi x10 x0 1024        # x10 = 0x10000, the data segment, by doubling
+    add x10 x10 x10
+    add x10 x10 x10
+    add x10 x10 x10
+    add x10 x10 x10
+    add x10 x10 x10
+    add x10 x10 x10
+outer:
+    addi x5 x10 0
+    addi x7 x0 1024
+    add x7 x7 x7
+    add x7 x7 x7
+inner:
+    lw x6 0(x5)
+    add x1 x1 x6
+    addi x6 x6 1
+    sw x6, 0(x5)
+    addi x5 x5 4
+    addi x7 x7 -1
+    bne x0, x7, inner
+    beq x0, x0, outer
+"""
+STREAM_MAP = 'code=0x0:0xfff,stack=0x1000:0x10ff,data=0x10000:0x13fff'
+
+# Branches on the low bits of a counter, so their outcomes keep changing
+BRANCH_SOURCE = """
+    addi x10 x0 1
+    addi x11 x0 2
+    addi x12 x0 4
+loop:
+    addi x1 x1 1
+    and x3 x1 x10
+    beq x3, x0, skip1
+    addi x4 x4 1
+skip1:
+    and x3 x1 x11
+    bne x3, x0, skip2
+    addi x5 x5 1
+skip2:
+    and x3 x1 x12
+    beq x3, x0, skip3
+    sub x6 x6 x1
+skip3:
+    slt x7 x4 x5
+    bne x7, x0, skip4
+    addi x8 x8 1
+skip4:
+    beq x0, x0, loop
+"""
+
+WORKLOADS = {
+    'arith': (ARITH_SOURCE, None),
+    'stream': (STREAM_SOURCE, STREAM_MAP),
+    'branch': (BRANCH_SOURCE, None),
+}
+
+# (engine, trace policy, trace format) combinations timed per workload
+SUITE_CONFIGS = (
+    ('interp', 'final', 'text'),
+    ('translate', 'final', 'text'),
+    ('interp', 'every', 'text'),
+    ('translate', 'every', 'text'),
+    ('interp', 'every', 'binary'),
+)
+
+
+def straight_line_source(n, seed=0):
+    """
+    n lines of straight-line assembly over every mnemonic the encoder
+    knows except jal, with the odd comment and blank line.
+    """
+    rng = random.Random(seed)
+    regs = [f"x{i}" for i in range(32)] + list(assembler_project.registers)
+    lines = []
+    for i in range(n):
+        op = rng.choice(list(assembler_project.SPECS))
+        fmt = assembler_project.SPECS[op][0]
+        rd, rs1, rs2 = rng.choice(regs), rng.choice(regs), rng.choice(regs)
+        if fmt == "R":
+            line = f"{op} {rd}, {rs1}, {rs2}"
+        elif op in ("lw", "jalr"):
+            line = f"{op} {rd}, {rng.randrange(-2048, 2048)}({rs1})"
+        elif fmt == "I":
+            line = f"{op} {rd} {rs1} {rng.randrange(-2048, 2048)}"
+        elif fmt == "S":
+            line = f"{op} {rs2}, {rng.randrange(-2048, 2048)}({rs1})"
+        elif fmt == "B":
+            line = f"{op} {rs1}, {rs2}, {rng.randrange(-2048, 2048)}"
+        else:
+            line = f"add {rd}, {rs1}, {rs2}"
+        if i % 64 == 0:
+            lines.append("")
+            line += "  # block %d" % (i // 64)
+        lines.append(line)
+    return lines
+
+
+def workload_image(name):
+    """
+    The raw image and memory map of a workload.
+    """
+    source, spec = WORKLOADS[name]
+    image = assembler_project.assemble_image(source.splitlines())
+    return image, parse_memory_map(spec) if spec else None
+
+
+def bench_workload(name, steps, repeat, engine, policy, trace_format):
+    """
+    Best-of-repeat (instructions/s, trace bytes/s) for steps instructions
+    of a workload, its trace counted but not stored.
+    """
+    image, memory_map = workload_image(name)
+    kwargs = {'memory_map': memory_map} if memory_map else {}
+    best = (0.0, 0.0)
+    for _ in range(repeat):
+        written = [0]
+
+        def sink(chunk):
+            written[0] += len(chunk)  # Text traces are ASCII
+
+        trace = BinaryTraceWriter(sink) if trace_format == 'binary' else TraceWriter(sink)
+        sim = Simulator(engine=engine, trace=trace, trace_policy=policy, **kwargs)
+        sim.load(image, fmt='raw')
+        start = time.perf_counter()
+        sim.run(max=steps)
+        trace.close()
+        elapsed = time.perf_counter() - start
+        if sim.count != steps:
+            raise AssertionError(f'workload {name} stopped after {sim.count} of {steps} instructions')
+        best = max(best, (sim.count / elapsed, written[0] / elapsed))
+    return best
+
+
+# Assembler entry points timed by the suite
+ASSEMBLY_BENCHMARKS = ('f1', 'assemble_lines', 'assemble_image')
+
+
+def bench_assembly(name, n, repeat):
+    """
+    Best-of-repeat lines/s through one of ASSEMBLY_BENCHMARKS (f1(),
+    assemble_lines() or assemble_image()) for an n-line straight-line
+    source.
+    """
+    lines = straight_line_source(n, seed=2)
+    instructions = [line.split("#")[0].strip() for line in lines]
+    instructions = [line for line in instructions if line]
+    fn = {
+        'f1': lambda: [assembler_project.f1(line) for line in instructions],
+        'assemble_lines': lambda: list(assembler_project.assemble_lines(lines)),
+        'assemble_image': lambda: assembler_project.assemble_image(lines),
+    }[name]
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = max(best, len(instructions) / (time.perf_counter() - start))
+    return best
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in bytes (ru_maxrss is in
+    kilobytes on Linux, bytes on macOS).
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _run_measured(fn, args):
+    return fn(*args), peak_rss()
+
+
+def run_in_child(fn, *args):
+    """
+    (fn(*args), peak RSS in bytes) with fn run in a fresh interpreter, so
+    that the peak belongs to that one benchmark and not to whatever ran
+    before it.
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_run_measured, fn, args).result()
+
+
+def run_suite(steps, repeat, lines, report=print):
+    """
+    Run every workload and assembler benchmark. Returns the results as a
+    JSON-serializable dict: 'meta' describes the run and 'metrics' maps
+    names to values. Rates end in _per_s (higher is better); sizes end in
+    _bytes (lower is better). Each benchmark runs in a process of its own,
+    whose peak RSS is stored with its metrics.
+    """
+    metrics = {}
+    for name in WORKLOADS:
+        for engine, policy, trace_format in SUITE_CONFIGS:
+            (rate, trace_rate), rss = run_in_child(bench_workload, name, steps, repeat,
+                                                   engine, policy, trace_format)
+            key = f'sim.{name}.{engine}.{policy}'
+            if policy != 'final':
+                key += f'.{trace_format}'
+                metrics[f'{key}.trace_bytes_per_s'] = trace_rate
+            metrics[f'{key}.instr_per_s'] = rate
+            metrics[f'{key}.peak_rss_bytes'] = rss
+            report(f"  {key:36s} {rate:12,.0f} instr/s  {rss / 2**20:6.1f} MiB peak" +
+                   (f"  {trace_rate / 1e6:8.1f} MB/s trace" if policy != 'final' else ''))
+    for name in ASSEMBLY_BENCHMARKS:
+        rate, rss = run_in_child(bench_assembly, name, lines, repeat)
+        metrics[f'asm.{name}.lines_per_s'] = rate
+        metrics[f'asm.{name}.peak_rss_bytes'] = rss
+        report(f"  {'asm.' + name:36s} {rate:12,.0f} lines/s  {rss / 2**20:6.1f} MiB peak")
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'steps': steps,
+            'repeat': repeat,
+            'lines': lines,
+        },
+        'metrics': metrics,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Report lines comparing results with a baseline (both as run_suite()
+    returns them), and the names of the metrics that got worse by more
+    than threshold percent.
+    """
+    lines, regressions = [], []
+    for name, value in results['metrics'].items():
+        old = baseline['metrics'].get(name)
+        if not old:
+            lines.append(f"  {name:48s} {'(new)':>9s}")
+            continue
+        change = 100 * (value - old) / old
+        worse = -change if name.endswith('_per_s') else change
+        flag = ''
+        if worse > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        lines.append(f"  {name:48s} {change:+8.1f}%{flag}")
+    return lines, regressions
+
+
+def suite_main(argv):
+    """
+    Command line for the suite: benchmark.py suite [options].
+    """
+    parser = argparse.ArgumentParser(prog='benchmark.py suite',
+                                     description='Reproducible simulator and assembler benchmark suite')
+    parser.add_argument('--steps', type=int, default=200000,
+                        help='Instructions per workload run (default: 200000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per configuration, best is reported (default: 3)')
+    parser.add_argument('--lines', type=int, default=50000,
+                        help='Lines of straight-line assembler source (default: 50000)')
+    parser.add_argument('--json', metavar='FILE', default=None,
+                        help='Write the results as JSON to FILE (use - for stdout)')
+    parser.add_argument('--compare', metavar='BASELINE', default=None,
+                        help='Compare with the results of an earlier --json run')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent change counted as a regression (default: 10)')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read baseline '{args.compare}': {e}")
+            sys.exit(1)
+
+    # Progress goes to stderr when the JSON goes to stdout
+    out = sys.stderr if args.json == '-' else sys.stdout
+    report = lambda line: print(line, file=out)
+    report(f"suite: {args.steps} instructions per run, {args.lines} assembler lines, "
+           f"best of {args.repeat}")
+    results = run_suite(args.steps, args.repeat, args.lines, report)
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    if baseline is not None:
+        lines, regressions = compare(results, baseline, args.threshold)
+        report(f"against {args.compare} (threshold {args.threshold:g}%):")
+        for line in lines:
+            report(line)
+        if regressions:
+            report(f"{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+def main():
+    if sys.argv[1:2] == ['suite']:
+        suite_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description='RISC-V simulator benchmarks',
+                                     epilog='Benchmark suite: benchmark.py suite --help')
+    parser.add_argument('--steps', type=int, default=100000,
+                        help='Instructions executed per run (default: 100000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per configuration, best is reported (default: 3)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='Processes for parallel assembly (default: CPU count)')
+    args = parser.parse_args()
+
+    prog = loop_program()
+    print(f"loop program, {args.steps} instructions")
+    for policy in ('every', 'final'):
+        uncached = bench_run(prog, args.steps, args.repeat, decode_cache=False, trace_policy=policy)
+        cached = bench_run(prog, args.steps, args.repeat, trace_policy=policy)
+        translated = bench_run(prog, args.steps, args.repeat, engine='translate', trace_policy=policy)
+
+        print(f" trace policy '{policy}':")
+        print(f"  without decode cache: {uncached:12,.0f} instr/s")
+        print(f"  with decode cache:    {cached:12,.0f} instr/s  ({cached / uncached:.2f}x)")
+        print(f"  translate engine:     {translated:12,.0f} instr/s  ({translated / uncached:.2f}x)")
+
+    print(f"memory, {args.steps} word accesses")
+    for name, rate in bench_memory(args.steps):
+        print(f"  {name:20s} {rate:12,.0f} ops/s")
+
+    print(f"assembler, {args.steps // 10} lines")
+    results = bench_assembler(args.steps // 10)
+    for name, rate in results:
+        print(f"  {name:20s} {rate:12,.0f} lines/s  ({rate / results[0][1]:.2f}x)")
+
+    lines = args.steps * 2
+    serial, results = bench_parallel(lines, args.jobs)
+    jobs = min(args.jobs, assembler_project.usable_cpus())
+    print(f"parallel assembly, {lines} lines, {jobs} jobs"
+          + (" (one usable CPU: serial)" if jobs < 2 else ""))
+    print(f"  serial               {serial * 1000:9.1f} ms")
+    for size, elapsed, speedup in results:
+        print(f"  chunk {size:6d} lines  {elapsed * 1000:9.1f} ms  ({speedup:.2f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Instruction and data cache models for the simulator. A CacheModel watches
+instruction fetch through a per-instruction hook and data accesses by
+wrapping Simulator.read/write, and feeds them to set-associative Cache
+models: configurable size, associativity, line size, replacement (LRU,
+FIFO or random) and write policy (write-back with write-allocate, or
+write-through without). Reports hit/miss rates, the most missed line
+addresses and per-PC miss attribution.
+
+Usage: python simulator.py program.txt output.txt
+       --icache size=4096,assoc=2,line=32 --dcache size=1024,policy=fifo,write=through
+       [--cache-json FILE]
+"""
+import json
+import random
+from array import array
+
+from profiler import labeler
+
+
+class Cache:
+    """
+    One set-associative cache. Tags (the full line number, -1 when empty)
+    and replacement stamps are kept in flat arrays with one slot per way;
+    a dict from resident line to slot makes lookups O(1).
+    """
+    POLICIES = ('lru', 'fifo', 'random')
+    WRITE_POLICIES = ('back', 'through')
+
+    def __init__(self, size: int = 4096, assoc: int = 2, line: int = 32,
+                 policy: str = 'lru', write: str = 'back', seed: int = 0, name: str = 'cache'):
+        for label, val in (('size', size), ('assoc', assoc), ('line', line)):
+            if val <= 0 or val & (val - 1):
+                raise ValueError(f'{name}: {label} must be a power of two, not {val}')
+        if size < assoc * line:
+            raise ValueError(f'{name}: size {size} is smaller than one set ({assoc} x {line} bytes)')
+        if policy not in self.POLICIES:
+            raise ValueError(f"{name}: unknown replacement policy '{policy}'")
+        if write not in self.WRITE_POLICIES:
+            raise ValueError(f"{name}: unknown write policy '{write}'")
+        self.name = name
+        self.size, self.assoc, self.line = size, assoc, line
+        self.policy, self.write_policy = policy, write
+        self.write_back = write == 'back'
+        self.line_bits = line.bit_length() - 1
+        self.sets = size // (assoc * line)
+
+        slots = self.sets * assoc
+        self.tags = array('q', [-1]) * slots
+        self.stamps = array('Q', [0]) * slots
+        self.dirty = bytearray(slots)
+        self.where = {}
+        self.tick = 0
+        self.rng = random.Random(seed)
+
+        # The line of the previous access, which is resident and already
+        # the most recently used of its set
+        self.last = -1
+        self.last_slot = 0
+
+        self.accesses = self.writes = 0
+        self.misses = 0
+        self.writebacks = 0         # Dirty lines evicted (write-back)
+        self.miss_pcs = {}          # pc -> misses
+        self.miss_lines = {}        # line address -> misses
+
+    def fetch(self, pc: int, rec=None) -> bool:
+        """
+        An instruction fetch from pc; also usable as a Simulator hook.
+        """
+        line = pc >> self.line_bits
+        self.accesses += 1
+        if line == self.last:
+            return True
+        return self.lookup(line, False, pc)
+
+    def access(self, addr: int, write: bool, pc: int) -> bool:
+        """
+        Look up the line holding addr for a read or write by the instruction
+        at pc. Returns whether it hit.
+        """
+        line = addr >> self.line_bits
+        self.accesses += 1
+        if write:
+            self.writes += 1
+            if line == self.last:
+                self.dirty[self.last_slot] = self.write_back
+                return True
+        elif line == self.last:
+            return True
+        return self.lookup(line, write, pc)
+
+    def lookup(self, line: int, write: bool, pc: int) -> bool:
+        """
+        The access path for a line other than the previous one.
+        """
+        self.tick += 1
+        slot = self.where.get(line)
+        if slot is not None:
+            if self.policy == 'lru':
+                self.stamps[slot] = self.tick
+            if write and self.write_back:
+                self.dirty[slot] = 1
+            self.last, self.last_slot = line, slot
+            return True
+
+        self.misses += 1
+        self.miss_pcs[pc] = self.miss_pcs.get(pc, 0) + 1
+        addr = line << self.line_bits
+        self.miss_lines[addr] = self.miss_lines.get(addr, 0) + 1
+        if write and not self.write_back:
+            return False  # No write-allocate
+
+        # Fill an empty way, else evict one by policy
+        base = (line % self.sets) * self.assoc
+        tags, stamps = self.tags, self.stamps
+        slot = base
+        for way in range(base, base + self.assoc):
+            if tags[way] == -1:
+                slot = way
+                break
+            if stamps[way] < stamps[slot]:
+                slot = way
+        else:
+            if self.policy == 'random':
+                slot = base + self.rng.randrange(self.assoc)
+            del self.where[tags[slot]]
+            if self.dirty[slot]:
+                self.writebacks += 1
+        tags[slot] = line
+        stamps[slot] = self.tick
+        self.dirty[slot] = write
+        self.where[line] = slot
+        self.last, self.last_slot = line, slot
+        return False
+
+    def report(self, label=None, top: int = 10) -> dict:
+        """
+        Statistics as a JSON-serializable dict, with the top most missed
+        PCs and line addresses.
+        """
+        label = label or labeler({})
+        accesses, misses = self.accesses, self.misses
+        pcs = sorted(self.miss_pcs.items(), key=lambda item: (-item[1], item[0]))[:top]
+        lines = sorted(self.miss_lines.items(), key=lambda item: (-item[1], item[0]))[:top]
+        return {
+            'size': self.size, 'assoc': self.assoc, 'line': self.line,
+            'policy': self.policy, 'write': self.write_policy,
+            'accesses': accesses, 'reads': accesses - self.writes, 'writes': self.writes,
+            'hits': accesses - misses, 'misses': misses,
+            'hit_rate': (accesses - misses) / accesses if accesses else 0.0,
+            'miss_rate': misses / accesses if accesses else 0.0,
+            'writebacks': self.writebacks,
+            'memory_writes': 0 if self.write_back else self.writes,
+            'miss_pcs': [{'pc': pc, 'label': label(pc), 'misses': n} for pc, n in pcs],
+            'miss_lines': [{'addr': addr, 'misses': n} for addr, n in lines],
+        }
+
+
+def parse_cache(spec: str, name: str = 'cache') -> Cache:
+    """
+    Build a Cache from key=value,... with keys size, assoc, line, policy
+    and write (e.g. size=4096,assoc=4,line=32,policy=lru,write=back).
+    Raises ValueError.
+    """
+    options = {}
+    for item in spec.split(','):
+        key, sep, val = item.strip().partition('=')
+        if not sep or key not in ('size', 'assoc', 'line', 'policy', 'write'):
+            raise ValueError(f"{name}: invalid option '{item}' "
+                             f"(expected size, assoc, line, policy or write)")
+        if key in ('size', 'assoc', 'line'):
+            try:
+                options[key] = int(val, 0)
+            except ValueError:
+                raise ValueError(f"{name}: invalid {key} '{val}'")
+        else:
+            options[key] = val
+    return Cache(name=name, **options)
+
+
+class CacheModel:
+    """
+    Feeds the instruction fetches of a Simulator to icache and its data
+    loads and stores to dcache (either may be None). Attaching a data
+    cache switches the simulator to the interpreter, whose loads and
+    stores go through Simulator.read/write one instruction at a time.
+    """
+    def __init__(self, icache: Cache = None, dcache: Cache = None, symbols: dict = None):
+        self.icache = icache
+        self.dcache = dcache
+        self.symbols = symbols if symbols is not None else {}
+
+    def attach(self, sim):
+        if self.icache is not None:
+            sim.add_hook(self.icache.fetch)
+        if self.dcache is not None:
+            sim.engine = 'interp'
+            access = self.dcache.access
+            read, write = sim.read, sim.write
+
+            def cached_read(addr, size=4):
+                access(addr, False, sim.pc)
+                return read(addr, size)
+
+            def cached_write(addr, val, size=4):
+                access(addr, True, sim.pc)
+                write(addr, val, size)
+
+            sim.read, sim.write = cached_read, cached_write
+
+    def report(self) -> dict:
+        label = labeler(self.symbols)
+        return {name: cache.report(label)
+                for name, cache in (('icache', self.icache), ('dcache', self.dcache))
+                if cache is not None}
+
+    def write_json(self, f):
+        json.dump(self.report(), f, indent=2)
+        f.write('\n')
+
+    def summary(self, n: int = 5) -> list:
+        """
+        Report lines: hit rates, then the n most missed PCs of each cache.
+        """
+        lines = []
+        for name, report in self.report().items():
+            lines.append(f"{name} ({report['size']} B, {report['assoc']}-way, {report['line']} B lines, "
+                         f"{report['policy']}, write-{report['write']}): "
+                         f"{report['accesses']} accesses, {report['misses']} misses, "
+                         f"hit rate {100 * report['hit_rate']:.2f}%")
+            if report['writebacks'] or report['memory_writes']:
+                lines.append(f"  {report['writebacks']} writebacks, "
+                             f"{report['memory_writes']} write-through stores")
+            for entry in report['miss_pcs'][:n]:
+                lines.append(f"  0x{entry['pc']:08x}  {entry['label']:20s} {entry['misses']:8d} misses")
+        return lines
@@ -0,0 +1,278 @@
+"""
+Lockstep simulation: one program run over many initial data-memory images
+at once, with NumPy holding one register file and one memory per lane.
+
+Every step executes one decoded instruction for all lanes that are at the
+same PC. When branch outcomes diverge, the lanes at the lowest PC run while
+the others wait, so lanes reconverge as soon as they reach a common PC.
+Each lane's result matches a scalar Simulator run with trace policy
+'final' over the same program and data image.
+
+Requires NumPy.
+
+Usage: python lockstep.py program.txt images.bin output-prefix
+       (images.bin holds one data image per lane, back to back)
+"""
+import sys
+import argparse
+
+import numpy as np
+
+from simulator import (ADD, ADDI, AND, BEQ, BLT, BNE, DEFAULT_MEMORY_MAP, HALT, INVALID,
+                       JALR, LW, NOP, OR, SLT, SRL, STATE_FORMAT, SUB, SW, Simulator, decode,
+                       read_program)
+
+# Lane memory only backs the parts of the address space an access can
+# touch, in chunks of CHUNK bytes
+CHUNK_BITS = 8
+CHUNK = 1 << CHUNK_BITS
+
+
+class LockstepSimulator:
+    """
+    N copies of one program, each with its own registers, PC, counters and
+    memory, stepped together.
+    """
+    def __init__(self, prog, data, fmt: str = 'binary', base: int = None,
+                 memory_map=DEFAULT_MEMORY_MAP):
+        """
+        data is an (N, k) array-like of bytes: lane i starts with data[i]
+        stored at base (default: the start of the 'data' segment).
+        """
+        data = np.asarray(data, dtype=np.uint8)
+        if data.ndim != 2:
+            raise ValueError('data must be an (N, k) array of bytes')
+        self.lanes = len(data)
+
+        # The scalar simulator lays out the program image and the map
+        template = Simulator(memory_map=memory_map)
+        template.load(prog, fmt=fmt)
+        memory = template.memory
+        self.regions = memory.regions
+        self.starts = np.array(memory.starts, dtype=np.int64)
+        self.ends = np.array(memory.ends, dtype=np.int64)
+        self.limit = memory.limit
+        self.code_start, self.code_end = template.CODE_START, template.CODE_END
+        if base is None:
+            base = template.DATA_START
+
+        # Chunks that an in-range access can touch: a valid access starts
+        # inside a segment and spills at most 3 bytes past its end
+        chunks = set()
+        for start, end in zip(memory.starts, memory.ends):
+            last = min(end + 3, self.limit - 1)
+            chunks.update(range(start >> CHUNK_BITS, (last >> CHUNK_BITS) + 1))
+        self.chunks = np.array(sorted(chunks), dtype=np.int64)
+
+        # Per-lane state; registers are laid out register-major so each
+        # register is one contiguous vector across lanes
+        self.mem = np.zeros((self.lanes, len(self.chunks) * CHUNK), dtype=np.uint8)
+        self.regs = np.zeros((33, self.lanes), dtype=np.uint32)
+        self.pc = np.full(self.lanes, self.code_start, dtype=np.int64)
+        self.count = np.zeros(self.lanes, dtype=np.int64)
+        self.active = np.ones(self.lanes, dtype=bool)
+
+        # Program image first, then each lane's data on top
+        for start, end in zip(memory.starts, memory.ends):
+            addrs = np.arange(start, min(end + 3, self.limit - 1) + 1, dtype=np.int64)
+            image = np.frombuffer(memory.read_bytes(start, len(addrs)), dtype=np.uint8)
+            self.mem[:, self.offsets(addrs)] = image
+        if data.shape[1]:
+            addrs = np.arange(base, base + data.shape[1], dtype=np.int64)
+            if not np.isin(addrs >> CHUNK_BITS, self.chunks).all():
+                raise ValueError('data images do not fit in memory')
+            self.mem[:, self.offsets(addrs)] = data
+
+        # Set when any lane stores into program memory; from then on lanes
+        # at the same PC are also grouped by the instruction word they hold
+        self.code_written = False
+        self.decoded = {}
+
+    # ----- memory -----
+
+    def offsets(self, addrs):
+        """
+        Column of each byte address in the lane memory array.
+        """
+        slot = np.searchsorted(self.chunks, addrs >> CHUNK_BITS)
+        return (slot << CHUNK_BITS) | (addrs & (CHUNK - 1))
+
+    def in_segment(self, addrs):
+        """
+        Which addresses lie inside a segment.
+        """
+        i = np.searchsorted(self.starts, addrs, side='right') - 1
+        return (i >= 0) & (addrs <= self.ends[np.maximum(i, 0)])
+
+    def valid(self, addrs):
+        """
+        Which word accesses Memory.read/write would perform.
+        """
+        return (addrs + 4 <= self.limit) & self.in_segment(addrs)
+
+    def read(self, lanes, addrs):
+        """
+        The word at addrs[i] in lane lanes[i] (0 where out of range).
+        """
+        addrs = addrs.astype(np.int64)
+        ok = self.valid(addrs)
+        vals = np.zeros(len(lanes), dtype=np.uint32)
+        if ok.any():
+            lanes, addrs = lanes[ok], addrs[ok]
+            word = np.zeros(len(lanes), dtype=np.uint32)
+            for i in range(4):
+                byte = self.mem[lanes, self.offsets(addrs + i)].astype(np.uint32)
+                word |= byte << np.uint32(8 * i)
+            vals[ok] = word
+        return vals
+
+    def write(self, lanes, addrs, vals):
+        """
+        Store vals[i] at addrs[i] in lane lanes[i] where in range.
+        """
+        addrs = addrs.astype(np.int64)
+        ok = self.valid(addrs)
+        if not ok.any():
+            return
+        lanes, addrs, vals = lanes[ok], addrs[ok], vals[ok]
+        for i in range(4):
+            self.mem[lanes, self.offsets(addrs + i)] = (vals >> np.uint32(8 * i)) & np.uint32(0xFF)
+        if (addrs <= self.code_end).any():
+            self.code_written = True
+
+    # ----- execution -----
+
+    def run(self, max: int = 1000):
+        """
+        Run every lane until it halts, stops or executes max instructions.
+        """
+        regs, pc, count, active = self.regs, self.pc, self.count, self.active
+        signed = regs.view(np.int32)
+        while True:
+            active &= count < max
+            active &= (pc >= self.code_start) & (pc <= self.code_end)
+            live = np.flatnonzero(active)
+            if not len(live):
+                break
+
+            # Lanes at the lowest PC go first
+            p = int(pc[live].min())
+            g = live[pc[live] == p]
+            word = int(self.read(g[:1], np.array([p]))[0])
+            if self.code_written:
+                g = g[self.read(g, np.full(len(g), p)) == word]
+            rec = self.decoded.get(word)
+            if rec is None:
+                rec = self.decoded[word] = decode(word)
+            kind, a, b, c = rec
+
+            if kind == INVALID:
+                active[g] = False
+                continue
+            nxt = p + 4
+            if kind == ADD:
+                regs[a, g] = regs[b, g] + regs[c, g]
+            elif kind == ADDI:
+                regs[a, g] = regs[b, g] + np.uint32(c)
+            elif kind == LW:
+                regs[a, g] = self.read(g, regs[b, g] + np.uint32(c))
+            elif kind == SW:
+                self.write(g, regs[a, g] + np.uint32(c), regs[b, g])
+            elif kind == SUB:
+                regs[a, g] = regs[b, g] - regs[c, g]
+            elif kind == SLT:
+                regs[a, g] = signed[b, g] < signed[c, g]
+            elif kind == SRL:
+                regs[a, g] = regs[b, g] >> np.uint32(c)
+            elif kind == OR:
+                regs[a, g] = regs[b, g] | regs[c, g]
+            elif kind == AND:
+                regs[a, g] = regs[b, g] & regs[c, g]
+            elif kind == JALR:
+                nxt = (regs[b, g] + np.uint32(c)) & np.uint32(0xFFFFFFFE)
+                regs[a, g] = p
+            elif kind in (BEQ, BNE, BLT, HALT):
+                if kind == BLT:
+                    taken = signed[a, g] < signed[b, g]
+                elif kind == BNE:
+                    taken = regs[a, g] != regs[b, g]
+                else:
+                    taken = regs[a, g] == regs[b, g]
+                nxt = np.where(taken, (p + c) & 0xFFFFFFFF, p + 4)
+            elif kind != NOP:
+                raise AssertionError(f'unhandled instruction kind {kind}')
+
+            pc[g] = nxt
+            count[g] += 1
+            if kind == HALT:
+                active[g] = False
+
+    # ----- results -----
+
+    def lane_regs(self, lane: int) -> list:
+        """
+        Registers x0-x31 of one lane.
+        """
+        return [int(v) for v in self.regs[:32, lane]]
+
+    def lane_dump(self, lane: int) -> list:
+        """
+        Memory words of one lane in Simulator.dump() order.
+        """
+        vals = []
+        for _, start, end in self.regions:
+            addrs = np.arange(start, end + 1, 4, dtype=np.int64)
+            vals.extend(int(v) for v in self.read(np.full(len(addrs), lane), addrs))
+        return vals
+
+    def lane_output(self, lane: int) -> list:
+        """
+        Output lines of one lane, as a Simulator with trace policy 'final'
+        produces them: the last state (if any step ran), then the dump.
+        """
+        lines = []
+        if self.count[lane]:
+            lines.append(STATE_FORMAT.format(int(self.pc[lane]), *self.lane_regs(lane)))
+        lines.extend(format(val, '032b') for val in self.lane_dump(lane))
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lockstep RISC-V simulator')
+    parser.add_argument('input', help='Program file')
+    parser.add_argument('images', help='Data images, one per lane, back to back')
+    parser.add_argument('output', help='Output prefix: lane i is written to <output>.<i>')
+    parser.add_argument('--format', choices=['binary', 'hex', 'raw'], default='binary',
+                      help='Input format (default: binary)')
+    parser.add_argument('--image-size', type=int, default=None,
+                      help='Bytes per data image (default: size of the data segment)')
+    parser.add_argument('--max-instr', type=int, default=1000,
+                      help='Maximum number of instructions per lane')
+    args = parser.parse_args()
+
+    try:
+        prog = read_program(args.input, args.format)
+        with open(args.images, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError as e:
+        print(f"Error: Could not open input file '{e.filename}'")
+        sys.exit(1)
+
+    size = args.image_size
+    if size is None:
+        sim = Simulator()
+        size = sim.DATA_END + 1 - sim.DATA_START
+    if size <= 0 or len(raw) % size:
+        print(f"Error: '{args.images}' is not a whole number of {size}-byte images")
+        sys.exit(1)
+    data = np.frombuffer(raw, dtype=np.uint8).reshape(-1, size)
+
+    sim = LockstepSimulator(prog, data, fmt=args.format)
+    sim.run(max=args.max_instr)
+    for lane in range(sim.lanes):
+        with open(f'{args.output}.{lane}', 'w') as f:
+            f.writelines(line + '\n' for line in sim.lane_output(lane))
+
+
+if __name__ == '__main__':
+    main()
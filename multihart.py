@@ -0,0 +1,319 @@
+"""
+Multi-hart simulation: N harts, each a Simulator with its own PC,
+registers and counters, all sharing one memory.
+
+Two ways to run them:
+  - Interleaved (MultiHart): the harts take turns in one process in a
+    fixed round-robin order, each running up to quantum instructions per
+    turn, so runs are deterministic. The harts also share the decoded
+    instruction cache and the translated blocks, so a store by any hart is
+    seen by every other and a store into program memory invalidates the
+    code of all of them.
+  - Processes (run_processes): each hart runs in its own process over one
+    multiprocessing shared memory block holding every segment, using all
+    cores. Meant for harts that do not communicate, such as each working
+    on its own slice of DATA: stores reach the other harts, but in no
+    defined order, and each process caches decoded code for itself.
+
+Every hart starts at the start of the code segment with a0 (x10) holding
+its hart number and a1 (x11) the number of harts, so one program can split
+the work between them. Hart i's trace, followed by the final memory dump,
+is written to <output>.<i> in the format of a single-hart run.
+
+Usage: python multihart.py program.txt output-prefix --harts 4
+       [--quantum N | --processes] [--max-instr N] [--engine interp|translate]
+       [--trace-format text|binary] [--trace POLICY] [--memory-map SPEC]
+"""
+import sys
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+
+from simulator import (DEFAULT_MEMORY_MAP, PAGE_BITS, BinaryTraceWriter, Simulator, TraceWriter,
+                       parse_memory_map, parse_trace_policy, read_program)
+
+# Registers holding the hart number and the number of harts at start
+HART_ID_REG = 10     # a0
+HART_COUNT_REG = 11  # a1
+
+
+def open_trace(path: str, trace_format: str = 'text'):
+    """
+    The trace writer simulate() would use for path.
+    """
+    if trace_format == 'binary':
+        return BinaryTraceWriter(path)
+    return TraceWriter(path)
+
+
+def start_hart(sim: Simulator, hart: int, harts: int):
+    """
+    Set the start-up registers of hart number hart out of harts.
+    """
+    sim.regs[HART_ID_REG] = hart
+    sim.regs[HART_COUNT_REG] = harts
+
+
+class MultiHart:
+    """
+    N harts interleaved round-robin over one shared memory. traces holds
+    one trace writer per hart (see Simulator); without it each hart
+    collects its output in a list.
+    """
+    def __init__(self, prog, harts: int = 2, fmt: str = 'binary', quantum: int = 100,
+                 engine: str = 'interp', traces=None, trace_policy: str = 'every',
+                 memory_map=DEFAULT_MEMORY_MAP):
+        if harts < 1:
+            raise ValueError(f'need at least one hart, not {harts}')
+        if quantum < 1:
+            raise ValueError(f'quantum must be positive, not {quantum}')
+        if traces is None:
+            traces = [None] * harts
+        if len(traces) != harts:
+            raise ValueError(f'{len(traces)} traces for {harts} harts')
+        self.quantum = quantum
+        self.harts = []
+        for hart, trace in enumerate(traces):
+            sim = Simulator(engine=engine, trace=trace, trace_policy=trace_policy,
+                            memory_map=memory_map)
+            if self.harts:
+                # The caches are shared by object, and Simulator.write()
+                # only ever mutates them in place
+                first = self.harts[0]
+                sim.memory = first.memory
+                sim.decoded = first.decoded
+                sim.blocks = first.blocks
+                sim.batched_blocks = first.batched_blocks
+                sim.untraced_blocks = first.untraced_blocks
+            else:
+                sim.load(prog, fmt=fmt)
+            start_hart(sim, hart, harts)
+            self.harts.append(sim)
+        self.memory = self.harts[0].memory
+        self.seconds = 0.0
+
+    def run(self, max: int = 1000):
+        """
+        Run every hart until it halts, stops on an unsupported instruction
+        or PC, or has executed max instructions, then write each hart's
+        final trace line and memory dump.
+        """
+        hooks = [sim.step_hook() for sim in self.harts]
+        active = list(range(len(self.harts)))
+        start = time.perf_counter()
+        while active:
+            running = []
+            for hart in active:
+                sim = self.harts[hart]
+                target = min(max, sim.count + self.quantum)
+                sim.advance(target, hooks[hart])
+                if sim.count == target < max and not sim.halted:
+                    running.append(hart)
+            active = running
+        self.seconds = time.perf_counter() - start
+        for sim in self.harts:
+            sim.finish()
+
+    def instructions(self) -> int:
+        return sum(sim.count for sim in self.harts)
+
+
+# ===== PROCESS MODE =====
+
+def shared_pages(sim: Simulator) -> list:
+    """
+    Page numbers an in-range access can touch: every page of a segment,
+    and the up to 3 bytes a word access may spill past its end.
+    """
+    memory = sim.memory
+    pages = set()
+    for _, start, end in memory.regions:
+        last = min(end + 3, memory.limit - 1)
+        pages.update(range(start >> PAGE_BITS, (last >> PAGE_BITS) + 1))
+    return sorted(pages)
+
+
+def run_hart(hart: int, harts: int, name: str, pages: list, output: str, options: dict,
+             max_instr: int, trace_format: str, barrier, results):
+    """
+    Process body of one hart: run over the shared memory block name, then
+    wait for every other hart before dumping the final memory. Reports
+    (hart, instructions, seconds, error or None) on results. If another
+    hart fails first, the barrier is broken and this hart fails too, since
+    the final memory it would dump is not the final memory of the run.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    sim = None
+    try:
+        with open_trace(output, trace_format) as trace:
+            sim = Simulator(trace=trace, **options)
+            sim.memory.map_buffer(block.buf, pages)
+            start_hart(sim, hart, harts)
+            start = time.perf_counter()
+            sim.advance(max_instr, sim.step_hook())
+            seconds = time.perf_counter() - start
+            barrier.wait()
+            sim.finish()
+        results.put((hart, sim.count, seconds, None))
+    except threading.BrokenBarrierError:
+        results.put((hart, 0, 0.0, 'another hart failed before the final memory dump'))
+    except Exception as e:
+        barrier.abort()
+        results.put((hart, 0, 0.0, f'{type(e).__name__}: {e}'))
+    finally:
+        # The pages are views of the block, which cannot close under them;
+        # the simulator itself may live on in reference cycles until the
+        # next collection
+        if sim is not None:
+            sim.memory = None
+        block.close()
+
+
+def collect_reports(workers: list, results, barrier) -> list:
+    """
+    Wait for the report of every hart process on results, in hart order.
+    Polls the processes while waiting, so one that dies before reporting
+    cannot block the run: it is reported as failed and the barrier is
+    broken to release the harts waiting for it.
+    """
+    reports = {}
+    exited = False
+    while len(reports) < len(workers):
+        try:
+            report = results.get(timeout=0.1)
+        except queue.Empty:
+            # Once every process has exited, anything they put is readable,
+            # so a get() that then times out has drained the queue
+            if exited:
+                break
+            exited = all(worker.exitcode is not None for worker in workers)
+            if any(worker.exitcode not in (None, 0) and hart not in reports
+                   for hart, worker in enumerate(workers)):
+                barrier.abort()
+            continue
+        reports[report[0]] = report
+    for hart, worker in enumerate(workers):
+        if hart not in reports:
+            reports[hart] = (hart, 0, 0.0, f'worker process died (exit code {worker.exitcode})')
+    return [reports[hart] for hart in range(len(workers))]
+
+
+def run_processes(prog, outputs: list, fmt: str = 'binary', max_instr: int = 1000,
+                  engine: str = 'interp', trace_format: str = 'text',
+                  trace_policy: str = 'every', memory_map=DEFAULT_MEMORY_MAP) -> list:
+    """
+    Run one hart per output path, each in its own process, over one shared
+    memory block. Returns (hart, instructions, seconds, error or None) per
+    hart, in hart order; seconds cover execution only. A hart whose process
+    dies without reporting (killed, or out of memory) is reported as failed.
+    """
+    template = Simulator(memory_map=memory_map)
+    template.load(prog, fmt=fmt)
+    pages = shared_pages(template)
+    block = shared_memory.SharedMemory(create=True, size=max(len(pages), 1) << PAGE_BITS)
+    try:
+        template.memory.map_buffer(block.buf, pages)
+        template.memory = None
+
+        harts = len(outputs)
+        barrier = multiprocessing.Barrier(harts)
+        results = multiprocessing.Queue()
+        options = dict(engine=engine, trace_policy=trace_policy, memory_map=memory_map)
+        workers = [multiprocessing.Process(target=run_hart,
+                                           args=(hart, harts, block.name, pages, output, options,
+                                                 max_instr, trace_format, barrier, results))
+                   for hart, output in enumerate(outputs)]
+        for worker in workers:
+            worker.start()
+        reports = collect_reports(workers, results, barrier)
+        for worker in workers:
+            worker.join()
+        return reports
+    finally:
+        block.close()
+        block.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-hart RISC-V simulator')
+    parser.add_argument('input', help='Program file (use - for stdin)')
+    parser.add_argument('output', help='Output prefix: hart i is written to <output>.<i>')
+    parser.add_argument('--format', choices=['binary', 'hex', 'raw'], default='binary',
+                      help='Input format (default: binary)')
+    parser.add_argument('--harts', type=int, default=2,
+                      help='Number of harts (default: 2)')
+    parser.add_argument('--quantum', type=int, default=100,
+                      help='Instructions per round-robin turn (default: 100)')
+    parser.add_argument('--processes', action='store_true',
+                      help='Run each hart in its own process (for harts that do not communicate)')
+    parser.add_argument('--max-instr', type=int, default=1000,
+                      help='Maximum number of instructions per hart')
+    parser.add_argument('--engine', choices=['interp', 'translate'], default='interp',
+                      help='Execution engine (default: interp)')
+    parser.add_argument('--trace-format', choices=['text', 'binary'], default='text',
+                      help='Output format (default: text)')
+    parser.add_argument('--trace', default='every',
+                      help='Steps to trace (default: every)')
+    parser.add_argument('--memory-map', default=None,
+                      help='Memory segments as name=start:end,...')
+    args = parser.parse_args()
+    if args.harts < 1 or args.quantum < 1:
+        parser.error('--harts and --quantum must be positive')
+    try:
+        parse_trace_policy(args.trace)
+        memory_map = parse_memory_map(args.memory_map) if args.memory_map else DEFAULT_MEMORY_MAP
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        prog = read_program(args.input, args.format)
+    except FileNotFoundError:
+        print(f"Error: Could not open input file '{args.input}'")
+        sys.exit(1)
+
+    outputs = [f'{args.output}.{hart}' for hart in range(args.harts)]
+    try:
+        if args.processes:
+            start = time.perf_counter()
+            reports = run_processes(prog, outputs, args.format, args.max_instr, args.engine,
+                                    args.trace_format, args.trace, memory_map)
+            wall = time.perf_counter() - start
+        else:
+            traces = [open_trace(output, args.trace_format) for output in outputs]
+            try:
+                machine = MultiHart(prog, args.harts, args.format, args.quantum, args.engine,
+                                    traces, args.trace, memory_map)
+                machine.run(max=args.max_instr)
+            finally:
+                for trace in traces:
+                    trace.close()
+            wall = machine.seconds
+            reports = [(hart, sim.count, None, None) for hart, sim in enumerate(machine.harts)]
+    except ValueError as e:
+        print(f"Error: {args.input}: {e}")
+        sys.exit(1)
+    except IOError:
+        print(f"Error: Could not write to output '{args.output}.*'")
+        sys.exit(1)
+
+    failed = 0
+    for hart, count, seconds, error in reports:
+        if error is not None:
+            failed += 1
+            print(f"hart {hart}: FAILED: {error}")
+        elif seconds is not None:
+            print(f"hart {hart}: {count:9d} instr in {seconds * 1000:9.2f} ms")
+        else:
+            print(f"hart {hart}: {count:9d} instr")
+    total = sum(count for _, count, _, _ in reports)
+    span = max((seconds for _, _, seconds, _ in reports if seconds), default=wall)
+    print(f"{args.harts} harts, {total} instructions in {span:.3f} s, "
+          f"{total / span if span else 0:,.0f} instr/s aggregate")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Timing model of a classic in-order five-stage pipeline (IF/ID/EX/MEM/WB)
+driven by the functional simulator: it attaches as a per-instruction hook
+and accounts for the cycles each instruction would take.
+
+Modelled hazards:
+  - Data hazards, with forwarding 'full' (EX/MEM and MEM/WB bypasses to EX,
+    and to MEM for store data), 'mem' (MEM/WB bypass only) or 'none'
+    (operands are read in ID after the producer's WB)
+  - Load-use stalls, reported separately from other data stalls
+  - Control hazards: branches and jalr resolve in EX; a mispredicted
+    branch or any jalr costs branch_penalty cycles. Predictors are
+    pluggable (see PREDICTORS).
+
+Usage: python simulator.py program.txt output.txt --pipeline 2bit
+       [--forwarding full|mem|none] [--pipeline-json FILE]
+"""
+import json
+
+from simulator import ADD, ADDI, AND, BEQ, BLT, BNE, JALR, LW, OR, SLT, SRL, SUB, SW, X0_SINK
+from profiler import labeler
+
+# Stall causes, in report order
+STALL_CAUSES = ('load_use', 'data', 'branch', 'jump')
+
+
+# ===== BRANCH PREDICTORS =====
+
+class NotTakenPredictor:
+    """
+    Static: every branch is predicted not taken.
+    """
+    name = 'not-taken'
+
+    def predict(self, pc: int, offset: int) -> bool:
+        return False
+
+    def update(self, pc: int, taken: bool):
+        pass
+
+
+class BTFNPredictor(NotTakenPredictor):
+    """
+    Static: backward branches (loops) predicted taken, forward not taken.
+    """
+    name = 'btfn'
+
+    def predict(self, pc: int, offset: int) -> bool:
+        return offset & 0x80000000 != 0
+
+
+class TwoBitPredictor:
+    """
+    A table of 2-bit saturating counters indexed by PC, starting weakly
+    not taken.
+    """
+    name = '2bit'
+
+    def __init__(self, entries: int = 1024):
+        self.mask = entries - 1
+        self.counters = bytearray([1]) * entries
+
+    def predict(self, pc: int, offset: int) -> bool:
+        return self.counters[(pc >> 2) & self.mask] >= 2
+
+    def update(self, pc: int, taken: bool):
+        i = (pc >> 2) & self.mask
+        counter = self.counters[i]
+        if taken:
+            if counter < 3:
+                self.counters[i] = counter + 1
+        elif counter:
+            self.counters[i] = counter - 1
+
+
+PREDICTORS = {cls.name: cls for cls in (NotTakenPredictor, BTFNPredictor, TwoBitPredictor)}
+
+
+# ===== PIPELINE MODEL =====
+
+class PipelineModel:
+    """
+    Cycle accounting for the instructions of every Simulator it is attached
+    to. predictor is a name from PREDICTORS or an object with
+    predict(pc, offset) and update(pc, taken); forwarding is 'full', 'mem'
+    or 'none'. symbols ({label: address}) labels PCs in reports.
+    """
+    def __init__(self, predictor='not-taken', forwarding: str = 'full',
+                 branch_penalty: int = 2, symbols: dict = None):
+        if isinstance(predictor, str):
+            if predictor not in PREDICTORS:
+                raise ValueError(f"unknown predictor '{predictor}' "
+                                 f"(expected one of {', '.join(PREDICTORS)})")
+            predictor = PREDICTORS[predictor]()
+        if forwarding not in ('full', 'mem', 'none'):
+            raise ValueError(f"unknown forwarding mode '{forwarding}' (expected full, mem or none)")
+        self.predictor = predictor
+        self.forwarding = forwarding
+        self.branch_penalty = branch_penalty
+        self.symbols = symbols if symbols is not None else {}
+
+        # Cycle in which the last instruction was in EX; the first one
+        # reaches EX in cycle 3
+        self.last_ex = 2
+        self.instructions = 0
+        self.branches = 0
+        self.mispredicted = 0
+        self.stalls = dict.fromkeys(STALL_CAUSES, 0)
+        # pc -> stall cycles per cause (in STALL_CAUSES order)
+        self.pc_stalls = {}
+
+        # Earliest EX cycle in which a consumer can use each register, and
+        # whether that register was last written by a load
+        self.ready = [0] * 33
+        self.loaded = [False] * 33
+        # Per decoded record: (EX sources, MEM sources, destination, kind)
+        self.info = {}
+
+        # Cycles after a producer's EX until its result reaches a consumer's
+        # EX (ALU result, load result), and the slack of store data, which
+        # is only needed in MEM
+        self.alu_latency, self.load_latency = {'full': (1, 2), 'mem': (2, 2), 'none': (3, 3)}[forwarding]
+        self.store_slack = 1 if forwarding == 'full' else 0
+
+    def classify(self, rec: tuple) -> tuple:
+        kind, a, b, c = rec
+        if kind in (ADD, SUB, SLT, OR, AND):
+            return (b, c), (), a, kind
+        if kind in (SRL, ADDI, LW, JALR):
+            return (b,), (), a, kind
+        if kind == SW:
+            if self.store_slack:
+                return (a,), (b,), X0_SINK, kind
+            return (a, b), (), X0_SINK, kind
+        if kind in (BEQ, BNE, BLT):
+            return (a, b), (), X0_SINK, kind
+        return (), (), X0_SINK, kind
+
+    def attach(self, sim):
+        """
+        Time every instruction sim runs from now on.
+        """
+        sim.add_hook(self.hook(sim))
+
+    def hook(self, sim):
+        model = self
+        info, ready, loaded = self.info, self.ready, self.loaded
+        regs, predictor = sim.regs, self.predictor
+        alu_latency, load_latency = self.alu_latency, self.load_latency
+        store_slack, penalty = self.store_slack, self.branch_penalty
+
+        def hook(pc, rec):
+            entry = info.get(rec)
+            if entry is None:
+                entry = info[rec] = model.classify(rec)
+            ex_srcs, mem_srcs, dest, kind = entry
+
+            # Earliest EX cycle: one after the previous instruction, later
+            # if an operand is not ready yet
+            ex = model.last_ex + 1
+            need, cause = ex, None
+            for r in ex_srcs:
+                if ready[r] > need:
+                    need, cause = ready[r], loaded[r]
+            for r in mem_srcs:
+                if ready[r] - store_slack > need:
+                    need, cause = ready[r] - store_slack, loaded[r]
+            if cause is not None:
+                model.stall(pc, 'load_use' if cause else 'data', need - ex)
+                ex = need
+
+            if dest != X0_SINK:
+                if kind == LW:
+                    ready[dest], loaded[dest] = ex + load_latency, True
+                else:
+                    ready[dest], loaded[dest] = ex + alu_latency, False
+
+            # Control flow resolves in EX; a wrong guess flushes the
+            # instructions fetched behind it
+            if BEQ <= kind <= BLT:
+                x, y = regs[rec[1]], regs[rec[2]]
+                if kind == BEQ:
+                    taken = x == y
+                elif kind == BNE:
+                    taken = x != y
+                else:
+                    taken = (x ^ 0x80000000) < (y ^ 0x80000000)
+                model.branches += 1
+                if predictor.predict(pc, rec[3]) != taken:
+                    model.mispredicted += 1
+                    model.stall(pc, 'branch', penalty)
+                    ex += penalty
+                predictor.update(pc, taken)
+            elif kind == JALR:
+                model.stall(pc, 'jump', penalty)
+                ex += penalty
+
+            model.last_ex = ex
+            model.instructions += 1
+
+        return hook
+
+    def stall(self, pc: int, cause: str, cycles: int):
+        self.stalls[cause] += cycles
+        counts = self.pc_stalls.get(pc)
+        if counts is None:
+            counts = self.pc_stalls[pc] = [0] * len(STALL_CAUSES)
+        counts[STALL_CAUSES.index(cause)] += cycles
+
+    # ----- results -----
+
+    def cycles(self) -> int:
+        """
+        Cycles until the last instruction leaves WB.
+        """
+        return self.last_ex + 2 if self.instructions else 0
+
+    def report(self) -> dict:
+        """
+        CPI, stall breakdown and per-PC stall attribution as a
+        JSON-serializable dict.
+        """
+        cycles = self.cycles()
+        label = labeler(self.symbols)
+        ranked = sorted(self.pc_stalls.items(), key=lambda item: (-sum(item[1]), item[0]))
+        return {
+            'predictor': self.predictor.name,
+            'forwarding': self.forwarding,
+            'branch_penalty': self.branch_penalty,
+            'instructions': self.instructions,
+            'cycles': cycles,
+            'cpi': cycles / self.instructions if self.instructions else 0.0,
+            'stalls': dict(self.stalls),
+            'branches': self.branches,
+            'mispredicted': self.mispredicted,
+            'accuracy': 1 - self.mispredicted / self.branches if self.branches else 1.0,
+            'pcs': [dict(pc=pc, label=label(pc), total=sum(counts), **dict(zip(STALL_CAUSES, counts)))
+                    for pc, counts in ranked],
+        }
+
+    def write_json(self, f):
+        json.dump(self.report(), f, indent=2)
+        f.write('\n')
+
+    def summary(self, n: int = 10) -> list:
+        """
+        Report lines: CPI, stalls by cause and the n PCs with most stalls.
+        """
+        report = self.report()
+        lines = [f"pipeline ({report['predictor']} predictor, {report['forwarding']} forwarding): "
+                 f"{report['instructions']} instructions, {report['cycles']} cycles, "
+                 f"CPI {report['cpi']:.3f}",
+                 '  stalls: ' + ', '.join(f'{cause} {cycles}' for cause, cycles in report['stalls'].items()),
+                 f"  branches: {report['branches']}, mispredicted {report['mispredicted']} "
+                 f"({100 * report['accuracy']:.1f}% accuracy)"]
+        for entry in report['pcs'][:n]:
+            causes = ', '.join(f'{cause} {entry[cause]}' for cause in STALL_CAUSES if entry[cause])
+            lines.append(f"  0x{entry['pc']:08x}  {entry['label']:20s} {entry['total']:8d}  {causes}")
+        return lines
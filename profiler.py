@@ -0,0 +1,201 @@
+"""
+Instruction-level profiler for the simulator: execution counts per
+instruction, per major opcode and per PC, taken/not-taken counts for every
+conditional branch site, and a cycle estimate from a configurable cost
+table. Results export as JSON or as a hotspot report sorted by cycles.
+
+A Profiler attaches to a Simulator as a per-instruction hook; simulators
+without one run the untraced paths and pay nothing for it.
+
+Usage: python simulator.py program.txt output.txt --profile profile.json
+       [--hotspots N] [--cycle-costs lw=3,taken=2] [--symbols program.sym]
+"""
+import json
+from bisect import bisect_right
+
+from simulator import BEQ, BLT, BNE, KIND_NAMES, KIND_OPCODES
+
+# Cycles per instruction by mnemonic (1 when not listed), plus the extra
+# cycles of a taken conditional branch
+DEFAULT_COSTS = {'lw': 3, 'sw': 2, 'jalr': 2, 'taken': 2}
+
+
+def labeler(symbols: dict):
+    """
+    A function giving a PC as label+offset from the nearest symbol at or
+    below it (symbols is {label: address}), or in hex.
+    """
+    table = sorted((addr, name) for name, addr in symbols.items())
+    addrs = [addr for addr, _ in table]
+    def label(pc: int) -> str:
+        i = bisect_right(addrs, pc) - 1
+        if i < 0:
+            return f'0x{pc:08x}'
+        addr, name = table[i]
+        return name if addr == pc else f'{name}+0x{pc - addr:x}'
+    return label
+
+
+def parse_cycle_costs(spec: str) -> dict:
+    """
+    Parse a cost table given as name=cycles,... where name is a mnemonic
+    or 'taken'. Raises ValueError.
+    """
+    costs = {}
+    for item in spec.split(','):
+        name, sep, cycles = item.strip().partition('=')
+        if not sep or (name not in KIND_NAMES and name != 'taken'):
+            raise ValueError(f"invalid cycle cost '{item}' (expected mnemonic=cycles or taken=cycles)")
+        try:
+            costs[name] = int(cycles)
+        except ValueError:
+            raise ValueError(f"invalid cycle count in '{item}'")
+        if costs[name] < 0:
+            raise ValueError(f"negative cycle count in '{item}'")
+    return costs
+
+
+class Profiler:
+    """
+    Collects an execution profile from every Simulator it is attached to.
+    costs overrides entries of DEFAULT_COSTS; symbols ({label: address},
+    as the assembler writes them) labels PCs in reports.
+    """
+    def __init__(self, costs: dict = None, symbols: dict = None):
+        self.costs = dict(DEFAULT_COSTS)
+        if costs:
+            self.costs.update(costs)
+        self.symbols = symbols if symbols is not None else {}
+
+        # Executions keyed by pc << 4 | kind, so one dict update per step
+        # covers the per-PC and per-instruction counts
+        self.counts = {}
+        # Taken executions by conditional branch PC
+        self.taken = {}
+
+    def attach(self, sim):
+        """
+        Profile every instruction sim runs from now on.
+        """
+        sim.add_hook(self.hook(sim))
+
+    def hook(self, sim):
+        counts, taken, regs = self.counts, self.taken, sim.regs
+        def hook(pc, rec):
+            kind = rec[0]
+            key = pc << 4 | kind
+            counts[key] = counts.get(key, 0) + 1
+            if BEQ <= kind <= BLT:
+                # Branches write no registers, so the outcome can be
+                # recomputed from the operands
+                a, b = regs[rec[1]], regs[rec[2]]
+                if kind == BEQ:
+                    hit = a == b
+                elif kind == BNE:
+                    hit = a != b
+                else:
+                    hit = (a ^ 0x80000000) < (b ^ 0x80000000)
+                if hit:
+                    taken[pc] = taken.get(pc, 0) + 1
+        return hook
+
+    # ----- results -----
+
+    def cost(self, kind: int) -> int:
+        return self.costs.get(KIND_NAMES[kind], 1)
+
+    def instructions(self) -> int:
+        return sum(self.counts.values())
+
+    def cycles(self) -> int:
+        """
+        Estimated cycles: each instruction's cost plus the taken-branch
+        penalty.
+        """
+        total = sum(n * self.cost(key & 0xF) for key, n in self.counts.items())
+        return total + self.costs['taken'] * sum(self.taken.values())
+
+    def by_instruction(self) -> dict:
+        """
+        Executions per mnemonic, most frequent first.
+        """
+        counts = {}
+        for key, n in self.counts.items():
+            name = KIND_NAMES[key & 0xF]
+            counts[name] = counts.get(name, 0) + n
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def by_opcode(self) -> dict:
+        """
+        Executions per major opcode (as '0x33', ...), most frequent first.
+        """
+        counts = {}
+        for key, n in self.counts.items():
+            op = KIND_OPCODES[key & 0xF]
+            name = f'0x{op:02x}' if op is not None else 'invalid'
+            counts[name] = counts.get(name, 0) + n
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def by_pc(self) -> dict:
+        """
+        {pc: (executions, cycles)} in PC order.
+        """
+        pcs = {}
+        for key, n in sorted(self.counts.items()):
+            pc = key >> 4
+            count, cycles = pcs.get(pc, (0, self.costs['taken'] * self.taken.get(pc, 0)))
+            pcs[pc] = (count + n, cycles + n * self.cost(key & 0xF))
+        return pcs
+
+    def branches(self) -> dict:
+        """
+        {pc: (taken, not taken)} for every conditional branch site executed.
+        """
+        executed = {}
+        for key, n in sorted(self.counts.items()):
+            if BEQ <= key & 0xF <= BLT:
+                executed[key >> 4] = executed.get(key >> 4, 0) + n
+        return {pc: (self.taken.get(pc, 0), n - self.taken.get(pc, 0))
+                for pc, n in executed.items()}
+
+    def report(self) -> dict:
+        """
+        The whole profile as a JSON-serializable dict.
+        """
+        instructions, cycles = self.instructions(), self.cycles()
+        branches = self.branches()
+        label = labeler(self.symbols)
+        return {
+            'instructions': instructions,
+            'cycles': cycles,
+            'cpi': cycles / instructions if instructions else 0.0,
+            'costs': self.costs,
+            'by_instruction': self.by_instruction(),
+            'by_opcode': self.by_opcode(),
+            'pcs': [{'pc': pc, 'label': label(pc), 'count': count, 'cycles': pc_cycles}
+                    for pc, (count, pc_cycles) in self.by_pc().items()],
+            'branches': [{'pc': pc, 'label': label(pc), 'taken': taken, 'not_taken': not_taken}
+                         for pc, (taken, not_taken) in branches.items()],
+        }
+
+    def write_json(self, f):
+        json.dump(self.report(), f, indent=2)
+        f.write('\n')
+
+    def hotspots(self, n: int = 20) -> list:
+        """
+        Report lines for the n PCs with the most cycles.
+        """
+        total = self.cycles() or 1
+        branches = self.branches()
+        label = labeler(self.symbols)
+        lines = [f'{self.instructions()} instructions, {self.cycles()} cycles',
+                 f'{"pc":>10}  {"label":20s} {"count":>10} {"cycles":>10} {"share":>6}  branch']
+        ranked = sorted(self.by_pc().items(), key=lambda item: (-item[1][1], item[0]))
+        for pc, (count, cycles) in ranked[:n]:
+            line = f'0x{pc:08x}  {label(pc):20s} {count:10d} {cycles:10d} {100 * cycles / total:5.1f}%'
+            if pc in branches:
+                taken, not_taken = branches[pc]
+                line += f'  {taken} taken / {not_taken} not'
+            lines.append(line)
+        return lines
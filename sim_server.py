@@ -0,0 +1,701 @@
+"""
+Long-running simulation server. Jobs arrive over a Unix socket or a TCP
+port and run on a pool of pre-warmed worker processes, each reusing one
+Simulator through Simulator.reset(), so a job pays neither interpreter
+start-up nor imports. Output streams back while a job runs.
+
+Each job runs for at most a fixed time, after which its worker is killed
+and replaced, and may ask for at most a fixed number of instructions, so
+one request cannot hold a worker indefinitely.
+
+Jobs wait in a bounded queue. When it is full the server stops reading
+from a connection until there is room again, so clients that send faster
+than the workers can keep up are slowed down by TCP flow control instead
+of growing the queue. Latency (from arrival to the last response) is
+tracked over the most recent jobs and reported as p50/p99.
+
+Protocol: one JSON object per line in each direction. Requests:
+  {"id": 1, "op": "simulate", "program": "...", "format": "binary",
+   "max_instr": 1000, "trace": "every", "trace_format": "text",
+   "engine": "interp", "dump": "full"}
+      program holds binary or hex lines, base64 of a raw image for format
+      "raw", or assembly source for format "asm"; all but program are
+      optional
+  {"id": 2, "op": "assemble", "source": "...", "output_format": "text"}
+  {"id": 3, "op": "metrics"}
+Responses carry the id of their request; the jobs of one connection run
+concurrently, so their responses may interleave:
+  {"id": 1, "data": "..."}     a chunk of output (base64 for binary
+                               traces and raw images)
+  {"id": 1, "done": {...}}     the job's summary, or the metrics
+  {"id": 1, "error": "..."}    the job failed
+
+Usage: python sim_server.py serve (--socket PATH | --port N) [--workers N] [--queue N]
+              [--timeout SECONDS] [--max-instr-limit N]
+       python sim_server.py submit (--socket PATH | --port N) program.txt [--format F]
+              [--max-instr N] [--trace POLICY] [--output FILE]
+       python sim_server.py load (--socket PATH | --port N) program.txt
+              [--clients N] [--requests N]
+"""
+import os
+import sys
+import json
+import time
+import queue
+import base64
+import signal
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+import multiprocessing
+from collections import deque
+
+from assembler_project import assemble_image, assemble_lines
+from simulator import BinaryTraceWriter, Simulator, TraceWriter, read_program
+
+# The virtual halt, run once by each worker to warm up
+WARMUP_PROGRAM = ['00000000000000000000000001100011']
+
+# Completed jobs kept for the latency percentiles
+LATENCY_WINDOW = 10000
+
+# Default limits on one job: seconds on a worker, and max_instr
+REQUEST_TIMEOUT = 60.0
+MAX_INSTR_LIMIT = 10_000_000
+
+
+# ===== WORKERS =====
+
+def run_request(sim: Simulator, request: dict, send, max_instr_limit: int = None) -> dict:
+    """
+    Run one assemble or simulate request on sim, passing each chunk of
+    output to send. Returns the job summary. Raises ValueError (and
+    KeyError for a missing field) for a bad request, including one asking
+    for more than max_instr_limit instructions.
+    """
+    op = request.get('op')
+    start = time.perf_counter()
+    if op == 'assemble':
+        source = request['source'].splitlines()
+        if request.get('output_format', 'text') == 'raw':
+            send(base64.b64encode(assemble_image(source)).decode())
+        else:
+            send(''.join(f'{word:032b}\n' for word in assemble_lines(source)))
+        return {'seconds': time.perf_counter() - start}
+    if op != 'simulate':
+        raise ValueError(f"unknown op '{op}'")
+
+    fmt = request.get('format', 'binary')
+    program = request['program']
+    if fmt == 'raw':
+        prog = base64.b64decode(program)
+    elif fmt == 'asm':
+        prog, fmt = assemble_image(program.splitlines()), 'raw'
+    elif fmt in ('binary', 'hex'):
+        prog = program.splitlines()
+    else:
+        raise ValueError(f"unknown format '{fmt}'")
+    engine = request.get('engine', 'interp')
+    if engine not in ('interp', 'translate'):
+        raise ValueError(f"unknown engine '{engine}'")
+    max_instr = int(request.get('max_instr', 1000))
+    if max_instr_limit is not None and max_instr > max_instr_limit:
+        raise ValueError(f"max_instr {max_instr} is over the server limit of {max_instr_limit}")
+
+    if request.get('trace_format', 'text') == 'binary':
+        trace = BinaryTraceWriter(lambda chunk: send(base64.b64encode(chunk).decode()))
+    else:
+        trace = TraceWriter(send)
+    sim.reset(trace, request.get('trace', 'every'), engine, request.get('dump', 'full'))
+    sim.load(prog, fmt=fmt)
+    sim.run(max=max_instr)
+    trace.close()
+    return {'instructions': sim.count, 'pc': sim.pc, 'halted': sim.halted,
+            'seconds': time.perf_counter() - start}
+
+
+def worker_main(conn, max_instr_limit: int = None):
+    """
+    Process body of a worker: run requests from conn until None arrives,
+    answering each with ('data', chunk) messages, then ('done', summary)
+    or ('error', message). Interrupts are left to the server, which
+    stops the workers once their jobs are done.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sim = Simulator()
+    sim.load(WARMUP_PROGRAM)
+    sim.run()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return  # The server is gone
+        if request is None:
+            return
+        try:
+            conn.send(('done', run_request(sim, request, lambda chunk: conn.send(('data', chunk)),
+                                           max_instr_limit)))
+        except Exception as e:
+            conn.send(('error', f'{type(e).__name__}: {e}'))
+
+
+# ===== SERVER =====
+
+def percentile(values: list, q: float) -> float:
+    """
+    Nearest-rank percentile of sorted values (0 when empty).
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(q * len(values) + 0.999999) - 1))]
+
+
+class Metrics:
+    """
+    Job counts and the latencies of the last LATENCY_WINDOW jobs.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.completed = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def record(self, seconds: float, ok: bool):
+        with self.lock:
+            self.latencies.append(seconds)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def report(self) -> dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            completed, failed = self.completed, self.failed
+        uptime = time.perf_counter() - self.started
+        return {
+            'completed': completed,
+            'failed': failed,
+            'uptime_s': uptime,
+            'jobs_per_s': (completed + failed) / uptime if uptime else 0.0,
+            'p50_ms': 1000 * percentile(latencies, 0.50),
+            'p99_ms': 1000 * percentile(latencies, 0.99),
+            'max_ms': 1000 * latencies[-1] if latencies else 0.0,
+        }
+
+
+class Connection:
+    """
+    The sending side of one client connection, shared by the threads
+    answering its jobs, and a count of its jobs still running. Writes have
+    a lock of their own, so a client that reads slowly holds up only the
+    responses to itself, never the job accounting.
+    """
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.write_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.pending = 0
+        self.closed = False
+
+    def send(self, message: dict):
+        if self.closed:
+            return
+        data = (json.dumps(message) + '\n').encode()
+        with self.write_lock:
+            if self.closed:
+                return
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except OSError:
+                # The client went away, or stopped reading for longer than
+                # the send timeout; drop its output
+                self.closed = True
+
+    def begin(self):
+        with self.lock:
+            self.pending += 1
+
+    def end(self):
+        with self.lock:
+            self.pending -= 1
+            self.idle.notify_all()
+
+    def wait(self):
+        """
+        Wait until every job of this connection has finished.
+        """
+        with self.lock:
+            while self.pending:
+                self.idle.wait()
+
+
+class Job:
+    def __init__(self, request: dict, client: Connection):
+        self.request = request
+        self.id = request.get('id')
+        self.client = client
+        self.arrived = time.perf_counter()
+
+
+class SimulationServer:
+    """
+    A pool of worker processes fed from a bounded job queue, one
+    dispatcher thread per worker relaying its output to the client. A job
+    still running timeout seconds after it reached its worker is failed
+    and the worker replaced (None for no limit); max_instr_limit caps the
+    instructions a job may ask for.
+    """
+    def __init__(self, workers: int = None, queue_size: int = 64,
+                 timeout: float = REQUEST_TIMEOUT, max_instr_limit: int = MAX_INSTR_LIMIT):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_instr_limit = max_instr_limit
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.metrics = Metrics()
+        self.context = multiprocessing.get_context('spawn')  # Safe alongside threads
+        self.pipes = [None] * self.workers
+        self.processes = [None] * self.workers
+        self.threads = []
+        self.lock = threading.Lock()
+        self.busy = 0
+
+    def start(self):
+        """
+        Start (and warm up) every worker, then the dispatchers.
+        """
+        for slot in range(self.workers):
+            self.start_worker(slot)
+        for slot in range(self.workers):
+            thread = threading.Thread(target=self.dispatch, args=(slot,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def start_worker(self, slot: int):
+        pipe, child = self.context.Pipe()
+        process = self.context.Process(target=worker_main, args=(child, self.max_instr_limit),
+                                       daemon=True)
+        process.start()
+        child.close()
+        self.pipes[slot], self.processes[slot] = pipe, process
+
+    def replace_worker(self, slot: int):
+        """
+        Kill the worker in slot, if it is still running, and start another.
+        """
+        self.processes[slot].kill()
+        self.processes[slot].join()
+        self.pipes[slot].close()
+        self.start_worker(slot)
+
+    def stop(self):
+        """
+        Let queued jobs finish, then stop the workers.
+        """
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        for pipe, process in zip(self.pipes, self.processes):
+            pipe.send(None)
+            process.join()
+
+    def submit(self, job: Job):
+        """
+        Queue a job, blocking while the queue is full.
+        """
+        job.client.begin()
+        self.jobs.put(job)
+
+    def dispatch(self, slot: int):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            with self.lock:
+                self.busy += 1
+            ok = self.forward(slot, job)
+            self.metrics.record(time.perf_counter() - job.arrived, ok)
+            with self.lock:
+                self.busy -= 1
+            job.client.end()
+
+    def forward(self, slot: int, job: Job) -> bool:
+        """
+        Run job on a worker, relaying its messages. Returns whether it
+        succeeded.
+        """
+        pipe = self.pipes[slot]
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        try:
+            pipe.send(job.request)
+            while True:
+                if deadline is not None and not pipe.poll(max(deadline - time.perf_counter(), 0)):
+                    job.client.send({'id': job.id,
+                                     'error': f'timed out after {self.timeout:g} s'})
+                    self.replace_worker(slot)
+                    return False
+                kind, value = pipe.recv()
+                if kind == 'data':
+                    job.client.send({'id': job.id, 'data': value})
+                else:
+                    job.client.send({'id': job.id, kind: value})
+                    return kind == 'done'
+        except (EOFError, OSError):
+            # The worker died in the middle of the job: replace it
+            job.client.send({'id': job.id, 'error': 'worker failed'})
+            self.replace_worker(slot)
+            return False
+
+    def report(self) -> dict:
+        report = self.metrics.report()
+        report.update(workers=self.workers, busy=self.busy, queued=self.jobs.qsize(),
+                      queue_size=self.jobs.maxsize)
+        return report
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        simulation = self.server.simulation
+        if simulation.timeout is not None:
+            # A client that stops reading its responses is dropped rather
+            # than holding up a worker's dispatcher for ever
+            seconds = max(simulation.timeout, 1.0)
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                                       struct.pack('ll', int(seconds), int(seconds % 1 * 1e6)))
+        client = Connection(self.wfile)
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError
+            except ValueError:
+                client.send({'id': None, 'error': 'invalid request: expected a JSON object'})
+                continue
+            if request.get('op') == 'metrics':
+                client.send({'id': request.get('id'), 'done': simulation.report()})
+                continue
+            # Blocks while the queue is full, and this connection is not
+            # read meanwhile
+            simulation.submit(Job(request, client))
+        client.wait()
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(simulation: SimulationServer, path: str = None, host: str = '127.0.0.1',
+                port: int = None):
+    """
+    A socket server for simulation on the Unix socket path, or else on
+    host:port.
+    """
+    if path is not None:
+        if os.path.exists(path):
+            os.unlink(path)
+        server = UnixServer(path, RequestHandler)
+    else:
+        server = TCPServer((host, port), RequestHandler)
+    server.simulation = simulation
+    return server
+
+
+# ===== CLIENT =====
+
+class Client:
+    """
+    A blocking client running one request at a time over one connection.
+    """
+    def __init__(self, path: str = None, host: str = '127.0.0.1', port: int = None):
+        if path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+        else:
+            self.sock = socket.create_connection((host, port))
+        self.rfile = self.sock.makefile('rb')
+        self.next_id = 0
+
+    def request(self, request: dict):
+        """
+        Send a request and yield its responses, ending with the 'done' or
+        'error' one.
+        """
+        self.next_id += 1
+        request = dict(request, id=self.next_id)
+        self.sock.sendall((json.dumps(request) + '\n').encode())
+        for line in self.rfile:
+            message = json.loads(line)
+            if message.get('id') != self.next_id:
+                continue
+            yield message
+            if 'data' not in message:
+                return
+        raise ConnectionError('server closed the connection')
+
+    def run(self, request: dict) -> tuple:
+        """
+        (output chunks, summary) of a request. Raises ValueError when it
+        fails.
+        """
+        chunks = []
+        for message in self.request(request):
+            if 'data' in message:
+                chunks.append(message['data'])
+            elif 'error' in message:
+                raise ValueError(message['error'])
+            else:
+                return chunks, message['done']
+
+    def simulate(self, program, fmt: str = 'binary', max_instr: int = 1000, trace: str = 'every',
+                 trace_format: str = 'text', engine: str = 'interp', dump: str = 'full') -> tuple:
+        """
+        Simulate a program: lines or text for binary, hex and asm, bytes for
+        raw. Returns (output, summary), the output as bytes for a binary
+        trace and as text otherwise.
+        """
+        if fmt == 'raw':
+            program = base64.b64encode(bytes(program)).decode()
+        elif not isinstance(program, str):
+            program = ''.join(line if line.endswith('\n') else line + '\n' for line in program)
+        chunks, summary = self.run({'op': 'simulate', 'program': program, 'format': fmt,
+                                    'max_instr': max_instr, 'trace': trace,
+                                    'trace_format': trace_format, 'engine': engine, 'dump': dump})
+        if trace_format == 'binary':
+            return b''.join(base64.b64decode(chunk) for chunk in chunks), summary
+        return ''.join(chunks), summary
+
+    def assemble(self, source: str, output_format: str = 'text'):
+        """
+        Assemble source: binary lines, or for output_format 'raw' an image.
+        """
+        chunks, _ = self.run({'op': 'assemble', 'source': source, 'output_format': output_format})
+        if output_format == 'raw':
+            return b''.join(base64.b64decode(chunk) for chunk in chunks)
+        return ''.join(chunks)
+
+    def metrics(self) -> dict:
+        return self.run({'op': 'metrics'})[1]
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_test(program, fmt: str = 'binary', clients: int = 4, requests: int = 100,
+              report=print, **options) -> dict:
+    """
+    Load generator: clients threads, each with its own connection, send
+    requests simulate jobs for program one after another. options are the
+    address (path, host, port) and simulate() arguments. Every output is
+    checked against the first. Returns the client-side results.
+    """
+    address = {key: options.pop(key) for key in ('path', 'host', 'port') if key in options}
+    latencies = []
+    errors = []
+    outputs = set()
+    lock = threading.Lock()
+
+    def client_thread():
+        with Client(**address) as client:
+            for _ in range(requests):
+                start = time.perf_counter()
+                try:
+                    output, _ = client.simulate(program, fmt, **options)
+                except ValueError as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    outputs.add(output)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_thread) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    results = {
+        'requests': clients * requests,
+        'errors': len(errors),
+        'distinct_outputs': len(outputs),
+        'seconds': elapsed,
+        'jobs_per_s': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': 1000 * percentile(latencies, 0.50),
+        'p99_ms': 1000 * percentile(latencies, 0.99),
+    }
+    if errors:
+        report(f"first error: {errors[0]}")
+    return results
+
+
+# ===== COMMAND LINE =====
+
+def add_address_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--socket', metavar='PATH', help='Unix socket path')
+    group.add_argument('--port', type=int, help='TCP port')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='TCP host (default: 127.0.0.1)')
+
+
+def address(args) -> dict:
+    if args.socket:
+        return {'path': args.socket}
+    return {'host': args.host, 'port': args.port}
+
+
+def read_job_program(path: str, fmt: str):
+    """
+    A program file in the form Client.simulate() takes.
+    """
+    if fmt == 'asm':
+        with open(path, 'r') as f:
+            return f.read()
+    prog = read_program(path, fmt)
+    return bytes(prog) if fmt == 'raw' else prog
+
+
+def add_job_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('program', help='Program file')
+    parser.add_argument('--format', choices=['binary', 'hex', 'raw', 'asm'], default='binary',
+                        help='Program format; asm is assembled by the server (default: binary)')
+    parser.add_argument('--max-instr', type=int, default=1000,
+                        help='Maximum number of instructions to execute')
+    parser.add_argument('--trace', default='every',
+                        help='Steps to trace (default: every)')
+    parser.add_argument('--trace-format', choices=['text', 'binary'], default='text',
+                        help='Output format (default: text)')
+    parser.add_argument('--engine', choices=['interp', 'translate'], default='interp',
+                        help='Execution engine (default: interp)')
+
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(prog='sim_server.py serve', description='Run the server')
+    add_address_arguments(parser)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: one per CPU)')
+    parser.add_argument('--queue', type=int, default=64,
+                        help='Jobs waiting for a worker before clients are held back (default: 64)')
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT,
+                        help=f'Seconds a job may run before its worker is replaced '
+                             f'(default: {REQUEST_TIMEOUT:g}, 0 for no limit)')
+    parser.add_argument('--max-instr-limit', type=int, default=MAX_INSTR_LIMIT,
+                        help=f'Largest max_instr a job may ask for (default: {MAX_INSTR_LIMIT})')
+    args = parser.parse_args(argv)
+    if args.timeout < 0 or args.max_instr_limit < 1:
+        parser.error('--timeout must not be negative and --max-instr-limit must be positive')
+
+    simulation = SimulationServer(args.workers, args.queue, args.timeout or None,
+                                  args.max_instr_limit)
+    simulation.start()
+    server = make_server(simulation, args.socket, args.host, args.port)
+    print(f"serving on {args.socket or f'{args.host}:{args.port}'} "
+          f"with {simulation.workers} workers", file=sys.stderr)
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+        simulation.stop()
+        print(json.dumps(simulation.report()), file=sys.stderr)
+
+
+def submit_main(argv):
+    parser = argparse.ArgumentParser(prog='sim_server.py submit', description='Run one job')
+    add_address_arguments(parser)
+    add_job_arguments(parser)
+    parser.add_argument('--output', default='-',
+                        help='Output file (default: stdout)')
+    args = parser.parse_args(argv)
+    try:
+        prog = read_job_program(args.program, args.format)
+    except FileNotFoundError:
+        print(f"Error: Could not open input file '{args.program}'")
+        sys.exit(1)
+
+    with Client(**address(args)) as client:
+        try:
+            output, summary = client.simulate(prog, args.format, args.max_instr, args.trace,
+                                              args.trace_format, args.engine)
+        except ValueError as e:
+            print(f"Error: {args.program}: {e}")
+            sys.exit(1)
+    binary = args.trace_format == 'binary'
+    if args.output == '-':
+        (sys.stdout.buffer if binary else sys.stdout).write(output)
+    else:
+        with open(args.output, 'wb' if binary else 'w') as f:
+            f.write(output)
+    print(json.dumps(summary), file=sys.stderr)
+
+
+def load_main(argv):
+    parser = argparse.ArgumentParser(prog='sim_server.py load', description='Load generator')
+    add_address_arguments(parser)
+    add_job_arguments(parser)
+    parser.add_argument('--clients', type=int, default=4,
+                        help='Concurrent connections (default: 4)')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='Jobs per connection (default: 100)')
+    args = parser.parse_args(argv)
+    try:
+        prog = read_job_program(args.program, args.format)
+    except FileNotFoundError:
+        print(f"Error: Could not open input file '{args.program}'")
+        sys.exit(1)
+
+    results = load_test(prog, args.format, args.clients, args.requests,
+                        max_instr=args.max_instr, trace=args.trace,
+                        trace_format=args.trace_format, engine=args.engine, **address(args))
+    print(f"{results['requests']} jobs ({results['errors']} failed) in {results['seconds']:.2f} s, "
+          f"{results['jobs_per_s']:.1f} jobs/s, p50 {results['p50_ms']:.2f} ms, "
+          f"p99 {results['p99_ms']:.2f} ms")
+    if results['distinct_outputs'] > 1:
+        print(f"Error: {results['distinct_outputs']} different outputs for the same job")
+    with Client(**address(args)) as client:
+        print(f"server: {json.dumps(client.metrics())}")
+    sys.exit(1 if results['errors'] or results['distinct_outputs'] > 1 else 0)
+
+
+def main():
+    commands = {'serve': serve_main, 'submit': submit_main, 'load': load_main}
+    if sys.argv[1:2] and sys.argv[1] in commands:
+        commands[sys.argv[1]](sys.argv[2:])
+        return
+    print('usage: sim_server.py {serve,submit,load} ... (see --help of each)')
+    sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
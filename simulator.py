@@ -1,5 +1,16 @@
+import os
 import sys
+import mmap
+import time
+import zlib
+import struct
+import hashlib
 import argparse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from bisect import bisect_right
+from array import array
 from typing import Dict, List, Optional, Union
 
 # ===== HELPER FUNCTIONS FOR BINARY CONVERSION AND OPERATIONS =====
@@ -178,100 +189,1135 @@ def slt(s, id):
     return " ".join(l1)
 
 
+# ===== INSTRUCTION DECODING =====
+
+# Kinds of decoded instructions. A decoded record is a 4-tuple whose first
+# element is one of these kinds and whose other three slots hold only the
+# operands that kind needs (register numbers and sign-extended immediates):
+#   ADD/SUB/SLT/OR/AND:  (kind, rd, rs1, rs2)
+#   SRL:                 (kind, rd, rs1, shamt)
+#   ADDI/LW/JALR:        (kind, rd, rs1, imm)
+#   SW/BEQ/BNE/BLT/HALT: (kind, rs1, rs2, imm)
+#   NOP/INVALID:         (kind, 0, 0, 0)
+(ADD, SUB, SLT, SRL, OR, AND, NOP, ADDI, LW, SW,
+ BEQ, BNE, BLT, JALR, HALT, INVALID) = range(16)
+
+# The register file is a list of 33 unsigned 32-bit values. Slot 32 is a
+# write-only sink: decode() maps a destination of x0 onto it, so writes to x0
+# are discarded without any check and x0 always reads as 0.
+X0_SINK = 32
+
+# Register names accepted by Simulator.get/set, mapped to register numbers
+REG_INDEX = {f'x{i}': i for i in range(32)}
+
+# One trace line: PC followed by x0-x31, each as 32 binary digits
+STATE_FORMAT = ' '.join(['{:032b}'] * 33)
+
+_INVALID = (INVALID, 0, 0, 0)
+
+# Kinds that may change control flow
+CONTROL_KINDS = frozenset((BEQ, BNE, BLT, JALR, HALT))
+
+# Mnemonic and major opcode of each kind, indexed by kind
+KIND_NAMES = ('add', 'sub', 'slt', 'srl', 'or', 'and', 'nop', 'addi', 'lw', 'sw',
+              'beq', 'bne', 'blt', 'jalr', 'halt', 'invalid')
+KIND_OPCODES = (0x33, 0x33, 0x33, 0x33, 0x33, 0x33, 0x33, 0x13, 0x03, 0x23,
+                0x63, 0x63, 0x63, 0x67, 0x63, None)
+
+
+def decode(instr: int) -> tuple:
+    """
+    Decode a 32-bit instruction word into a compact record (see above).
+    Unsupported instructions decode to an INVALID record.
+    """
+    # Extract opcode (bits 0-6)
+    op = instr & 0x7F
+
+    # Extract register fields
+    rd = (instr >> 7) & 0x1F or X0_SINK
+    funct3 = (instr >> 12) & 0x7
+    rs1 = (instr >> 15) & 0x1F
+    rs2 = (instr >> 20) & 0x1F
+    funct7 = (instr >> 25) & 0x7F
+
+    if op == 0x33:  # R-type instructions
+        if funct3 == 0x0:  # ADD/SUB
+            if funct7 == 0x00:
+                return (ADD, rd, rs1, rs2)
+            if funct7 == 0x20:
+                return (SUB, rd, rs1, rs2)
+            return (NOP, 0, 0, 0)
+        if funct3 == 0x2:
+            return (SLT, rd, rs1, rs2)
+        if funct3 == 0x5:  # SRL/SRA
+            if funct7 == 0x00:
+                return (SRL, rd, rs1, (instr >> 20) & 0x1F)
+            return (NOP, 0, 0, 0)
+        if funct3 == 0x6:
+            return (OR, rd, rs1, rs2)
+        if funct3 == 0x7:
+            return (AND, rd, rs1, rs2)
+        return _INVALID
+
+    if op == 0x13 or op == 0x03 or op == 0x67:  # I-type
+        imm_i = (instr >> 20) & 0xFFF
+        if imm_i & 0x800:
+            imm_i |= 0xFFFFF000
+        if op == 0x67:
+            return (JALR, rd, rs1, imm_i)
+        if op == 0x13 and funct3 == 0x0:
+            return (ADDI, rd, rs1, imm_i)
+        if op == 0x03 and funct3 == 0x2:
+            return (LW, rd, rs1, imm_i)
+        return _INVALID
+
+    if op == 0x23:  # Store instructions
+        if funct3 != 0x2:
+            return _INVALID
+        imm_s = ((instr >> 25) & 0x7F) << 5 | ((instr >> 7) & 0x1F)
+        if imm_s & 0x800:
+            imm_s |= 0xFFFFF000
+        return (SW, rs1, rs2, imm_s)
+
+    if op == 0x63:  # Branch instructions
+        # "beq x0,x0,0" is the virtual halt used to end programs
+        if instr == 0x00000063:
+            return (HALT, 0, 0, 0)
+        imm_b = ((instr >> 31) & 0x1) << 12 | ((instr >> 7) & 0x1) << 11 | \
+                ((instr >> 25) & 0x3F) << 5 | ((instr >> 8) & 0xF) << 1
+        if imm_b & 0x1000:
+            imm_b |= 0xFFFFE000
+        if funct3 == 0x0:
+            return (BEQ, rs1, rs2, imm_b)
+        if funct3 == 0x1:
+            return (BNE, rs1, rs2, imm_b)
+        if funct3 == 0x4:
+            return (BLT, rs1, rs2, imm_b)
+        return _INVALID
+
+    # Unrecognized opcode
+    return _INVALID
+
+
+# ===== MEMORY =====
+
+# Default memory map: (name, first address, last address) of each segment.
+# Simulator requires a 'code' segment; the dump lists segments in map order.
+DEFAULT_MEMORY_MAP = (
+    ('code', 0x00000000, 0x000000FF),   # 256 bytes of program memory
+    ('stack', 0x00000100, 0x0000017F),  # 128 bytes of stack memory
+    ('data', 0x00010000, 0x0001007F),   # 128 bytes of data memory
+)
+
+
+def parse_memory_map(spec: str) -> tuple:
+    """
+    Parse a memory map written as name=start:end,... (addresses in any
+    Python integer notation), e.g. 'code=0x0:0xff,data=0x1000:0x10ff'.
+    Raises ValueError unless every segment has start <= end, within 32
+    bits, no two segments share a name or an address and the code segment
+    starts on a word boundary.
+    """
+    regions = []
+    for item in spec.split(','):
+        name, _, bounds = item.partition('=')
+        start, _, end = bounds.partition(':')
+        try:
+            regions.append((name.strip(), int(start, 0), int(end, 0)))
+        except ValueError:
+            raise ValueError(f"invalid memory segment '{item}'")
+    if not any(name == 'code' for name, _, _ in regions):
+        raise ValueError("memory map needs a 'code' segment")
+    names = set()
+    for name, start, end in regions:
+        if name in names:
+            raise ValueError(f"memory segment '{name}' is defined twice")
+        names.add(name)
+        if not 0 <= start <= end <= 0xFFFFFFFF:
+            raise ValueError(f"memory segment '{name}' has invalid bounds 0x{start:x}:0x{end:x}")
+        if name == 'code' and start & 3:
+            raise ValueError(f"code segment must start on a word boundary, not 0x{start:x}")
+    # Memory looks segments up by start address, so they must not overlap
+    ordered = sorted(regions, key=lambda region: region[1])
+    for (name, _, end), (other, start, _) in zip(ordered, ordered[1:]):
+        if start <= end:
+            raise ValueError(f"memory segments '{name}' and '{other}' overlap")
+    return tuple(regions)
+
+
+# Memory is allocated in pages of PAGE_SIZE bytes
+PAGE_BITS = 12
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+
+class _LittleEndianWords:
+    """
+    Word view of a bytearray for big-endian hosts, where a native 'I' cast
+    would read words in the wrong byte order.
+    """
+    def __init__(self, data: bytearray):
+        self.data = data
+
+    def __getitem__(self, i: int) -> int:
+        return struct.unpack_from('<I', self.data, i << 2)[0]
+
+    def __setitem__(self, i: int, val: int):
+        struct.pack_into('<I', self.data, i << 2, val)
+
+
+def _word_view(data: bytearray):
+    """
+    Little-endian 32-bit word view of data.
+    """
+    if sys.byteorder == 'little':
+        return memoryview(data).cast('I')
+    return _LittleEndianWords(data)
+
+
+class Memory:
+    """
+    Sparse, paged byte-addressable memory covering a memory map.
+    An access is valid when its first byte lies inside a segment and its
+    last byte lies below the end of the last segment; invalid reads return
+    0 and invalid writes are ignored.
+
+    Pages are allocated on first write and unwritten memory reads as 0.
+    fork() makes a copy-on-write clone that shares every page until either
+    side writes to it. Pages written since creation or the last fork() are
+    dirty (see dirty_pages()).
+    """
+    def __init__(self, regions=DEFAULT_MEMORY_MAP):
+        self.regions = tuple(regions)
+
+        # Segment table sorted by start address, for bisect lookups
+        table = sorted((start, end) for _, start, end in self.regions)
+        self.starts = [start for start, _ in table]
+        self.ends = [end for _, end in table]
+        self.limit = max(self.ends) + 1
+
+        # Page number -> bytes of the page, and -> word view of the page.
+        # owned holds the word views of pages this instance may modify in
+        # place; the others are shared with a fork and copied on write.
+        self.pages = {}
+        self.views = {}
+        self.owned = {}
+
+    def valid(self, addr: int) -> bool:
+        """
+        Whether addr lies inside one of the segments.
+        """
+        i = bisect_right(self.starts, addr) - 1
+        return i >= 0 and addr <= self.ends[i]
+
+    def read(self, addr: int, size: int = 4) -> int:
+        """
+        Read a little-endian value of size bytes.
+        """
+        if addr < 0 or addr + size > self.limit:
+            return 0
+        i = bisect_right(self.starts, addr) - 1
+        if i < 0 or addr > self.ends[i]:
+            return 0
+        if size == 4 and not addr & 3:
+            words = self.views.get(addr >> PAGE_BITS)
+            return words[(addr & PAGE_MASK) >> 2] if words is not None else 0
+        return int.from_bytes(self.read_bytes(addr, size), 'little')
+
+    def write(self, addr: int, val: int, size: int = 4) -> bool:
+        """
+        Write a little-endian value of size bytes.
+        Returns whether the write was in range.
+        """
+        if addr < 0 or addr + size > self.limit:
+            return False
+        i = bisect_right(self.starts, addr) - 1
+        if i < 0 or addr > self.ends[i]:
+            return False
+        if size == 4 and not addr & 3:
+            words = self.owned.get(addr >> PAGE_BITS)
+            if words is None:
+                words = self.own_page(addr >> PAGE_BITS)
+            words[(addr & PAGE_MASK) >> 2] = val & 0xFFFFFFFF
+        else:
+            self.write_bytes(addr, (val & ((1 << (size * 8)) - 1)).to_bytes(size, 'little'))
+        return True
+
+    def read_bytes(self, addr: int, size: int) -> bytes:
+        """
+        Raw bytes starting at addr, without range checks.
+        """
+        out = bytearray()
+        while size > 0:
+            offset = addr & PAGE_MASK
+            n = min(size, PAGE_SIZE - offset)
+            page = self.pages.get(addr >> PAGE_BITS)
+            out += page[offset:offset + n] if page is not None else bytes(n)
+            addr += n
+            size -= n
+        return bytes(out)
+
+    def write_bytes(self, addr: int, data: bytes):
+        """
+        Store raw bytes starting at addr, without range checks.
+        """
+        pos = 0
+        while pos < len(data):
+            offset = addr & PAGE_MASK
+            n = min(len(data) - pos, PAGE_SIZE - offset)
+            if addr >> PAGE_BITS not in self.owned:
+                self.own_page(addr >> PAGE_BITS)
+            self.pages[addr >> PAGE_BITS][offset:offset + n] = data[pos:pos + n]
+            addr += n
+            pos += n
+
+    def read_words(self, start: int, end: int) -> List[int]:
+        """
+        The words at start, start + 4, ... up to end, as read() returns them.
+        Unallocated pages are skipped without touching memory.
+        """
+        if start & 3 or (end + 1) & 3 or not self.valid(start) or not self.valid(end):
+            return [self.read(addr) for addr in range(start, end + 1, 4)]
+        vals = []
+        addr = start
+        while addr <= end:
+            stop = min(end + 1, (addr | PAGE_MASK) + 1)
+            words = self.views.get(addr >> PAGE_BITS)
+            if words is None:
+                vals.extend([0] * ((stop - addr) >> 2))
+            else:
+                vals.extend(words[(addr & PAGE_MASK) >> 2:((stop - 1) & PAGE_MASK) // 4 + 1])
+            addr = stop
+        return vals
+
+    def words_bytes(self, start: int, end: int) -> bytes:
+        """
+        The words read_words() returns, as little-endian bytes, copied out
+        a page at a time.
+        """
+        if start & 3 or (end + 1) & 3 or not self.valid(start) or not self.valid(end):
+            return struct.pack(f'<{(end + 4 - start) >> 2}I', *self.read_words(start, end))
+        return self.read_bytes(start, end + 1 - start)
+
+    def changed_words(self, base: Optional['Memory'], start: int, end: int) -> List[tuple]:
+        """
+        (addr, value) of the words at start, start + 4, ... up to end that
+        differ from base (an earlier fork of this memory, or None for
+        all-zero memory). Pages still shared with base were not written
+        since the fork and are skipped without being compared.
+        """
+        base_pages = base.pages if base is not None else {}
+        if start & 3 or (end + 1) & 3 or not self.valid(start) or not self.valid(end):
+            old = base.read if base is not None else lambda addr: 0
+            return [(addr, val) for addr, val in zip(range(start, end + 1, 4), self.read_words(start, end))
+                    if val != old(addr)]
+        first, last = start >> PAGE_BITS, end >> PAGE_BITS
+        changed = []
+        for page in sorted(set(self.pages).union(base_pages)):
+            data, prev = self.pages.get(page), base_pages.get(page)
+            if data is prev or not first <= page <= last:
+                continue
+            lo = max(start, page << PAGE_BITS)
+            hi = min(end + 1, (page + 1) << PAGE_BITS)
+            offset, n = lo & PAGE_MASK, hi - lo
+            data = data[offset:offset + n] if data is not None else bytes(n)
+            prev = prev[offset:offset + n] if prev is not None else bytes(n)
+            if data == prev:
+                continue
+            for i in range(0, n, 4):
+                word = data[i:i + 4]
+                if word != prev[i:i + 4]:
+                    changed.append((lo + i, int.from_bytes(word, 'little')))
+        return changed
+
+    def own_page(self, page: int):
+        """
+        Make a page private to this instance, allocating it or copying it
+        from a shared page, and return its word view.
+        """
+        data = self.pages.get(page)
+        data = bytearray(PAGE_SIZE) if data is None else bytearray(data)
+        words = _word_view(data)
+        self.pages[page] = data
+        self.views[page] = words
+        self.owned[page] = words
+        return words
+
+    def clear(self):
+        """
+        Drop every page, leaving all of memory reading as 0.
+        """
+        self.pages.clear()
+        self.views.clear()
+        self.owned.clear()
+
+    def map_buffer(self, buf, pages: List[int]):
+        """
+        Back the given pages with consecutive PAGE_SIZE slices of buf (any
+        writable buffer, such as a multiprocessing shared memory block),
+        copying in what they held. Stores to them go straight to buf.
+        """
+        view = memoryview(buf)
+        for i, page in enumerate(pages):
+            data = view[i << PAGE_BITS:(i + 1) << PAGE_BITS]
+            if page in self.pages:
+                data[:] = self.pages[page]
+            words = _word_view(data)
+            self.pages[page] = data
+            self.views[page] = words
+            self.owned[page] = words
+
+    def fork(self) -> 'Memory':
+        """
+        Copy-on-write clone. Both copies share every page until written,
+        and neither has dirty pages afterwards.
+        """
+        clone = Memory.__new__(Memory)
+        clone.__dict__.update(self.__dict__)
+        clone.pages = dict(self.pages)
+        clone.views = dict(self.views)
+        clone.owned = {}
+        self.owned = {}
+        return clone
+
+    def dirty_pages(self) -> List[int]:
+        """
+        Page numbers written since creation or the last fork().
+        """
+        return sorted(self.owned)
+
+
+# ===== TRACE OUTPUT =====
+
+def parse_trace_policy(spec: str) -> tuple:
+    """
+    Parse a trace policy into (name, arg):
+      'every'          state after every step (the default)
+      'every:N'        state after every Nth step
+      'change:x1,x5'   state after steps that change any of these registers
+      'branches'       state after branches and jumps
+      'final'          only the state after the last step
+    """
+    name, _, arg = spec.partition(':')
+    if name == 'every':
+        n = int(arg) if arg else 1
+        if n < 1:
+            raise ValueError(f"invalid trace policy '{spec}'")
+        return ('every', n)
+    if name == 'change' and arg:
+        try:
+            return ('change', tuple(REG_INDEX[r] for r in arg.split(',')))
+        except KeyError:
+            raise ValueError(f"invalid trace policy '{spec}'")
+    if name in ('branches', 'final') and not arg:
+        return (name, None)
+    raise ValueError(f"invalid trace policy '{spec}'")
+
+
+# Memory dump modes: every word of every segment, only the words changed
+# since the previous dump (since loading for the first) with their
+# addresses, or no dump
+DUMP_MODES = ('full', 'changed', 'none')
+
+
+class TraceWriter:
+    """
+    Streaming sink for trace and dump lines.
+    Lines are buffered and handed to the target in large chunks as the
+    simulation runs, so memory stays bounded however long the run is.
+    The target is a path ('-' for stdout), a file object, or a callable
+    that receives each chunk of newline-terminated text.
+    """
+    def __init__(self, target, chunk_lines: int = 1024):
+        self.file = None
+        if isinstance(target, str):
+            if target == '-':
+                target = sys.stdout
+            else:
+                target = self.file = open(target, 'w')
+        self.emit = target.write if hasattr(target, 'write') else target
+        self.chunk_lines = chunk_lines
+        self.buf = []
+
+    def append(self, line: str):
+        """
+        Add one output line (without its newline).
+        """
+        self.buf.append(line)
+        if len(self.buf) >= self.chunk_lines:
+            self.flush()
+
+    def append_text(self, text: str):
+        """
+        Add a block of newline-terminated lines at once.
+        """
+        if text:
+            self.append(text[:-1])
+
+    def extend(self, lines: List[str]):
+        """
+        Add several output lines (without their newlines).
+        """
+        self.buf.extend(lines)
+        if len(self.buf) >= self.chunk_lines:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out all buffered lines.
+        """
+        if self.buf:
+            self.emit('\n'.join(self.buf) + '\n')
+            self.buf.clear()
+
+    def close(self):
+        """
+        Flush, and close the file if this writer opened it.
+        """
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_words(data: bytes) -> str:
+    """
+    Dump lines (32 binary digits and a newline) for the little-endian
+    words in data, converted in bulk: the words are byte-swapped, read as
+    one big integer and formatted in a single call, and the digits are
+    spread into 33-byte lines with one strided copy per column.
+    """
+    words = array('I')
+    words.frombytes(data)
+    words.byteswap()
+    n = len(words)
+    digits = format(int.from_bytes(words.tobytes(), 'big'), f'0{32 * n}b').encode()
+    out = bytearray(b'\n') * (33 * n)
+    for i in range(32):
+        out[i::33] = digits[i::32]
+    return out.decode()
+
+
+def format_changed(addr: int, val: int) -> str:
+    """
+    A dump line for one changed word: its address in hex, then its value.
+    """
+    return f'{addr:08x} {val:032b}'
+
+
+# Binary trace format: a header, then a sequence of records each starting
+# with a one-byte tag (all integers little-endian):
+#   TRACE_STEP: pc (u32), mask (u32), then one u32 for every register whose
+#               bit is set in mask, lowest register first. Only registers
+#               that changed since the previous step are stored; before the
+#               first step every register counts as 0.
+#   TRACE_DUMP: count (u32), then count memory words (u32) in dump order.
+#   TRACE_WORDS: address (u32), count (u32), then count memory words (u32)
+#               from that address on, for the changed words of a dump.
+#   TRACE_SYNC: steps so far (u64), words of the current dump so far (u32),
+#               then the registers x0-x31 (u32). Since version 2, one sits
+#               at every multiple of TRACE_SYNC_BYTES that the trace goes
+#               past, the end of the block before it filled with TRACE_PAD
+#               bytes, so a reader can start decoding at any block.
+#   TRACE_PAD:  no fields; a single byte of padding.
+TRACE_MAGIC = b'RVTR'
+TRACE_VERSION = 2
+TRACE_HEADER = struct.Struct('<4sHH')  # magic, version, register count
+TRACE_PAD = 0
+TRACE_STEP = 1
+TRACE_DUMP = 2
+TRACE_WORDS = 3
+TRACE_SYNC = 4
+TRACE_SYNC_RECORD = struct.Struct('<BQI32I')
+TRACE_SYNC_BYTES = 1 << 20
+
+# Longest run of words stored in one TRACE_DUMP record
+_DUMP_RECORD_WORDS = 256
+
+# Size of a TRACE_STEP record storing every register but x0
+_STEP_RECORD_MAX = 9 + 4 * 31
+
+# TRACE_STEP records storing no register and one register
+_STEP_NONE = struct.Struct('<BII')
+_STEP_ONE = struct.Struct('<BIII')
+
+
+class BinaryTraceWriter:
+    """
+    Streaming sink for the binary trace format.
+    Records are buffered and written to the target in large chunks. The
+    target is a path ('-' for stdout), a binary file object, or a callable
+    that receives each chunk of bytes.
+    """
+    def __init__(self, target, chunk_bytes: int = 1 << 16):
+        self.file = None
+        if isinstance(target, str):
+            if target == '-':
+                target = sys.stdout.buffer
+            else:
+                target = self.file = open(target, 'wb')
+        self.emit = target.write if hasattr(target, 'write') else target
+        self.chunk_bytes = chunk_bytes
+        self.buf = bytearray(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, 32))
+        self.prev = [0] * 32
+        self.structs = {}
+        self.steps = 0
+        # Dump words written since step number dumped_step
+        self.dumped = self.dumped_step = 0
+        # Offset in buf of the next sync record; moves back as buf is flushed
+        self.sync_at = TRACE_SYNC_BYTES
+        # Length of buf at which step() has to flush it or start a block
+        self.limit = min(chunk_bytes, self.sync_at - _STEP_RECORD_MAX)
+
+    def sync(self):
+        """
+        Pad out the block and start the next one with a sync record.
+        """
+        buf = self.buf
+        dumped = self.dumped if self.dumped_step == self.steps else 0
+        buf += bytes(self.sync_at - len(buf))  # TRACE_PAD is 0
+        buf += TRACE_SYNC_RECORD.pack(TRACE_SYNC, self.steps, dumped, *self.prev)
+        self.sync_at += TRACE_SYNC_BYTES
+        self.limit = min(self.chunk_bytes, self.sync_at - _STEP_RECORD_MAX)
+
+    def step(self, pc: int, regs: List[int]):
+        """
+        Record the PC and the registers that changed since the last step.
+        """
+        prev = self.prev
+        mask = 0
+        vals = []
+        if regs[:32] != prev:
+            for i in range(1, 32):  # x0 never changes
+                if regs[i] != prev[i]:
+                    prev[i] = regs[i]
+                    mask |= 1 << i
+                    vals.append(regs[i])
+        record = self.structs.get(len(vals))
+        if record is None:
+            record = self.structs[len(vals)] = struct.Struct(f'<BII{len(vals)}I')
+        self.buf += record.pack(TRACE_STEP, pc, mask, *vals)
+        self.steps += 1
+        if len(self.buf) >= self.limit:
+            # Keep room for the largest step before the next sync record
+            if len(self.buf) + _STEP_RECORD_MAX > self.sync_at:
+                self.sync()
+            if len(self.buf) >= self.chunk_bytes:
+                self.flush()
+
+    def step_records(self, records: List[tuple], regs: List[int]):
+        """
+        Record a run of steps that each wrote at most one register, given
+        as (pc, register, value) with register 0 for none, starting from
+        the register values regs: what step() would record for each,
+        without comparing every register.
+        """
+        if not records:
+            return
+        prev = self.prev
+        if regs[:32] != prev:
+            # Registers set since the last step count as changed by this one
+            pc, i, val = records[0]
+            regs = regs[:32]
+            regs[i] = val
+            self.step(pc, regs)
+            records = records[1:]
+        buf = self.buf
+        for pc, i, val in records:
+            if prev[i] != val:
+                prev[i] = val
+                buf += _STEP_ONE.pack(TRACE_STEP, pc, 1 << i, val)
+            else:
+                buf += _STEP_NONE.pack(TRACE_STEP, pc, 0)
+            self.steps += 1
+            if len(buf) >= self.limit:
+                if len(buf) + _STEP_RECORD_MAX > self.sync_at:
+                    self.sync()
+                if len(buf) >= self.chunk_bytes:
+                    self.flush()
+
+    def words(self, vals: List[int]):
+        """
+        Record a run of memory words from a dump.
+        """
+        for i in range(0, len(vals), _DUMP_RECORD_WORDS):
+            chunk = vals[i:i + _DUMP_RECORD_WORDS]
+            if len(self.buf) + 5 + 4 * len(chunk) > self.sync_at:
+                self.sync()
+            self.buf += struct.pack(f'<BI{len(chunk)}I', TRACE_DUMP, len(chunk), *chunk)
+            if self.dumped_step != self.steps:
+                self.dumped, self.dumped_step = 0, self.steps
+            self.dumped += len(chunk)
+        if len(self.buf) >= self.chunk_bytes:
+            self.flush()
+
+    def changed(self, words: List[tuple]):
+        """
+        Record (addr, value) memory words, one record per run of
+        consecutive addresses.
+        """
+        i = 0
+        while i < len(words):
+            addr = words[i][0]
+            j = i + 1
+            while j < len(words) and j - i < _DUMP_RECORD_WORDS and words[j][0] == addr + 4 * (j - i):
+                j += 1
+            if len(self.buf) + 9 + 4 * (j - i) > self.sync_at:
+                self.sync()
+            self.buf += struct.pack(f'<BII{j - i}I', TRACE_WORDS, addr, j - i,
+                                    *(val for _, val in words[i:j]))
+            i = j
+        if len(self.buf) >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out all buffered records.
+        """
+        if self.buf:
+            self.emit(bytes(self.buf))
+            self.sync_at -= len(self.buf)
+            self.limit = min(self.chunk_bytes, self.sync_at - _STEP_RECORD_MAX)
+            self.buf.clear()
+
+    def close(self):
+        """
+        Flush, and close the file if this writer opened it.
+        """
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_binary_trace(f):
+    """
+    Stream records back out of a binary trace file object.
+    Yields (TRACE_STEP, pc, regs) with the full register tuple x0-x31,
+    (TRACE_DUMP, words) for each run of dumped memory words, and
+    (TRACE_WORDS, addr, words) for each run of changed words.
+    """
+    header = f.read(TRACE_HEADER.size)
+    if len(header) < TRACE_HEADER.size or TRACE_HEADER.unpack(header)[0] != TRACE_MAGIC:
+        raise ValueError('not a binary trace')
+
+    regs = [0] * 32
+    data = b''
+    pos = 0
+    while True:
+        # Keep at least one whole record (at most 1033 bytes) buffered
+        if len(data) - pos < 4096:
+            data = data[pos:] + f.read(1 << 16)
+            pos = 0
+            if not data:
+                return
+        tag = data[pos]
+        if tag == TRACE_PAD:
+            pos += 1
+        elif tag == TRACE_SYNC:
+            pos += TRACE_SYNC_RECORD.size
+        elif tag == TRACE_STEP:
+            pc, mask = struct.unpack_from('<II', data, pos + 1)
+            pos += 9
+            while mask:
+                low = mask & -mask
+                regs[low.bit_length() - 1] = struct.unpack_from('<I', data, pos)[0]
+                pos += 4
+                mask ^= low
+            yield TRACE_STEP, pc, tuple(regs)
+        elif tag == TRACE_DUMP:
+            count = struct.unpack_from('<I', data, pos + 1)[0]
+            yield TRACE_DUMP, struct.unpack_from(f'<{count}I', data, pos + 5)
+            pos += 5 + 4 * count
+        elif tag == TRACE_WORDS:
+            addr, count = struct.unpack_from('<II', data, pos + 1)
+            yield TRACE_WORDS, addr, struct.unpack_from(f'<{count}I', data, pos + 9)
+            pos += 9 + 4 * count
+        else:
+            raise ValueError(f'corrupt binary trace record tag {tag}')
+
+
+# ===== SNAPSHOTS =====
+
+# Snapshot file: magic and version, then a zlib-compressed body of the
+# header (pc, count, cycles, halted, region count, program digest),
+# registers x0-x31, the regions (name length, name, start, end), the page
+# count and every allocated page (page number, PAGE_SIZE bytes)
+SNAPSHOT_MAGIC = b'RVSN'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_FILE = struct.Struct('<4sH')
+SNAPSHOT_HEADER = struct.Struct('<IQQBH32s')
+SNAPSHOT_REGS = struct.Struct('<32I')
+SNAPSHOT_REGION = struct.Struct('<II')
+
+
+class Snapshot:
+    """
+    Architectural state of a Simulator at one point: registers, PC,
+    counters and a copy-on-write fork of its memory (see
+    Simulator.snapshot()). program is the image_digest() of the program
+    the simulator had loaded.
+    """
+    def __init__(self, pc: int, count: int, cycles: int, halted: bool,
+                 regs: tuple, memory: 'Memory', program: bytes = bytes(32)):
+        self.pc = pc
+        self.count = count
+        self.cycles = cycles
+        self.halted = halted
+        self.regs = regs
+        self.memory = memory
+        self.program = program
+
+
+def image_digest(memory: 'Memory') -> bytes:
+    """
+    SHA-256 of a loaded program image: its memory map and the contents of
+    every page that is not all zero.
+    """
+    digest = hashlib.sha256(repr(memory.regions).encode())
+    for page in sorted(memory.pages):
+        data = memory.pages[page]
+        if any(data):
+            digest.update(struct.pack('<I', page))
+            digest.update(data)
+    return digest.digest()
+
+
+def save_snapshot(snap: Snapshot, f):
+    """
+    Write a snapshot to a binary file. Only allocated pages are stored.
+    """
+    memory = snap.memory
+    body = [SNAPSHOT_HEADER.pack(snap.pc, snap.count, snap.cycles, snap.halted,
+                                 len(memory.regions), snap.program),
+            SNAPSHOT_REGS.pack(*snap.regs)]
+    for name, start, end in memory.regions:
+        encoded = name.encode()
+        body.append(bytes([len(encoded)]) + encoded + SNAPSHOT_REGION.pack(start, end))
+    body.append(struct.pack('<I', len(memory.pages)))
+    for page in sorted(memory.pages):
+        body.append(struct.pack('<I', page))
+        body.append(bytes(memory.pages[page]))
+    f.write(SNAPSHOT_FILE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+    f.write(zlib.compress(b''.join(body)))
+
+
+def load_snapshot(f) -> Snapshot:
+    """
+    Read a snapshot written by save_snapshot(). Raises ValueError.
+    """
+    data = f.read()
+    if len(data) < SNAPSHOT_FILE.size:
+        raise ValueError('not a snapshot file')
+    magic, version = SNAPSHOT_FILE.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError('not a snapshot file')
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f'unsupported snapshot version {version}')
+    try:
+        body = zlib.decompress(data[SNAPSHOT_FILE.size:])
+        pc, count, cycles, halted, nregions, program = SNAPSHOT_HEADER.unpack_from(body)
+        pos = SNAPSHOT_HEADER.size
+        regs = SNAPSHOT_REGS.unpack_from(body, pos)
+        pos += SNAPSHOT_REGS.size
+        regions = []
+        for _ in range(nregions):
+            size = body[pos]
+            name = body[pos + 1:pos + 1 + size].decode()
+            start, end = SNAPSHOT_REGION.unpack_from(body, pos + 1 + size)
+            regions.append((name, start, end))
+            pos += 1 + size + SNAPSHOT_REGION.size
+        memory = Memory(regions)
+        (npages,) = struct.unpack_from('<I', body, pos)
+        pos += 4
+        for _ in range(npages):
+            (page,) = struct.unpack_from('<I', body, pos)
+            memory.write_bytes(page << PAGE_BITS, body[pos + 4:pos + 4 + PAGE_SIZE])
+            pos += 4 + PAGE_SIZE
+    except (zlib.error, struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f'corrupt snapshot: {e}')
+    memory.owned = {}
+    return Snapshot(pc, count, cycles, bool(halted), regs, memory, program)
+
+
+def checkpoint_path(directory: str, count: int) -> str:
+    return os.path.join(directory, f'{count:012d}.snap')
+
+
+def find_checkpoint(directory: str, max_count: int,
+                    program: Optional[bytes] = None) -> Optional[Snapshot]:
+    """
+    The checkpoint in directory with the highest instruction count not
+    above max_count, or None. Raises ValueError if program (an
+    image_digest()) is given and the checkpoint was saved running another
+    program.
+    """
+    if not os.path.isdir(directory):
+        return None
+    counts = []
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        if ext == '.snap' and stem.isdigit() and int(stem) <= max_count:
+            counts.append(int(stem))
+    if not counts:
+        return None
+    path = checkpoint_path(directory, max(counts))
+    with open(path, 'rb') as f:
+        snap = load_snapshot(f)
+    if program is not None and snap.program != program:
+        raise ValueError(f"checkpoint '{path}' was saved by a different program")
+    return snap
+
+
+# Program images already loaded, with their image_digest(), keyed by
+# program text, format and memory map, shared copy-on-write by
+# Simulator.load (least recently used first)
+_IMAGES = {}
+_MAX_IMAGES = 32
+
+
 class Simulator:
     """
     A simulator for the RISC-V instruction set architecture.
     This simulator emulates the execution of RISC-V instructions in software.
     """
-    def __init__(self):
+    # Longest basic block the translate engine compiles as one function
+    MAX_BLOCK = 64
+
+    def __init__(self, decode_cache: bool = True, engine: str = 'interp',
+                 trace: Union[TraceWriter, BinaryTraceWriter, None] = None,
+                 trace_policy: str = 'every', memory_map=DEFAULT_MEMORY_MAP,
+                 checkpoint_every: int = 0, checkpoint_dir: Optional[str] = None,
+                 dump: str = 'full', dump_every: int = 0):
         """
         Initialize the simulator with default state.
+        Trace and dump lines go to trace when given, otherwise they are
+        collected in the output list. A BinaryTraceWriter records the same
+        states and memory words without formatting them as text.
+        trace_policy selects which steps are traced (see parse_trace_policy).
+        memory_map lists the (name, start, end) memory segments.
+        With checkpoint_every, a snapshot is kept every that many
+        instructions (and saved in checkpoint_dir when given), which
+        rewind() and step_back() return to.
+        dump is the memory dump mode (see DUMP_MODES); with dump_every, a
+        dump is also written every that many instructions.
         """
+        if dump not in DUMP_MODES:
+            raise ValueError(f"unknown dump mode '{dump}'")
         # Register file (x0-x31) - RISC-V has 32 general-purpose 32-bit registers
-        # Initialize all registers to 0
-        self.regs = {f'x{i}': 0 for i in range(32)}
-        self.regs['x0'] = 0  # x0 is hardwired to zero in RISC-V and cannot be modified
+        # Initialize all registers to 0; slot X0_SINK absorbs writes to x0,
+        # which is hardwired to zero in RISC-V and cannot be modified
+        self.regs = [0] * 33
         
         # Memory ranges - segmenting memory into different regions to simulate
-        # real hardware memory organization
-        self.CODE_START = 0x00000000  # Where code is stored (at address 0)
-        self.CODE_END = 0x000000FF    # 256 bytes of program memory
-        self.STACK_START = 0x00000100    # Stack memory follows program memory
-        self.STACK_END = 0x0000017F      # 128 bytes of stack memory
-        self.DATA_START = 0x00010000     # Data memory at a separate location
-        self.DATA_END = 0x0001007F       # 128 bytes of data memory
-        
-        # Initialize memory as a continuous block of bytes
-        self.mem = bytearray(0x00010080)  
+        # real hardware memory organization. Each segment is also exposed as
+        # <NAME>_START/<NAME>_END (CODE_START, STACK_END, ...).
+        self.memory = Memory(memory_map)
+        for name, start, end in self.memory.regions:
+            setattr(self, f'{name.upper()}_START', start)
+            setattr(self, f'{name.upper()}_END', end)
         
         # Start at the beginning of program memory
         self.pc = self.CODE_START
+
+        # Digest of the loaded program image (see image_digest()), which
+        # checkpoints record
+        self.program = image_digest(self.memory)
         
         # Statistics counters to track execution metrics
         self.count = 0      
         self.cycles = 0     
+        self.halted = False  # Set once the virtual halt has executed
         
-        # Output buffer - stores formatted output for later writing to file
-        self.output = []
+        # Output buffer - stores formatted output for later writing to file,
+        # or a TraceWriter that streams it out as the run progresses
+        self.output = trace if trace is not None else []
+        self.trace_policy = parse_trace_policy(trace_policy)
+        self.binary_trace = isinstance(trace, BinaryTraceWriter)
+        if self.binary_trace:
+            self.state = self.state_binary
+            self.state_steps = self.state_steps_binary
+
+        # Decoded instruction cache, keyed by PC. Entries are dropped by
+        # write() whenever a store lands in program memory.
+        self.use_cache = decode_cache
+        self.decoded = {}
+
+        # Execution engine: 'interp' dispatches one instruction at a time,
+        # 'translate' compiles basic blocks into Python functions (cached by
+        # start PC, dropped on any store into program memory), one set for
+        # each way a block can be traced (see translate())
+        self.engine = engine
+        self.blocks = {}
+        self.batched_blocks = {}
+        self.untraced_blocks = {}
+
+        # Extra per-instruction callbacks (profilers, timing models); see
+        # add_hook(). With none and no step-by-step tracing, run() takes the
+        # untraced paths.
+        self.hooks = []
+
+        # Checkpoints by instruction count (see advance())
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoints = {}
+
+        # Memory dumps; dump_base is a fork of memory as of the previous
+        # dump (or the loaded program), which 'changed' dumps compare with
+        self.dump_mode = dump
+        self.dump_every = dump_every
+        self.dump_base = None
+
+    def reset(self, trace: Union[TraceWriter, BinaryTraceWriter, None] = None,
+              trace_policy: str = 'every', engine: Optional[str] = None, dump: str = 'full'):
+        """
+        Return to the state of a new simulator with the same memory map,
+        ready for load(), reusing this one's objects instead of building
+        new ones. Memory and caches are emptied and hooks and checkpoints
+        dropped; trace, trace_policy and dump are as for __init__, and the
+        engine is kept unless given.
+        """
+        if dump not in DUMP_MODES:
+            raise ValueError(f"unknown dump mode '{dump}'")
+        self.regs[:] = [0] * 33  # In place, like restore()
+        self.memory.clear()
+        self.pc = self.CODE_START
+        self.program = image_digest(self.memory)
+        self.count = self.cycles = 0
+        self.halted = False
+
+        self.output = trace if trace is not None else []
+        self.trace_policy = parse_trace_policy(trace_policy)
+        self.binary_trace = isinstance(trace, BinaryTraceWriter)
+        if self.binary_trace:
+            self.state = self.state_binary
+            self.state_steps = self.state_steps_binary
+        else:
+            self.__dict__.pop('state', None)
+            self.__dict__.pop('state_steps', None)
+
+        if engine is not None:
+            self.engine = engine
+        self.decoded.clear()
+        self.blocks.clear()
+        self.batched_blocks.clear()
+        self.untraced_blocks.clear()
+        self.hooks.clear()
+        self.__dict__.pop('read', None)  # Data-side wrappers (cache.CacheModel)
+        self.__dict__.pop('write', None)
+        self.checkpoints.clear()
+        self.checkpoint_every = 0
+        self.checkpoint_dir = None
+        self.dump_mode = dump
+        self.dump_every = 0
+        self.dump_base = None
 
     def read(self, addr: int, size: int = 4) -> int:
         """
         Read from memory with bounds checking.
+        Data loads go through read() and stores through write(), while
+        instruction fetch reads memory directly, so a data-side model can
+        wrap these two (see cache.CacheModel).
         """
-        # Check if address is within the bounds of allocated memory
-        if addr < 0 or addr + size > len(self.mem):
-            return 0
-        
-        # Check if address is in valid memory range
-        if not (self.CODE_START <= addr <= self.CODE_END or
-                self.STACK_START <= addr <= self.STACK_END or
-                self.DATA_START <= addr <= self.DATA_END):
-            return 0
-        
-        # Assemble multiple bytes into a single integer value
-        val = sum(self.mem[addr + i] << (i * 8) for i in range(size))
-        return val
+        return self.memory.read(addr, size)
 
     def write(self, addr: int, val: int, size: int = 4):
         """
         Write to memory with bounds checking.
         """
-        # Check if address is within the bounds of allocated memory
-        if addr < 0 or addr + size > len(self.mem):
+        if not self.memory.write(addr, val, size):
             return
-        
-        # Check if address is in valid memory range (program, stack, or data)
-        if not (self.CODE_START <= addr <= self.CODE_END or
-                self.STACK_START <= addr <= self.STACK_END or
-                self.DATA_START <= addr <= self.DATA_END):
-            return
-        
-        # Split the integer value into individual bytes and write them to memory
-        for i in range(size):
-            self.mem[addr + i] = (val >> (i * 8)) & 0xFF
+
+        # Self-modifying code: forget any decoded instruction overlapping the
+        # bytes just written, and every translated block
+        if addr <= self.CODE_END and addr + size > self.CODE_START:
+            if self.decoded:
+                for pc in range(addr - 3, addr + size):
+                    self.decoded.pop(pc, None)
+            self.blocks.clear()
+            self.batched_blocks.clear()
+            self.untraced_blocks.clear()
 
     def get(self, reg: str) -> int:
         """
-        Get register value with special handling for x0.
+        Get register value by name ('x0'..'x31').
         """
-        # x0 is hardwired to 0 in RISC-V architecture
-        if reg == 'x0':
-            return 0
-        return self.regs[reg]
+        return self.regs[REG_INDEX[reg]]
 
     def set(self, reg: str, val: int):
         """
-        Set register value with special handling for x0.
+        Set register value by name, wrapping it to 32 bits.
         """
         # x0 cannot be modified in RISC-V architecture
-        if reg != 'x0':
-            self.regs[reg] = val
+        index = REG_INDEX[reg]
+        if index:
+            self.regs[index] = val & 0xFFFFFFFF
+
+    def load(self, prog: Union[List[str], bytes], fmt: str = 'binary'):
+        """
+        Load program into memory from the start of the code segment: lines
+        of binary or hex words, or for fmt 'raw' a bytes-like raw image of
+        little-endian words (see read_program()), which may run on into
+        the segments that follow.
+        A simulator with untouched memory shares the pages of the program
+        image copy-on-write with every other simulator that loaded the same
+        program.
+        """
+        if fmt == 'raw':
+            if len(prog) & 3:
+                raise ValueError(f'raw image of {len(prog)} bytes is not a whole number of words')
+            key = (fmt, bytes(prog), self.memory.regions)
+        else:
+            key = (fmt, tuple(line.strip() for line in prog), self.memory.regions)
+        entry = _IMAGES.pop(key, None)
+        if entry is None:
+            image = Memory(self.memory.regions)
+            self.load_words(image, prog, fmt, self.CODE_START)
+            entry = image, image_digest(image)
+        _IMAGES[key] = entry  # Most recently used last
+        image, self.program = entry
+        if len(_IMAGES) > _MAX_IMAGES:
+            del _IMAGES[next(iter(_IMAGES))]
+
+        if self.memory.pages:
+            # Memory already holds data: store the program over it
+            self.load_words(self, prog, fmt, self.CODE_START)
+            self.dump_base = self.memory.fork()
+        else:
+            self.memory = image.fork()
+            self.dump_base = image
+            self.decoded.clear()
+            self.blocks.clear()
+            self.batched_blocks.clear()
+            self.untraced_blocks.clear()
 
-    def load(self, prog: List[str], fmt: str = 'binary'):
+    @staticmethod
+    def load_words(target, prog: Union[List[str], bytes], fmt: str, base: int = 0):
         """
-        Load program into memory.
+        Write the words of a program into target (a Memory or Simulator),
+        starting at address base.
         """
-        addr = 0  
+        if fmt == 'raw':
+            if isinstance(target, Memory):
+                Simulator.load_image(target, prog, base)
+            else:
+                for i, (val,) in enumerate(struct.iter_unpack('<I', prog)):
+                    target.write(base + (i << 2), val)
+            return
+
+        addr = base
         for line in prog:
             line = line.strip()
             if not line:  
@@ -285,101 +1331,74 @@ class Simulator:
             else:  
                 val = int(line, 2)   
                 
-            self.write(addr, val)
+            target.write(addr, val)
             addr += 4  
 
+    @staticmethod
+    def load_image(memory: 'Memory', image: bytes, base: int = 0):
+        """
+        Copy a raw image into memory from address base (word-aligned) in
+        slices, storing exactly the words that word-by-word writes would
+        store.
+        """
+        image = memoryview(image)
+        for start, end in zip(memory.starts, memory.ends):
+            # Words that start inside the segment and end below the limit
+            first = max((start + 3) & ~3, base)
+            stop = min((end & ~3) + 4, base + len(image), memory.limit & ~3)
+            if first < stop:
+                memory.write_bytes(first, image[first - base:stop - base])
+
     def exec(self, instr: int) -> bool:
         """
         Execute a single RISC-V instruction.
         """
-        # Extract opcode (bits 0-6)
-        op = instr & 0x7F
-        
-        # Extract register fields
-        rd = (instr >> 7) & 0x1F
-        funct3 = (instr >> 12) & 0x7
-        rs1 = (instr >> 15) & 0x1F
-        rs2 = (instr >> 20) & 0x1F
-        funct7 = (instr >> 25) & 0x7F
-        
-        # Extract immediate fields
-        imm_i = ((instr >> 20) & 0xFFF)
-        imm_s = ((instr >> 25) & 0x7F) << 5 | ((instr >> 7) & 0x1F)
-        imm_b = ((instr >> 31) & 0x1) << 12 | ((instr >> 7) & 0x1) << 11 | \
-                ((instr >> 25) & 0x3F) << 5 | ((instr >> 8) & 0xF) << 1
-        imm_u = instr & 0xFFFFF000
-        imm_j = ((instr >> 31) & 0x1) << 20 | ((instr >> 12) & 0xFF) << 12 | \
-                ((instr >> 20) & 0x1) << 11 | ((instr >> 21) & 0x3FF) << 1
-        
-        # Sign extend immediates
-        if imm_i & 0x800:  
-            imm_i |= 0xFFFFF000
-        if imm_s & 0x800:  
-            imm_s |= 0xFFFFF000
-        if imm_b & 0x1000:  
-            imm_b |= 0xFFFFE000
-        if imm_j & 0x100000:  
-            imm_j |= 0xFFE00000
-        
-        # Convert register numbers to names
-        rd_reg = f'x{rd}'
-        rs1_reg = f'x{rs1}'
-        rs2_reg = f'x{rs2}'
-        
-        # Execute instruction based on opcode
-        if op == 0x33:  # R-type instructions
-            if funct3 == 0x0:  # ADD/SUB
-                if funct7 == 0x00:  # ADD
-                    self.set(rd_reg, self.get(rs1_reg) + self.get(rs2_reg))
-                elif funct7 == 0x20:  # SUB
-                    self.set(rd_reg, self.get(rs1_reg) - self.get(rs2_reg))
-            elif funct3 == 0x2:  # SLT
-                self.set(rd_reg, 1 if self.get(rs1_reg) < self.get(rs2_reg) else 0)
-            elif funct3 == 0x5:  # SRL/SRA
-                shamt = (instr >> 20) & 0x1F
-                if funct7 == 0x00:  # SRL
-                    self.set(rd_reg, (self.get(rs1_reg) & 0xFFFFFFFF) >> shamt)
-            elif funct3 == 0x6:  # OR
-                self.set(rd_reg, self.get(rs1_reg) | self.get(rs2_reg))
-            elif funct3 == 0x7:  # AND
-                self.set(rd_reg, self.get(rs1_reg) & self.get(rs2_reg))
-            else:
-                return False
-        elif op == 0x13:  # I-type ALU instructions
-            if funct3 == 0x0:  # ADDI
-                self.set(rd_reg, self.get(rs1_reg) + imm_i)
-            else:
-                return False
-        elif op == 0x03:  # Load instructions
-            addr = self.get(rs1_reg) + imm_i
-            if funct3 == 0x2:  # LW
-                self.set(rd_reg, self.read(addr))
-            else:
-                return False
-        elif op == 0x23:  # Store instructions
-            addr = self.get(rs1_reg) + imm_s
-            if funct3 == 0x2:  # SW
-                self.write(addr, self.get(rs2_reg))
-            else:
-                return False
-        elif op == 0x63:  # Branch instructions
-            if funct3 == 0x0:  # BEQ
-                if self.get(rs1_reg) == self.get(rs2_reg):
-                    self.pc += imm_b - 4  
-            elif funct3 == 0x1:  # BNE
-                if self.get(rs1_reg) != self.get(rs2_reg):
-                    self.pc += imm_b - 4
-            elif funct3 == 0x4:  # BLT
-                if self.get(rs1_reg) < self.get(rs2_reg):
-                    self.pc += imm_b - 4
-            else:
-                return False
-        elif op == 0x67:  # JALR
-            target = (self.get(rs1_reg) + imm_i) & ~1  # Clear least significant bit
-            self.set(rd_reg, self.pc)
+        return self.execute(decode(instr))
+
+    def execute(self, rec: tuple) -> bool:
+        """
+        Execute a pre-decoded instruction record (see decode()).
+        Register values are unsigned 32-bit; SLT and BLT compare them as
+        signed by flipping the sign bit first.
+        """
+        kind, a, b, c = rec
+        regs = self.regs
+
+        # Execute instruction based on its decoded kind
+        if kind == ADD:
+            regs[a] = (regs[b] + regs[c]) & 0xFFFFFFFF
+        elif kind == ADDI:
+            regs[a] = (regs[b] + c) & 0xFFFFFFFF
+        elif kind == LW:
+            regs[a] = self.read((regs[b] + c) & 0xFFFFFFFF)
+        elif kind == SW:
+            self.write((regs[a] + c) & 0xFFFFFFFF, regs[b])
+        elif kind == BEQ or kind == HALT:
+            if regs[a] == regs[b]:
+                self.pc = ((self.pc + c) & 0xFFFFFFFF) - 4
+        elif kind == BNE:
+            if regs[a] != regs[b]:
+                self.pc = ((self.pc + c) & 0xFFFFFFFF) - 4
+        elif kind == BLT:
+            if regs[a] ^ 0x80000000 < regs[b] ^ 0x80000000:
+                self.pc = ((self.pc + c) & 0xFFFFFFFF) - 4
+        elif kind == SUB:
+            regs[a] = (regs[b] - regs[c]) & 0xFFFFFFFF
+        elif kind == SLT:
+            regs[a] = 1 if regs[b] ^ 0x80000000 < regs[c] ^ 0x80000000 else 0
+        elif kind == SRL:
+            regs[a] = regs[b] >> c
+        elif kind == OR:
+            regs[a] = regs[b] | regs[c]
+        elif kind == AND:
+            regs[a] = regs[b] & regs[c]
+        elif kind == JALR:
+            target = (regs[b] + c) & 0xFFFFFFFE  # Clear least significant bit
+            regs[a] = self.pc
             # Set PC to target address
             self.pc = target - 4
-
+        elif kind == NOP:
+            pass
         else:
             # Unrecognized opcode
             return False
@@ -392,47 +1411,418 @@ class Simulator:
         This includes PC and register values in binary format.
         Results are stored in output buffer for later writing to file.
         """
-        # Format PC as 32-bit binary string
-        pc_bin = format(self.pc, '032b')
-        
-        # Format all 32 registers as binary strings and join with spaces
-        regs_bin = ' '.join(format(self.get(f'x{i}'), '032b') for i in range(32))
-        
-        # Add PC and registers to output buffer
-        self.output.append(f"{pc_bin} {regs_bin}")
+        # Format PC and all 32 registers as 32-bit binary strings joined with
+        # spaces (the x0 sink in the last register slot is ignored by format)
+        self.output.append(STATE_FORMAT.format(self.pc, *self.regs))
+
+    def state_binary(self):
+        """
+        Record the current state in a binary trace (replaces state()).
+        """
+        self.output.step(self.pc, self.regs)
+
+    def state_steps(self, records: List[tuple], regs: List[int]):
+        """
+        Trace a run of steps at once, as state() after each would: records
+        holds a (pc, register, value) triple per step, register 0 when the
+        step wrote none, and regs the register values before the first.
+        """
+        text = [''] + [format(val, '032b') for val in regs[:32]]
+        join = ' '.join
+        lines = []
+        append = lines.append
+        pcs = {}  # A block's steps have few distinct PCs
+        for pc, i, val in records:
+            text[0] = pcs.get(pc) or pcs.setdefault(pc, format(pc, '032b'))
+            if i:
+                text[i + 1] = format(val, '032b')
+            append(join(text))
+        self.output.extend(lines)
+
+    def state_steps_binary(self, records: List[tuple], regs: List[int]):
+        """
+        state_steps() for a binary trace (replaces state_steps()).
+        """
+        self.output.step_records(records, regs)
 
     def dump(self):
         """
         Print memory contents in binary format.
-        This outputs all used memory regions to the output buffer.
+        This outputs all used memory regions to the output buffer: every
+        word, or in 'changed' mode the address and value of each word
+        written since the previous dump.
         """
-        # Print program memory (word by word)
-        for addr in range(self.CODE_START, self.CODE_END + 1, 4):
-            val = self.read(addr)
-            self.output.append(format(val, '032b'))
-        
-        # Print stack memory (word by word)
-        for addr in range(self.STACK_START, self.STACK_END + 1, 4):
-            val = self.read(addr)
-            self.output.append(format(val, '032b'))
-        
-        # Print data memory (word by word)
-        for addr in range(self.DATA_START, self.DATA_END + 1, 4):
-            val = self.read(addr)
-            self.output.append(format(val, '032b'))
+        memory = self.memory
+        if self.dump_mode == 'changed':
+            for _, start, end in memory.regions:
+                words = memory.changed_words(self.dump_base, start, end)
+                if self.binary_trace:
+                    self.output.changed(words)
+                else:
+                    for addr, val in words:
+                        self.output.append(format_changed(addr, val))
+            # Later writes copy the pages they touch, so the next dump
+            # only compares those
+            self.dump_base = memory.fork()
+            return
+        if self.dump_mode == 'none':
+            return
+
+        # Every segment (program, stack and data memory), a page at a time
+        for _, start, end in memory.regions:
+            if self.binary_trace:
+                self.output.words(memory.read_words(start, end))
+            elif isinstance(self.output, TraceWriter):
+                self.output.append_text(format_words(memory.words_bytes(start, end)))
+            else:
+                self.output.extend(format_words(memory.words_bytes(start, end)).splitlines())
+
+    def translate(self, pc: int, trace: Optional[str] = 'hook') -> tuple:
+        """
+        Compile the basic block starting at pc into a Python function.
+        Returns (fn, n, halts): fn(sim, regs, read, write, hook) executes the
+        block's n instructions and returns the next PC; halts is True when
+        the block ends with the virtual halt. With trace 'hook' the block
+        keeps sim.pc current and calls hook(pc, rec) after each instruction,
+        like the interpreter. With trace 'batch' it instead appends a
+        (pc, register, value) record per instruction (see state_steps())
+        to the list passed as hook, all at once at the end of the block.
+        An untraced block (trace None) only updates registers and memory.
+        """
+        lines = ['def block(sim, regs, read, write, hook):']
+        records = []
+        namespace = {}
+        n = 0
+        halts = False
+        addr = pc
+        nxt = None
+        while n < self.MAX_BLOCK and self.CODE_START <= addr <= self.CODE_END:
+            rec = decode(self.memory.read(addr))
+            kind, a, b, c = rec
+            if kind == INVALID:
+                break
+            rb, rc = f'regs[{b}]', f'regs[{c}]'
+            expr = None
+            if kind == ADD:
+                expr = f'({rb} + {rc}) & 0xFFFFFFFF'
+            elif kind == ADDI:
+                expr = f'({rb} + {c}) & 0xFFFFFFFF'
+            elif kind == LW:
+                expr = f'read(({rb} + {c}) & 0xFFFFFFFF)'
+            elif kind == SUB:
+                expr = f'({rb} - {rc}) & 0xFFFFFFFF'
+            elif kind == SLT:
+                expr = f'1 if {rb} ^ 0x80000000 < {rc} ^ 0x80000000 else 0'
+            elif kind == SRL:
+                expr = f'{rb} >> {c}'
+            elif kind == OR:
+                expr = f'{rb} | {rc}'
+            elif kind == AND:
+                expr = f'{rb} & {rc}'
+
+            body = []
+            nxt = str(addr + 4)
+            record = (0, 0)  # Register written and its value, for 'batch'
+            end = True  # Blocks end after branches, jumps and stores
+            if expr is not None or kind == NOP:
+                # Writes to x0 are dropped, and none of these expressions has
+                # side effects, so such instructions only advance the PC
+                if expr is not None and a != X0_SINK:
+                    body.append(f'regs[{a}] = v{n} = {expr}')
+                    record = (a, f'v{n}')
+                end = False
+            elif kind == SW:
+                body.append(f'write((regs[{a}] + {c}) & 0xFFFFFFFF, {rb})')
+            elif kind == JALR:
+                body.append(f'target = ({rb} + {c}) & 0xFFFFFFFE')
+                if a != X0_SINK:
+                    body.append(f'regs[{a}] = {addr}')
+                    record = (a, addr)
+                nxt = 'target'
+            else:  # BEQ, BNE, BLT, HALT
+                if kind == BLT:
+                    cond = f'regs[{a}] ^ 0x80000000 < {rb} ^ 0x80000000'
+                else:
+                    cond = f'regs[{a}] {"!=" if kind == BNE else "=="} {rb}'
+                nxt = f'{(addr + c) & 0xFFFFFFFF} if {cond} else {addr + 4}'
+                halts = kind == HALT
+            if trace == 'hook':
+                namespace[f'R{n}'] = rec
+                body.append(f'sim.pc = {nxt}')
+                body.append(f'hook({addr}, R{n})')
+            elif trace == 'batch':
+                records.append(f'({"pc" if end else nxt}, {record[0]}, {record[1]})')
+            lines.extend('    ' + line for line in body)
+            n += 1
+            addr += 4
+            if end:
+                break
+        if n == 0:
+            return None, 0, False  # Unsupported instruction at pc
+        if trace == 'hook':
+            lines.append('    return sim.pc')
+        elif trace == 'batch':
+            # Only the last instruction's next PC can depend on registers
+            lines.append(f'    pc = {nxt}')
+            lines.append(f'    hook += ({", ".join(records)},)')
+            lines.append('    return pc')
+        else:
+            lines.append(f'    return {nxt}')
+
+        exec(compile('\n'.join(lines), f'<block 0x{pc:08x}>', 'exec'), namespace)
+        return namespace['block'], n, halts
+
+    def trace_hook(self):
+        """
+        Build the per-instruction trace callback for the trace policy.
+        Returns None when nothing is traced step by step.
+        """
+        name, arg = self.trace_policy
+        state = self.state
+        if name == 'every' and arg == 1:
+            return self.trace_step
+        if name == 'every':
+            countdown = [arg]
+            def hook(pc, rec):
+                countdown[0] -= 1
+                if not countdown[0]:
+                    countdown[0] = arg
+                    state()
+            return hook
+        if name == 'change':
+            regs = self.regs
+            last = [[regs[i] for i in arg]]
+            def hook(pc, rec):
+                current = [regs[i] for i in arg]
+                if current != last[0]:
+                    last[0] = current
+                    state()
+            return hook
+        if name == 'branches':
+            def hook(pc, rec):
+                if rec[0] in CONTROL_KINDS:
+                    state()
+            return hook
+        return None  # 'final'
+
+    def trace_step(self, pc: int, rec: tuple):
+        """
+        The trace hook of the 'every' policy. run_blocks() recognizes it
+        and traces whole blocks at a time instead of calling it.
+        """
+        self.state()
+
+    def add_hook(self, hook):
+        """
+        Call hook(pc, rec) after every instruction run() executes, with
+        self.pc already set to the next PC.
+        """
+        self.hooks.append(hook)
+
+    def step_hook(self):
+        """
+        The per-instruction callback for run(): the trace hook followed by
+        the added hooks. Returns None when there is nothing to call.
+        """
+        hooks = [self.trace_hook()] + self.hooks
+        hooks = [hook for hook in hooks if hook is not None]
+        if len(hooks) < 2:
+            return hooks[0] if hooks else None
+        def hook(pc, rec):
+            for fn in hooks:
+                fn(pc, rec)
+        return hook
+
+    def snapshot(self) -> Snapshot:
+        """
+        Capture registers, PC, counters and memory. Memory is forked
+        copy-on-write, so this costs one dict copy now and one page copy
+        for each page written afterwards.
+        """
+        return Snapshot(self.pc, self.count, self.cycles, self.halted,
+                        tuple(self.regs[:32]), self.memory.fork(), self.program)
+
+    def restore(self, snap: Snapshot):
+        """
+        Return to a snapshot. The snapshot stays valid and can be restored
+        again. Raises ValueError if it has a different memory map.
+        """
+        if snap.memory.regions != self.memory.regions:
+            raise ValueError('snapshot memory map does not match the simulator')
+        self.regs[:32] = snap.regs  # In place: hooks hold the register list
+        self.regs[X0_SINK] = 0
+        self.pc, self.count, self.cycles, self.halted = snap.pc, snap.count, snap.cycles, snap.halted
+        self.memory = snap.memory.fork()
+        self.decoded.clear()
+        self.blocks.clear()
+        self.batched_blocks.clear()
+        self.untraced_blocks.clear()
+
+    def checkpoint(self):
+        """
+        Keep a snapshot of the current state, and save it to
+        checkpoint_dir if set.
+        """
+        if self.count in self.checkpoints:
+            return
+        snap = self.checkpoints[self.count] = self.snapshot()
+        if self.checkpoint_dir:
+            with open(checkpoint_path(self.checkpoint_dir, self.count), 'wb') as f:
+                save_snapshot(snap, f)
+
+    def rewind(self, count: int):
+        """
+        Go back to the state after count instructions: restore the latest
+        checkpoint at or before count and replay forward, untraced.
+        Raises ValueError if there is no such checkpoint.
+        """
+        earlier = [n for n in self.checkpoints if n <= count]
+        if not earlier:
+            raise ValueError(f'no checkpoint at or before instruction {count}')
+        self.restore(self.checkpoints[max(earlier)])
+        every, self.checkpoint_every = self.checkpoint_every, 0
+        dump_every, self.dump_every = self.dump_every, 0
+        try:
+            self.advance(count)
+        finally:
+            self.checkpoint_every = every
+            self.dump_every = dump_every
+
+    def step_back(self, n: int = 1):
+        """
+        Undo the last n instructions (see rewind()).
+        """
+        self.rewind(max(self.count - n, 0))
+
+    def advance(self, max: int, hook=None):
+        """
+        Execute until halt, an unsupported instruction or PC, or until
+        count reaches max, with no final trace line or dump; a run can be
+        continued by calling advance() again. Takes a checkpoint at the
+        start and every checkpoint_every instructions, and dumps memory
+        every dump_every instructions before max, when enabled.
+        """
+        every, dump_every = self.checkpoint_every, self.dump_every
+        if every:
+            self.checkpoint()
+        while not self.halted and self.count < max:
+            stop = max
+            if every:
+                stop = min(stop, (self.count // every + 1) * every)
+            if dump_every:
+                stop = min(stop, (self.count // dump_every + 1) * dump_every)
+            if self.engine == 'translate':
+                self.run_blocks(stop, hook)
+            else:
+                self.run_interp(stop, hook)
+            if self.count < stop:
+                break  # Stopped before the budget ran out
+            if every and self.count % every == 0:
+                self.checkpoint()
+            if dump_every and self.count % dump_every == 0 and self.count < max and not self.halted:
+                self.dump()
 
     def run(self, max: int = 1000):
         """
         Run the simulator until completion or max_instructions limit.
         """
+        self.advance(max, self.step_hook())
+        self.finish()
+
+    def finish(self):
+        """
+        End a run: the final trace line if the trace policy asks for one,
+        then the memory dump.
+        """
+        # Final-only tracing records just the state after the last step (of
+        # this run, or of the run a restored checkpoint came from)
+        if self.trace_policy[0] == 'final' and self.count:
+            self.state()
+
+        # After execution is complete, print final memory state
+        self.dump()
+
+    def run_blocks(self, max: int, hook=None):
+        """
+        Execute translated basic blocks until halt or the max budget,
+        calling hook(pc, rec) after each instruction when given. When hook
+        is trace_step() alone, blocks record their steps instead, and those
+        are traced a few thousand at a time by state_steps().
+        """
+        trace = None
+        if hook is not None:
+            trace = 'batch' if hook == self.trace_step else 'hook'
+        blocks = {'hook': self.blocks, 'batch': self.batched_blocks, None: self.untraced_blocks}[trace]
+        regs, read, write = self.regs, self.memory.read, self.write
+        code_start, code_end = self.CODE_START, self.CODE_END
+        start = count = self.count
+        pc = self.pc
+        if trace == 'batch':
+            # Blocks append to records, which is traced from the registers
+            # as they were before its first step
+            hook = records = []
+            before = regs[:32]
+        while count < max:
+            if not (code_start <= pc <= code_end):
+                break
+
+            block = blocks.get(pc)
+            if block is None:
+                block = blocks[pc] = self.translate(pc, trace)
+            fn, n, halts = block
+            if n == 0:
+                break  # Unsupported instruction at pc
+
+            # Not enough budget left for the whole block: finish the run one
+            # instruction at a time so it stops exactly at max
+            if count + n > max:
+                self.pc, self.count = pc, count
+                self.cycles += count - start
+                if trace == 'batch':
+                    self.state_steps(records, before)
+                    hook = self.trace_step
+                self.run_interp(max, hook)
+                return
+
+            pc = fn(self, regs, read, write, hook)
+            count += n
+            if halts:
+                self.halted = True
+                break
+            if trace == 'batch' and len(records) >= 4096:
+                self.state_steps(records, before)
+                records.clear()
+                before = regs[:32]
+
+        self.pc, self.count = pc, count
+        self.cycles += count - start
+        if trace == 'batch':
+            self.state_steps(records, before)
+
+    def run_interp(self, max: int, hook=None):
+        """
+        Interpret instructions one at a time until halt or the max budget,
+        calling hook(pc, rec) after each instruction when given.
+        """
+        if hook is None:
+            self.run_quiet(max)
+            return
+
+        decoded = self.decoded
         while self.count < max:
-            if not (self.CODE_START <= self.pc <= self.CODE_END):
+            pc = self.pc
+            if not (self.CODE_START <= pc <= self.CODE_END):
                 break
-                
-            instr = self.read(self.pc)
-            
+
+            # Fetch and decode, reusing the cached record for this PC
+            rec = decoded.get(pc) if self.use_cache else None
+            if rec is None:
+                rec = decode(self.memory.read(pc))
+                if self.use_cache:
+                    decoded[pc] = rec
+
             # Execute instruction and check for success
-            success = self.exec(instr)
+            success = self.execute(rec)
             if not success:
                 break  # Stop if instruction execution failed
                 
@@ -441,61 +1831,469 @@ class Simulator:
             self.count += 1
             self.cycles += 1  
             
-            # Print state after each instruction
-            self.state()
+            # Trace the state after this instruction
+            hook(pc, rec)
             
             # Check for virtual halt
             # The instruction 0x00000063 is "beq x0,x0,0" which creates an infinite loop
             # This is a common way to implement a program end in RISC-V
-            if instr == 0x00000063:  # beq zero,zero,0 noice ;)
+            if rec[0] == HALT:  # beq zero,zero,0 noice ;)
+                self.halted = True
                 break
 
-        # After execution is complete, print final memory state
-        self.dump()
+
+    def run_quiet(self, max: int):
+        """
+        run_interp() without a hook. Kept as a separate loop so untraced
+        runs pay nothing per step for tracing.
+        """
+        decoded = self.decoded
+        execute = self.execute
+        while self.count < max:
+            pc = self.pc
+            if not (self.CODE_START <= pc <= self.CODE_END):
+                break
+
+            rec = decoded.get(pc) if self.use_cache else None
+            if rec is None:
+                rec = decode(self.memory.read(pc))
+                if self.use_cache:
+                    decoded[pc] = rec
+
+            if not execute(rec):
+                break
+
+            self.pc += 4
+            self.count += 1
+            self.cycles += 1
+            if rec[0] == HALT:
+                self.halted = True
+                break
+
+
+def read_program(path: str, fmt: str = 'binary') -> Union[List[str], bytes]:
+    """
+    Read a program file (- for stdin) for Simulator.load: its lines, or
+    for fmt 'raw' its bytes, memory-mapped when the file allows it.
+    """
+    if fmt != 'raw':
+        if path == '-':
+            return sys.stdin.readlines()
+        with open(path, 'r') as f:
+            return f.readlines()
+    if path == '-':
+        return sys.stdin.buffer.read()
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            return b''
+
+
+def simulate(prog: Union[List[str], bytes], output: str, fmt: str = 'binary', max_instr: int = 1000,
+             engine: str = 'interp', trace_format: str = 'text',
+             trace_policy: str = 'every', memory_map=DEFAULT_MEMORY_MAP,
+             observers=(), checkpoint_every: int = 0, checkpoint_dir: Optional[str] = None,
+             resume: Optional[str] = None, dump: str = 'full', dump_every: int = 0) -> 'Simulator':
+    """
+    Load and run a program, streaming its trace and memory dump to output
+    (a path, or - for stdout). This is what the command line does for one
+    input file. Each observer's attach(sim) is called before the run (see
+    profiler.Profiler). With resume, the run starts from the latest
+    checkpoint in that directory not beyond max_instr, if there is one.
+    dump and dump_every select the memory dumps (see Simulator).
+    Raises IOError when the output cannot be written, ValueError for an
+    unusable checkpoint.
+    """
+    # Open the output (stdout or file) so the trace streams out as it runs
+    if trace_format == 'binary':
+        trace = BinaryTraceWriter(output)
+    else:
+        trace = TraceWriter(output)
+
+    with trace:
+        # Create simulator instance and load the program into its memory
+        sim = Simulator(engine=engine, trace=trace, trace_policy=trace_policy,
+                        memory_map=memory_map, checkpoint_every=checkpoint_every,
+                        checkpoint_dir=checkpoint_dir, dump=dump, dump_every=dump_every)
+        sim.load(prog, fmt=fmt)
+        if resume:
+            snap = find_checkpoint(resume, max_instr, sim.program)
+            if snap is not None:
+                sim.restore(snap)
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        for observer in observers:
+            observer.attach(sim)
+
+        # Run the simulation; closing the trace writes the remaining output
+        sim.run(max=max_instr)
+    return sim
+
+
+def simulate_source(source: List[str], output: str, symbols: Optional[dict] = None,
+                    **options) -> 'Simulator':
+    """
+    Assemble source lines straight into a raw image in memory and run it
+    with simulate(); no intermediate file is written. symbols, if given,
+    is filled with the program's labels. Raises ValueError when the
+    source does not assemble.
+    """
+    from assembler_project import assemble_image
+    return simulate(assemble_image(source, symbols), output, fmt='raw', **options)
+
+
+# ===== BATCH MODE =====
+
+def read_manifest(path: str) -> List[tuple]:
+    """
+    Read a batch manifest: one job per line as
+        program output [format] [max-instr]
+    separated by whitespace. Blank lines and lines starting with # are
+    skipped. Returns (program, output, format, max_instr) tuples.
+    """
+    jobs = []
+    with open(path, 'r') as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if not 2 <= len(fields) <= 4:
+                raise ValueError(f'{path}:{lineno}: expected program output [format] [max-instr]')
+            fmt = fields[2] if len(fields) > 2 else 'binary'
+            if fmt not in ('binary', 'hex', 'raw'):
+                raise ValueError(f"{path}:{lineno}: unknown format '{fmt}'")
+            try:
+                max_instr = int(fields[3]) if len(fields) > 3 else 1000
+            except ValueError:
+                raise ValueError(f"{path}:{lineno}: invalid max-instr '{fields[3]}'")
+            jobs.append((fields[0], fields[1], fmt, max_instr))
+    return jobs
+
+
+def run_job(job: tuple) -> tuple:
+    """
+    Run one batch job in a worker process. Every failure is caught and
+    reported so that one bad program cannot stop the batch.
+    Returns (program, instructions, seconds, error or None).
+    """
+    (program, output, fmt, max_instr), options = job
+    start = time.perf_counter()
+    try:
+        prog = read_program(program, fmt)
+        sim = simulate(prog, output, fmt, max_instr, **options)
+        return program, sim.count, time.perf_counter() - start, None
+    except Exception as e:
+        return program, 0, time.perf_counter() - start, f'{type(e).__name__}: {e}'
+
+
+def run_isolated(job: tuple) -> tuple:
+    """
+    Run one batch job in a pool of its own, so that if its worker process
+    dies (a crash, or killed for running out of memory) the job is known to
+    be the cause. Returns like run_job.
+    """
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            return pool.submit(run_job, job).result()
+        except BrokenProcessPool:
+            return job[0][0], 0, time.perf_counter() - start, 'worker process died'
+
+
+def batch(jobs: List[tuple], workers: Optional[int] = None, chunksize: int = 1,
+          report=print, **options) -> int:
+    """
+    Run (program, output, format, max_instr) jobs across a process pool;
+    options are passed on to simulate(). Each job is its own future, with
+    up to chunksize jobs per worker in flight. If a worker process dies,
+    the jobs in flight at the time are run again one at a time in pools of
+    their own, so that only the job that crashed fails, and the rest of the
+    batch continues in a fresh pool. Reports one line per job with its
+    wall time as it completes, then overall throughput. Returns the number
+    of failed jobs.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = workers * max(chunksize, 1)
+    failed = 0
+    start = time.perf_counter()
+
+    def finished(result):
+        nonlocal failed
+        program, count, seconds, error = result
+        if error is None:
+            report(f"ok     {seconds * 1000:9.2f} ms  {count:9d} instr  {program}")
+        else:
+            failed += 1
+            report(f"FAILED {seconds * 1000:9.2f} ms  {program}: {error}")
+
+    pending = deque((job, options) for job in jobs)
+    while pending:
+        crashed = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            while (pending or running) and not crashed:
+                while pending and len(running) < window:
+                    job = pending.popleft()
+                    running[pool.submit(run_job, job)] = job
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        finished(future.result())
+                    except BrokenProcessPool:
+                        crashed.append(job)
+            crashed.extend(running.values())
+        for job in crashed:
+            finished(run_isolated(job))
+    elapsed = time.perf_counter() - start
+    report(f"{len(jobs)} programs ({failed} failed) in {elapsed:.2f} s, "
+           f"{len(jobs) / elapsed if elapsed else 0:.1f} programs/s")
+    return failed
+
+
+def batch_main(argv: List[str]):
+    """
+    Command line for batch mode: simulator.py batch <manifest> [options].
+    """
+    parser = argparse.ArgumentParser(prog='simulator.py batch',
+                                     description='Run many programs in parallel')
+    parser.add_argument('manifest', help='Job list: program output [format] [max-instr] per line')
+    parser.add_argument('--workers', type=int, default=None,
+                      help='Worker processes (default: one per CPU)')
+    parser.add_argument('--chunksize', type=int, default=1,
+                      help='Jobs queued per worker at a time (default: 1)')
+    parser.add_argument('--engine', choices=['interp', 'translate'], default='interp',
+                      help='Execution engine (default: interp)')
+    parser.add_argument('--trace-format', choices=['text', 'binary'], default='text',
+                      help='Output format (default: text)')
+    parser.add_argument('--trace', default='every',
+                      help='Steps to trace (default: every)')
+    parser.add_argument('--dump', choices=DUMP_MODES, default='full',
+                      help='Memory dump mode (default: full)')
+    parser.add_argument('--dump-every', type=int, metavar='N', default=0,
+                      help='Also dump memory every N instructions')
+    args = parser.parse_args(argv)
+    try:
+        parse_trace_policy(args.trace)
+        jobs = read_manifest(args.manifest)
+    except FileNotFoundError:
+        print(f"Error: Could not open manifest '{args.manifest}'")
+        sys.exit(1)
+    except ValueError as e:
+        parser.error(str(e))
+
+    failed = batch(jobs, workers=args.workers, chunksize=args.chunksize,
+                   engine=args.engine, trace_format=args.trace_format,
+                   trace_policy=args.trace, dump=args.dump, dump_every=args.dump_every)
+    sys.exit(1 if failed else 0)
+
+
+def add_simulation_arguments(parser: argparse.ArgumentParser):
+    """
+    Options shared by the single-program and run command lines.
+    """
+    parser.add_argument('--max-instr', type=int, default=1000,
+                      help='Maximum number of instructions to execute')
+    parser.add_argument('--engine', choices=['interp', 'translate'], default='interp',
+                      help='Execution engine (default: interp)')
+    parser.add_argument('--trace-format', choices=['text', 'binary'], default='text',
+                      help='Output format (default: text); see trace_convert.py')
+    parser.add_argument('--trace', default='every',
+                      help='Steps to trace: every, every:N, change:x1,x2,..., '
+                           'branches or final (default: every)')
+    parser.add_argument('--dump', choices=DUMP_MODES, default='full',
+                      help='Memory dump mode: every word, only the words changed since the '
+                           'previous dump with their addresses, or none (default: full)')
+    parser.add_argument('--dump-every', type=int, metavar='N', default=0,
+                      help='Also dump memory every N instructions')
+    parser.add_argument('--memory-map', default=None,
+                      help='Memory segments as name=start:end,... '
+                           '(default: code=0x0:0xff,stack=0x100:0x17f,data=0x10000:0x1007f)')
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                      help='Write an instruction profile as JSON to FILE (see profiler.py)')
+    parser.add_argument('--hotspots', type=int, metavar='N', default=0,
+                      help='Print the N most expensive PCs to stderr after the run')
+    parser.add_argument('--cycle-costs', default=None,
+                      help='Profiler cycle costs as name=cycles,..., e.g. lw=3,taken=2')
+    parser.add_argument('--pipeline', metavar='PREDICTOR', default=None,
+                      help='Model a five-stage pipeline with branch predictor not-taken, '
+                           'btfn or 2bit, and print its timing to stderr (see pipeline.py)')
+    parser.add_argument('--forwarding', choices=['full', 'mem', 'none'], default='full',
+                      help='Pipeline forwarding paths (default: full)')
+    parser.add_argument('--pipeline-json', metavar='FILE', default=None,
+                      help='Write the pipeline timing report as JSON to FILE')
+    parser.add_argument('--icache', metavar='SPEC', default=None,
+                      help='Model an instruction cache, e.g. size=4096,assoc=2,line=32,policy=lru '
+                           '(see cache.py); its statistics go to stderr')
+    parser.add_argument('--dcache', metavar='SPEC', default=None,
+                      help='Model a data cache, e.g. size=1024,assoc=4,line=16,write=through; '
+                           'uses the interp engine')
+    parser.add_argument('--cache-json', metavar='FILE', default=None,
+                      help='Write the cache statistics as JSON to FILE')
+    parser.add_argument('--checkpoint-every', type=int, metavar='N', default=0,
+                      help='Save a snapshot every N instructions to --checkpoint-dir')
+    parser.add_argument('--checkpoint-dir', metavar='DIR', default='checkpoints',
+                      help='Directory for checkpoints (default: checkpoints)')
+    parser.add_argument('--resume', metavar='DIR', default=None,
+                      help='Start from the latest checkpoint in DIR within --max-instr')
+
+
+def simulation_options(parser: argparse.ArgumentParser, args) -> dict:
+    """
+    simulate() keyword arguments from the shared options; exits through
+    parser.error() when they are invalid. The observers the options ask
+    for are also kept on args (args.profiler, args.pipeline_model,
+    args.cache_model) for report_observers().
+    """
+    args.profiler = args.pipeline_model = args.cache_model = None
+    try:
+        parse_trace_policy(args.trace)
+        memory_map = parse_memory_map(args.memory_map) if args.memory_map else DEFAULT_MEMORY_MAP
+        if args.profile or args.hotspots or args.cycle_costs:
+            from profiler import Profiler, parse_cycle_costs
+            costs = parse_cycle_costs(args.cycle_costs) if args.cycle_costs else None
+            args.profiler = Profiler(costs)
+        if args.pipeline or args.pipeline_json:
+            from pipeline import PipelineModel
+            args.pipeline_model = PipelineModel(args.pipeline or 'not-taken', args.forwarding)
+        if args.icache or args.dcache:
+            from cache import CacheModel, parse_cache
+            args.cache_model = CacheModel(
+                parse_cache(args.icache, 'icache') if args.icache else None,
+                parse_cache(args.dcache, 'dcache') if args.dcache else None)
+    except ValueError as e:
+        parser.error(str(e))
+    observers = [obs for obs in (args.profiler, args.pipeline_model, args.cache_model)
+                 if obs is not None]
+    if args.checkpoint_every < 0:
+        parser.error('--checkpoint-every must not be negative')
+    if args.dump_every < 0:
+        parser.error('--dump-every must not be negative')
+    return dict(max_instr=args.max_instr, engine=args.engine, trace_format=args.trace_format,
+                trace_policy=args.trace, memory_map=memory_map, observers=observers,
+                checkpoint_every=args.checkpoint_every,
+                checkpoint_dir=args.checkpoint_dir if args.checkpoint_every else None,
+                resume=args.resume, dump=args.dump, dump_every=args.dump_every)
+
+
+def report_observers(args, options: dict):
+    """
+    Write the reports the shared options asked for once the run is over.
+    """
+    if args.profiler is not None:
+        if args.profile:
+            with open(args.profile, 'w') as f:
+                args.profiler.write_json(f)
+        if args.hotspots:
+            for line in args.profiler.hotspots(args.hotspots):
+                print(line, file=sys.stderr)
+    if args.pipeline_model is not None:
+        if args.pipeline_json:
+            with open(args.pipeline_json, 'w') as f:
+                args.pipeline_model.write_json(f)
+        if args.pipeline:
+            for line in args.pipeline_model.summary():
+                print(line, file=sys.stderr)
+    if args.cache_model is not None:
+        if args.cache_json:
+            with open(args.cache_json, 'w') as f:
+                args.cache_model.write_json(f)
+        for line in args.cache_model.summary():
+            print(line, file=sys.stderr)
+
+
+def run_main(argv: List[str]):
+    """
+    Command line for run mode: simulator.py run <source> <output> [options]
+    assembles the source in memory and simulates it.
+    """
+    parser = argparse.ArgumentParser(prog='simulator.py run',
+                                     description='Assemble and simulate a program')
+    parser.add_argument('source', help='Assembly source (use - for stdin)')
+    parser.add_argument('output', help='Output file (use - for stdout)')
+    add_simulation_arguments(parser)
+    args = parser.parse_args(argv)
+    options = simulation_options(parser, args)
+
+    if args.source == '-':
+        source = sys.stdin.readlines()
+    else:
+        try:
+            with open(args.source, 'r') as f:
+                source = f.readlines()
+        except FileNotFoundError:
+            print(f"Error: Could not open input file '{args.source}'")
+            sys.exit(1)
+
+    # Label profiles with the program's own symbols
+    symbols = {}
+    for observer in options['observers']:
+        observer.symbols = symbols
+
+    try:
+        simulate_source(source, args.output, symbols, **options)
+    except ValueError as e:
+        print(f"Error: {args.source}: {e}")
+        sys.exit(1)
+    except IOError:
+        print(f"Error: Could not write to output file '{args.output}'")
+        sys.exit(1)
+    report_observers(args, options)
+
 
 def main():
     """
     Main function to parse command line arguments and run the simulator.
     """
+    if sys.argv[1:2] == ['batch']:
+        batch_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['run']:
+        run_main(sys.argv[2:])
+        return
+
     # Set up command line argument parsing
-    parser = argparse.ArgumentParser(description='RISC- Simulator')
+    parser = argparse.ArgumentParser(description='RISC- Simulator',
+                                     epilog='Batch mode: simulator.py batch <manifest> --help; '
+                                            'assemble and run: simulator.py run <source> <output>')
     parser.add_argument('input', help='Input file (use - for stdin)')
     parser.add_argument('output', help='Output file (use - for stdout)')
-    parser.add_argument('--format', choices=['binary', 'hex'], default='binary',
-                      help='Input format (default: binary)')
-    parser.add_argument('--max-instr', type=int, default=1000,
-                      help='Maximum number of instructions to execute')
+    parser.add_argument('--format', choices=['binary', 'hex', 'raw'], default='binary',
+                      help='Input format: binary or hex lines, or a raw little-endian '
+                           'image (default: binary)')
+    add_simulation_arguments(parser)
+    parser.add_argument('--symbols', default=None,
+                      help='Symbol table from assembler_project.py --symbols, to label profiles')
     args = parser.parse_args()
+    options = simulation_options(parser, args)
+    if args.symbols:
+        from assembler_project import read_symbols
+        try:
+            with open(args.symbols, 'r') as f:
+                symbols = read_symbols(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read symbols '{args.symbols}': {e}")
+        for observer in options['observers']:
+            observer.symbols = symbols
 
     # Read input from stdin or file
-    if args.input == '-':
-        prog = sys.stdin.readlines()
-    else:
-        try: # helps to skip statements that are not valid
-            with open(args.input, 'r') as f:
-                prog = f.readlines()
-        except FileNotFoundError:
-            print(f"Error: Could not open input file '{args.input}'")
-            sys.exit(1)
+    try: # helps to skip statements that are not valid
+        prog = read_program(args.input, args.format)
+    except FileNotFoundError:
+        print(f"Error: Could not open input file '{args.input}'")
+        sys.exit(1)
 
-    # Create simulator instance
-    sim = Simulator()
-    
-    # Load program into simulator memory
-    sim.load(prog, fmt=args.format)
-    
-    # Run the simulation
-    sim.run(max=args.max_instr)
-    
-    # Write output to stdout or file
-    if args.output == '-':
-        for line in sim.output:
-            print(line)
-    else:
-        try:
-            with open(args.output, 'w') as f:
-                for line in sim.output:
-                    f.write(line + '\n')
-        except IOError:
-            print(f"Error: Could not write to output file '{args.output}'")
-            sys.exit(1)
+    try:
+        simulate(prog, args.output, fmt=args.format, **options)
+    except ValueError as e:
+        print(f"Error: {args.input}: {e}")
+        sys.exit(1)
+    except IOError:
+        print(f"Error: Could not write to output file '{args.output}'")
+        sys.exit(1)
+    report_observers(args, options)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import io
+import os
+import tracemalloc
+
+import pytest
+
+import assembler_project
+from assembler_project import (AssemblyCache, assemble_file, assemble_image, assemble_lines,
+                               encode, split_blocks)
+
+SOURCE = [f"addi x{i % 31 + 1} x0 {i % 2000}\n" for i in range(5000)]
+SOURCE[10] = "start: add x1,x2,x3\n"
+SOURCE[12] = "top: addi x2 x0 1\n"
+SOURCE[600] = "beq x1,x2,top\n"
+
+
+# ----- encoder -----
+
+@pytest.mark.parametrize("line, word", [
+    # Words the original string-building encoders produced for rN names
+    ("add r1,r2,r3", 0b00000000001100010000000010110011),
+    ("sub r5,r6,r7", 0b01000000011100110000001010110011),
+    ("and r1,r2,r3", 0b00000000001100010111000010110011),
+    ("beq r1,r2,5", 0b00000000000100010000010101100011),
+    ("bne r3,r4,6", 0b00000000001100100001011001100011),
+])
+def test_encode_accepts_r_register_names(line, word):
+    assert encode(line) == word
+    assert encode(line.replace("r", "x")) == word
+
+
+def test_encode_r_names_match_x_names():
+    for i in range(32):
+        assert encode(f"addi r{i} r{31 - i} 7") == encode(f"addi x{i} x{31 - i} 7")
+    with pytest.raises(ValueError, match="Invalid register 'r32'"):
+        encode("add r32,r1,r2")
+
+
+# ----- streaming -----
+
+class NullWriter:
+    def write(self, text):
+        pass
+
+
+def test_assemble_file_path_memory_is_bounded(tmp_path):
+    src = tmp_path / "big.s"
+    with open(src, "w") as f:
+        f.write("top:\n")
+        for i in range(100_000):
+            f.write(f"addi x{i % 31 + 1} x0 {i % 2000}\n")
+        f.write("end: jal x0,top\n")
+    symbols = {}
+    tracemalloc.start()
+    try:
+        assemble_file(str(src), NullWriter(), symbols=symbols)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert symbols == {"top": 0, "end": 400_000}
+    # Buffering the 100k-instruction program would take tens of MiB
+    assert peak < 2 << 20
+
+
+@pytest.mark.parametrize("fmt", ["text", "raw"])
+def test_assemble_file_path_matches_buffered(tmp_path, monkeypatch, fmt):
+    # Use a process pool even on a single CPU
+    monkeypatch.setattr(assembler_project, "usable_cpus", lambda: 2)
+    src = tmp_path / "prog.s"
+    src.write_text("".join(SOURCE))
+    if fmt == "raw":
+        expected = assemble_image(SOURCE)
+    else:
+        expected = "".join(f"{word:032b}\n" for word in assemble_lines(SOURCE))
+    for jobs in (1, 2):
+        for source in (str(src), iter(SOURCE)):
+            out = io.BytesIO() if fmt == "raw" else io.StringIO()
+            assemble_file(source, out, jobs=jobs, chunk_lines=700, fmt=fmt)
+            assert out.getvalue() == expected
+
+
+# ----- assembly cache -----
+
+def test_cache_matches_assembler(tmp_path):
+    cache = AssemblyCache(str(tmp_path))
+    symbols = {}
+    assert list(cache.assemble(SOURCE, symbols)) == list(assemble_lines(SOURCE))
+    assert symbols == {"start": 40, "top": 48}
+    assert list(AssemblyCache(str(tmp_path)).assemble(SOURCE)) == list(assemble_lines(SOURCE))
+
+
+def test_cache_reencodes_only_edited_blocks(tmp_path):
+    AssemblyCache(str(tmp_path)).assemble(SOURCE)
+    for edited in (SOURCE[:2500] + ["sub x5,x6,x7\n"] + SOURCE[2501:],
+                   SOURCE[:2500] + ["sub x5,x6,x7\n"] + SOURCE[2500:],
+                   SOURCE[:2500] + SOURCE[2501:],
+                   SOURCE[:300] + ["sub x5,x6,x7\n"] + SOURCE[300:]):
+        cache = AssemblyCache(str(tmp_path))
+        assert list(cache.assemble(edited)) == list(assemble_lines(edited))
+        assert cache.misses == 1
+        # The edited block, and the one branch whose label moved
+        assert cache.line_misses < 2 * 1024
+        assert cache.line_hits > len(edited) - 2 * 1024
+
+
+def test_cache_blocks_resync_after_insert():
+    blocks = split_blocks(SOURCE)
+    shifted = split_blocks(SOURCE[:100] + ["add x1,x1,x1\n"] + SOURCE[100:])
+    after = {(a - 1, b - 1) for a, b in shifted if a > 101}
+    assert len(after & set(blocks)) >= len(after) - 1
+
+
+def test_cache_failed_assembly_is_not_a_miss(tmp_path):
+    cache = AssemblyCache(str(tmp_path))
+    with pytest.raises(ValueError, match="line 3: Undefined label 'nowhere'"):
+        cache.assemble(["add x1,x2,x3\n", "\n", "beq x1,x2,nowhere\n"])
+    assert cache.misses == 0
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".asm")]
+
+
+def test_cache_writes_memo_once_per_assemble(tmp_path, monkeypatch):
+    cache = AssemblyCache(str(tmp_path))
+    writes = []
+    write = cache.write
+    monkeypatch.setattr(cache, "write", lambda path, obj: (writes.append(path), write(path, obj)))
+    cache.assemble(SOURCE)
+    assert [os.path.basename(path) for path in writes].count(AssemblyCache.MEMO_FILE) == 1
+
+
+def test_cache_memo_counts_towards_size_cap(tmp_path):
+    cap = 64 << 10
+    cache = AssemblyCache(str(tmp_path), max_bytes=cap)
+    for i in range(6):
+        source = [f"addi x1 x0 {i}\n"] + SOURCE
+        assert list(cache.assemble(source)) == list(assemble_lines(source))
+        assert cache.stats()["bytes"] <= cap
+    assert cache.evictions > 0
+
+
+def test_cache_reports_duplicate_labels_across_blocks(tmp_path):
+    source = ["dup: add x1,x2,x3\n"] + SOURCE[11:3000] + ["dup: add x1,x2,x3\n"]
+    with pytest.raises(ValueError, match=f"line {len(source)}: Duplicate label 'dup'"):
+        AssemblyCache(str(tmp_path)).assemble(source)
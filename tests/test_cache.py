@@ -0,0 +1,92 @@
+import pytest
+
+from assembler_project import assemble_image
+from cache import Cache, CacheModel, parse_cache
+from simulator import Simulator
+
+# 64 bytes, 2 ways of 16-byte lines: 2 sets, so lines 32 bytes apart share
+# a set. A, B and C all map to set 0.
+A, B, C = 0x100, 0x120, 0x140
+
+
+def small_cache(**options):
+    return Cache(size=64, assoc=2, line=16, **options)
+
+
+def misses(cache, pattern):
+    return [not cache.access(addr, write, pc=0) for addr, write in pattern]
+
+
+@pytest.mark.parametrize('policy, expected', [
+    # A stays resident as the most recently used line, so C evicts B
+    ('lru', [True, True, False, True, False, True]),
+    # A is still the oldest line when C arrives, and goes first
+    ('fifo', [True, True, False, True, True, True]),
+])
+def test_conflict_misses_in_a_two_way_set(policy, expected):
+    cache = small_cache(policy=policy)
+    assert misses(cache, [(A, False), (B, False), (A, False), (C, False), (A, False), (B, False)]) == expected
+    report = cache.report()
+    assert (report['accesses'], report['misses']) == (6, sum(expected))
+    assert report['miss_lines'][0] == {'addr': B if policy == 'lru' else A, 'misses': 2}
+
+
+def test_cyclic_conflicts_miss_every_time():
+    # Three lines taking turns in a two-way set: LRU always evicts the next one needed
+    cache = small_cache()
+    assert all(misses(cache, [(addr, False) for addr in (A, B, C) * 3]))
+
+
+def test_write_back_allocates_and_writes_back_dirty_lines():
+    cache = small_cache(write='back')
+    # C evicts dirty A, then A evicts dirty B
+    assert misses(cache, [(A, True), (B, True), (C, True), (A, False)]) == [True] * 4
+    report = cache.report()
+    assert (report['writes'], report['misses'], report['writebacks'], report['memory_writes']) == (3, 4, 2, 0)
+
+
+def test_write_through_stores_do_not_allocate():
+    cache = small_cache(write='through')
+    # The writes leave the set empty, so A and B are read misses that both fit
+    assert misses(cache, [(A, True), (B, True), (C, True), (A, False), (B, False), (A, False)]) == \
+        [True, True, True, True, True, False]
+    report = cache.report()
+    assert (report['writes'], report['misses'], report['writebacks'], report['memory_writes']) == (3, 5, 0, 3)
+
+
+def test_consecutive_accesses_to_a_line_hit():
+    cache = small_cache()
+    assert misses(cache, [(A, False), (A + 4, True), (A + 12, False)]) == [True, False, False]
+    assert cache.report()['writebacks'] == 0
+    assert misses(cache, [(B, False), (C, False)]) == [True, True]
+    # A was written, so evicting it (by C) wrote it back
+    assert cache.writebacks == 1
+
+
+def test_data_cache_attributes_misses_to_pcs():
+    source = [
+        "addi x5 x0 256",   # A
+        "lw x1 0(x5)",      # A: miss
+        "lw x2 32(x5)",     # B: miss
+        "lw x1 0(x5)",      # A: hit
+        "lw x3 64(x5)",     # C: miss, evicts B
+        "lw x1 0(x5)",      # A: hit
+        "lw x2 32(x5)",     # B: miss, evicts C
+    ]
+    sim = Simulator(engine='translate', trace_policy='final')
+    sim.load(assemble_image(source), fmt='raw')
+    model = CacheModel(icache=Cache(size=64, assoc=1, line=16), dcache=small_cache())
+    model.attach(sim)
+    sim.run(max=100)
+    report = model.report()
+    assert report['dcache']['accesses'] == 6
+    assert model.dcache.miss_pcs == {4: 1, 8: 1, 16: 1, 24: 1}
+    # Seven fetches over two 16-byte lines of code
+    assert (report['icache']['accesses'], report['icache']['misses']) == (7, 2)
+
+
+@pytest.mark.parametrize('spec', ['size=100', 'assoc=3', 'size=16,assoc=2,line=16',
+                                  'policy=mru', 'write=around', 'ways=2'])
+def test_invalid_cache_specs(spec):
+    with pytest.raises(ValueError):
+        parse_cache(spec)
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from assembler_project import assemble_image, encode
+from lockstep import LockstepSimulator
+from simulator import Simulator
+
+# x1 = 0x10000, the start of the data segment, without lui
+DATA_BASE = ["addi x1 x0 1024"] + ["add x1 x1 x1"] * 6
+
+# Sum the first (DATA[0] & 15) words after DATA[0]; store it after them
+SUM = DATA_BASE + [
+    "lw x2 0(x1)",
+    "addi x3 x0 15",
+    "and x2 x2 x3",
+    "addi x4 x0 0",
+    "addi x5 x1 4",
+    "loop:",
+    "beq x2 x0 done",
+    "lw x6 0(x5)",
+    "add x4 x4 x6",
+    "addi x5 x5 4",
+    "addi x2 x2 -1",
+    "beq x0 x0 loop",
+    "done:",
+    "sw x4 0(x5)",
+    "beq x0 x0 0",
+]
+
+# Signed maximum of DATA[0..7] into DATA[8]; its "bne x5 x2 next" is
+# turned into a blt, which the assembler does not take
+MAX = DATA_BASE + [
+    "lw x2 0(x1)",
+    "addi x3 x1 4",
+    "addi x4 x1 32",
+    "next:",
+    "beq x3 x4 end",
+    "lw x5 0(x3)",
+    "addi x3 x3 4",
+    "bne x5 x2 next",
+    "add x2 x5 x0",
+    "beq x0 x0 next",
+    "end:",
+    "sw x2 0(x4)",
+    "sub x6 x0 x2",
+    "slt x7 x6 x2",
+    "jalr x8 x0 80",  # To the next instruction, at 80
+    "or x9 x2 x7",
+]
+
+# Copy DATA[0] over the addi below it, so each lane runs the instruction
+# its data holds
+PATCH = DATA_BASE + [
+    "lw x2 0(x1)",
+    "sw x2 40(x0)",
+    "addi x9 x0 1",
+    "addi x3 x0 5",
+    "addi x3 x3 1",
+]
+
+
+def blt_image(source):
+    at = 4 * [line for line in source if not line.endswith(':')].index("bne x5 x2 next")
+    words = bytearray(assemble_image(source))
+    word = int.from_bytes(words[at:at + 4], 'little')
+    word ^= (0b001 ^ 0b100) << 12  # funct3 of bne to that of blt
+    words[at:at + 4] = word.to_bytes(4, 'little')
+    return bytes(words)
+
+
+def random_images(rng, lanes, words, first=None):
+    data = np.zeros((lanes, 4 * words), dtype=np.uint8)
+    for lane in range(lanes):
+        vals = [rng.randrange(1 << 32) for _ in range(words)]
+        if first is not None:
+            vals[0] = first(lane)
+        data[lane] = np.frombuffer(np.array(vals, dtype='<u4').tobytes(), dtype=np.uint8)
+    return data
+
+
+@pytest.mark.parametrize('prog, first', [
+    (assemble_image(SUM), None),
+    (blt_image(MAX), None),
+    (assemble_image(PATCH), lambda lane: encode(f"addi x3 x0 {lane * 100 - 300}")),
+])
+def test_lockstep_lanes_match_scalar_runs(prog, first):
+    rng = random.Random(len(prog))
+    data = random_images(rng, 12, 20, first)
+    lockstep = LockstepSimulator(prog, data, fmt='raw')
+    lockstep.run(max=300)
+    for lane in range(lockstep.lanes):
+        sim = Simulator(trace_policy='final')
+        sim.load(prog, fmt='raw')
+        sim.memory.write_bytes(sim.DATA_START, data[lane].tobytes())
+        sim.run(max=300)
+        assert lockstep.lane_regs(lane) == sim.regs[:32]
+        assert int(lockstep.pc[lane]) == sim.pc
+        assert int(lockstep.count[lane]) == sim.count
+        assert lockstep.lane_output(lane) == sim.output
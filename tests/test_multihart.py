@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import signal
+
+import pytest
+
+import multihart
+from assembler_project import assemble_image
+from multihart import MultiHart, run_processes
+
+SOURCE = [
+    "addi x5 x0 20",
+    "loop:",
+    "addi x5 x5 -1",
+    "bne x5 x0 loop",
+]
+
+# Each hart adds 1 to the shared word at 256 three times, with a load, an
+# add and a store that other harts can come between, and stores its hart
+# number (a0) at 260 after each add: 21 instructions per hart
+SHARED = [
+    "addi x5 x0 256",
+    "addi x6 x0 3",
+    "loop:",
+    "lw x7 0(x5)",
+    "addi x7 x7 1",
+    "sw x7 0(x5)",
+    "sw x10 4(x5)",
+    "addi x6 x6 -1",
+    "bne x6 x0 loop",
+    "beq x0 x0 0",
+]
+
+
+def test_run_processes_reports_every_hart(tmp_path):
+    outputs = [str(tmp_path / f'out.{hart}') for hart in range(3)]
+    reports = run_processes(assemble_image(SOURCE), outputs, fmt='raw', max_instr=100)
+    assert [(hart, count, error) for hart, count, _, error in reports] == [
+        (hart, 41, None) for hart in range(3)]
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='the crash is injected by patching the module before forking')
+def test_run_processes_reports_killed_hart_as_failed(tmp_path, monkeypatch):
+    start_hart = multihart.start_hart
+
+    def crashing_start_hart(sim, hart, harts):
+        if hart == 1:
+            os.kill(os.getpid(), signal.SIGKILL)
+        start_hart(sim, hart, harts)
+
+    # Hart processes are forked, so they inherit the patched module
+    monkeypatch.setattr(multihart, 'start_hart', crashing_start_hart)
+    outputs = [str(tmp_path / f'out.{hart}') for hart in range(3)]
+    reports = run_processes(assemble_image(SOURCE), outputs, fmt='raw', max_instr=100)
+    assert reports[1] == (1, 0, 0.0, f'worker process died (exit code {-signal.SIGKILL})')
+    # The others cannot dump the final memory without hart 1
+    assert [error for _, _, _, error in reports[::2]] == [
+        'another hart failed before the final memory dump'] * 2
+
+
+@pytest.mark.parametrize('engine', ['interp', 'translate'])
+@pytest.mark.parametrize('quantum, total, loaded', [
+    # Lockstep: every load sees the word before either hart's store
+    (1, 3, ([0, 1, 2], [0, 1, 2])),
+    # Both harts load before either stores in the first and third turns
+    (4, 4, ([0, 1, 3], [0, 2, 3])),
+    # Hart 0 runs to its halt within its first turn
+    (100, 6, ([0, 1, 2], [3, 4, 5])),
+])
+def test_round_robin_interleaving_is_set_by_the_quantum(engine, quantum, total, loaded):
+    harts = MultiHart(assemble_image(SHARED), harts=2, fmt='raw', quantum=quantum, engine=engine)
+    harts.run(max=1000)
+    assert [sim.count for sim in harts.harts] == [21, 21]
+    assert all(sim.halted for sim in harts.harts)
+    # Hart 1 always makes the last store of its number
+    assert (harts.memory.read(256), harts.memory.read(260)) == (total, 1)
+
+    for hart, sim in enumerate(harts.harts):
+        steps = [line.split() for line in sim.output if ' ' in line]
+        assert len(steps) == 21
+        assert all(int(step[11], 2) == hart for step in steps)  # a0
+        # x7 in the state after each load (whose next PC is 12)
+        assert [int(step[8], 2) for step in steps if int(step[0], 2) == 12] == loaded[hart]
+        # The final memory dump follows the trace: code, then the stack
+        dump = [line for line in sim.output if ' ' not in line]
+        assert [int(word, 2) for word in dump[64:66]] == [total, 1]
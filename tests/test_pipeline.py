@@ -0,0 +1,105 @@
+import pytest
+
+from assembler_project import assemble_image
+from pipeline import PipelineModel
+from simulator import Simulator
+
+# A load and the instruction right after it, which uses the loaded value
+LOAD_USE = [
+    "lw x1 0(x0)",
+    "add x2 x1 x1",
+]
+
+# An ALU result used by the next instruction
+ALU_USE = [
+    "addi x1 x0 1",
+    "add x2 x1 x1",
+]
+
+# An ALU result stored by the next instruction, which needs it only in MEM
+STORE_DATA = [
+    "addi x5 x0 256",
+    "addi x1 x0 1",
+    "sw x1 0(x5)",
+]
+
+# The loop branch is taken 4 times, then falls through
+LOOP = [
+    "addi x1 x0 5",
+    "addi x2 x0 0",
+    "loop:",
+    "addi x2 x2 3",
+    "addi x1 x1 -1",
+    "bne x1 x0 loop",
+]
+
+
+def timed(source, **options):
+    sim = Simulator(trace_policy='final')
+    sim.load(assemble_image(source), fmt='raw')
+    model = PipelineModel(**options)
+    model.attach(sim)
+    sim.run(max=1000)
+    return model
+
+
+# (forwarding, load-use stalls, other data stalls, cycles). Without stalls
+# the first instruction leaves WB in cycle 5 and each later one a cycle after
+@pytest.mark.parametrize('source, forwarding, load_use, data, cycles', [
+    # The load's result reaches EX two cycles after its own EX, however
+    # it is forwarded, and three cycles after without forwarding
+    (LOAD_USE, 'full', 1, 0, 7),
+    (LOAD_USE, 'mem', 1, 0, 7),
+    (LOAD_USE, 'none', 2, 0, 8),
+    # ALU results: one cycle after EX with EX/MEM forwarding, two from
+    # MEM/WB, three through the register file
+    (ALU_USE, 'full', 0, 0, 6),
+    (ALU_USE, 'mem', 0, 1, 7),
+    (ALU_USE, 'none', 0, 2, 8),
+    # Store data is forwarded to MEM only with full forwarding
+    (STORE_DATA, 'full', 0, 0, 7),
+    (STORE_DATA, 'mem', 0, 1, 8),
+    (STORE_DATA, 'none', 0, 2, 9),
+])
+def test_data_hazard_stalls_per_forwarding_mode(source, forwarding, load_use, data, cycles):
+    model = timed(source, forwarding=forwarding)
+    report = model.report()
+    assert report['instructions'] == len(source)
+    assert report['stalls'] == {'load_use': load_use, 'data': data, 'branch': 0, 'jump': 0}
+    assert report['cycles'] == cycles
+    assert report['cpi'] == pytest.approx(cycles / len(source))
+
+
+def test_load_use_stall_is_attributed_to_the_consumer():
+    report = timed(LOAD_USE, forwarding='none').report()
+    assert report['pcs'] == [{'pc': 4, 'label': '0x00000004', 'total': 2,
+                              'load_use': 2, 'data': 0, 'branch': 0, 'jump': 0}]
+
+
+# 17 instructions leave WB by cycle 21 without stalls; each misprediction
+# of the loop branch costs 2 cycles
+@pytest.mark.parametrize('predictor, mispredicted', [
+    ('not-taken', 4),  # Every taken iteration
+    ('btfn', 1),       # The final fall-through of the backward branch
+    ('2bit', 2),       # The first iteration (weakly not taken) and the last
+])
+def test_branch_penalties_per_predictor(predictor, mispredicted):
+    report = timed(LOOP, predictor=predictor).report()
+    assert (report['instructions'], report['branches']) == (17, 5)
+    assert report['mispredicted'] == mispredicted
+    assert report['stalls'] == {'load_use': 0, 'data': 0, 'branch': 2 * mispredicted, 'jump': 0}
+    assert report['cycles'] == 21 + 2 * mispredicted
+
+
+def test_jalr_always_pays_the_branch_penalty():
+    # The jump skips the last instruction, onto the zero word after it
+    report = timed(["addi x1 x0 1", "jalr x0 x0 12", "addi x1 x0 2"], branch_penalty=3).report()
+    assert report['instructions'] == 2
+    assert report['stalls']['jump'] == 3
+    assert report['cycles'] == 6 + 3
+
+
+@pytest.mark.parametrize('options', [{'predictor': 'oracle'}, {'forwarding': 'ex'}])
+def test_invalid_options(options):
+    with pytest.raises(ValueError):
+        PipelineModel(**options)
@@ -0,0 +1,58 @@
+import pytest
+
+from assembler_project import assemble_image
+from profiler import Profiler, parse_cycle_costs
+from simulator import Simulator
+
+# 2 + 5 * 3 = 17 instructions; the loop branch is taken 4 times and falls
+# through once, onto the zero word after the program, which stops the run
+LOOP = [
+    "addi x1 x0 5",
+    "addi x2 x0 0",
+    "loop:",
+    "addi x2 x2 3",
+    "addi x1 x1 -1",
+    "bne x1 x0 loop",
+]
+
+
+def profile(source, engine='interp', costs=None):
+    sim = Simulator(engine=engine, trace_policy='final')
+    sim.load(assemble_image(source), fmt='raw')
+    profiler = Profiler(costs)
+    profiler.attach(sim)
+    sim.run(max=1000)
+    return profiler
+
+
+@pytest.mark.parametrize('engine', ['interp', 'translate'])
+def test_profile_counts_instructions_and_branch_outcomes(engine):
+    profiler = profile(LOOP, engine)
+    assert profiler.instructions() == 17
+    assert profiler.by_instruction() == {'addi': 12, 'bne': 5}
+    assert profiler.by_opcode() == {'0x13': 12, '0x63': 5}
+    assert profiler.branches() == {16: (4, 1)}
+    # One cycle each, plus 2 for each taken branch
+    assert profiler.cycles() == 17 + 2 * 4
+    assert profiler.by_pc() == {0: (1, 1), 4: (1, 1), 8: (5, 5), 12: (5, 5), 16: (5, 13)}
+
+
+def test_profile_cycle_costs_override_defaults():
+    profiler = profile(LOOP, costs=parse_cycle_costs('addi=2,taken=5'))
+    assert profiler.cycles() == 12 * 2 + 5 + 5 * 4
+    report = profiler.report()
+    assert report['cpi'] == pytest.approx(49 / 17)
+    assert report['branches'] == [{'pc': 16, 'label': '0x00000010', 'taken': 4, 'not_taken': 1}]
+
+
+def test_profile_labels_pcs_from_symbols():
+    profiler = profile(LOOP)
+    profiler.symbols = {'loop': 8}
+    assert [entry['label'] for entry in profiler.report()['pcs']] == [
+        '0x00000000', '0x00000004', 'loop', 'loop+0x4', 'loop+0x8']
+
+
+@pytest.mark.parametrize('spec', ['addi', 'nosuch=1', 'lw=x', 'lw=-1'])
+def test_invalid_cycle_costs(spec):
+    with pytest.raises(ValueError):
+        parse_cycle_costs(spec)
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+from sim_server import Client, Connection, SimulationServer, make_server
+
+HALT = ['00000000000000000000000001100011']  # beq x0,x0,0
+SPIN = 'spin: addi x1, x1, 1\nbeq x0, x0, spin\n'
+
+
+@pytest.fixture
+def server(tmp_path):
+    simulation = SimulationServer(workers=1, timeout=1.0, max_instr_limit=10 ** 8)
+    simulation.start()
+    path = str(tmp_path / 'sim.sock')
+    server = make_server(simulation, path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    simulation.stop()
+
+
+def test_server_rejects_max_instr_over_limit(server):
+    with Client(server) as client:
+        with pytest.raises(ValueError, match='over the server limit of 100000000'):
+            client.simulate(HALT, max_instr=10 ** 8 + 1)
+
+
+def test_server_times_out_long_job_and_replaces_worker(server):
+    with Client(server) as client:
+        start = time.perf_counter()
+        with pytest.raises(ValueError, match='timed out after 1 s'):
+            client.simulate(SPIN, 'asm', max_instr=10 ** 8, trace='final')
+        assert time.perf_counter() - start < 10
+        output, summary = client.simulate(HALT, max_instr=5, trace='final', dump='none')
+        assert summary['halted']
+
+
+class BlockingWriter:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.release.wait()
+
+    def flush(self):
+        pass
+
+
+def test_connection_write_does_not_hold_up_job_accounting():
+    wfile = BlockingWriter()
+    client = Connection(wfile)
+    client.begin()
+    writer = threading.Thread(target=client.send, args=({'id': 1, 'data': 'x'},))
+    writer.start()
+    try:
+        done = threading.Thread(target=client.end)
+        done.start()
+        done.join(timeout=2)
+        assert not done.is_alive()
+    finally:
+        wfile.release.set()
+        writer.join()
@@ -0,0 +1,220 @@
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from assembler_project import assemble_image
+import simulator
+from simulator import PAGE_BITS, Simulator, batch, image_digest, parse_memory_map
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOOP = [
+    "addi x1 x0 5",
+    "addi x2 x0 0",
+    "loop:",
+    "addi x2 x2 3",
+    "addi x1 x1 -1",
+    "bne x1 x0 loop",
+]
+
+
+def run_source(source, max_instr=100, **options):
+    sim = Simulator(**options)
+    sim.load(assemble_image(source), fmt='raw')
+    sim.run(max=max_instr)
+    return sim
+
+
+# ----- memory map -----
+
+def test_memory_map_rejects_reversed_segment():
+    with pytest.raises(ValueError, match="'data' has invalid bounds"):
+        parse_memory_map('code=0x0:0xff,data=0x80:0x1')
+
+
+def test_memory_map_rejects_overlapping_segments():
+    with pytest.raises(ValueError, match="'code' and 'stack' overlap"):
+        parse_memory_map('code=0x0:0xff,stack=0x80:0x17f')
+
+
+def test_memory_map_rejects_duplicate_segment():
+    with pytest.raises(ValueError, match="defined twice"):
+        parse_memory_map('code=0x0:0xff,data=0x100:0x1ff,data=0x200:0x2ff')
+
+
+def test_memory_map_accepts_adjacent_segments():
+    assert parse_memory_map('code=0x0:0xff,stack=0x100:0x17f') == (
+        ('code', 0x0, 0xff), ('stack', 0x100, 0x17f))
+
+
+def test_cli_reports_invalid_memory_map(tmp_path):
+    prog = tmp_path / 'prog.txt'
+    prog.write_text('00000000010100000000000010010011\n')
+    result = subprocess.run([sys.executable, 'simulator.py', str(prog), str(tmp_path / 'out.txt'),
+                             '--memory-map', 'code=0x0:0xff,data=0x80:0x1'],
+                            capture_output=True, text=True, cwd=REPO)
+    assert result.returncode == 2
+    assert 'error: memory segment' in result.stderr
+    assert 'Traceback' not in result.stderr
+
+
+@pytest.mark.parametrize('engine', ['interp', 'translate'])
+def test_relocated_code_segment(engine):
+    memory_map = parse_memory_map('code=0x1000:0x10ff,stack=0x100:0x17f,data=0x10000:0x1007f')
+    sim = run_source(LOOP, engine=engine, memory_map=memory_map)
+    assert (sim.regs[1], sim.regs[2]) == (0, 15)
+    assert sim.memory.read(0x1000) == int.from_bytes(assemble_image(LOOP)[:4], 'little')
+    assert sim.memory.read(0x0) == 0
+
+    # The same run as from address 0, apart from the PC
+    reference = run_source(LOOP, engine=engine)
+    assert sim.count == reference.count
+    assert [line[33:] for line in sim.output if len(line) > 32] == \
+        [line[33:] for line in reference.output if len(line) > 32]
+    assert sim.output[0][:32] == format(0x1004, '032b')
+
+
+@pytest.mark.parametrize('fmt', ['binary', 'hex'])
+def test_relocated_code_segment_text_formats(fmt):
+    memory_map = (('code', 0x2000, 0x20ff), ('data', 0x10000, 0x1007f))
+    words = [int.from_bytes(assemble_image(LOOP)[i:i + 4], 'little') for i in range(0, 20, 4)]
+    prog = [format(w, '032b' if fmt == 'binary' else '08x') for w in words]
+    sim = Simulator(memory_map=memory_map)
+    sim.load(prog, fmt=fmt)
+    assert sim.pc == 0x2000
+    assert [sim.memory.read(0x2000 + 4 * i) for i in range(5)] == words
+    sim.run(max=100)
+    assert (sim.regs[1], sim.regs[2]) == (0, 15)
+
+
+# ----- engines -----
+
+# Never halts: loads, stores, a register rewritten with its own value, a
+# taken and a never-taken branch, and a linking jump back to the loop
+MIXED = [
+    "addi x1 x0 256",
+    "addi x2 x0 1",
+    "loop:",
+    "add x3 x3 x2",
+    "sw x3 0(x1)",
+    "lw x4 0(x1)",
+    "addi x4 x4 0",
+    "slt x6 x4 x3",
+    "sub x7 x0 x3",
+    "and x8 x7 x3",
+    "beq x3 x0 loop",
+    "or x9 x8 x2",
+    "bne x9 x0 next",
+    "addi x5 x5 1",
+    "next:",
+    "jalr x10 x0 8",
+]
+
+# Overwrites the first instruction of the loop, already executed and
+# translated, with the one at 32, so later iterations add 100 instead of 1
+SELF_MODIFYING = [
+    "addi x1 x0 3",
+    "bne x1 x1 0",  # Never taken; the loop's block starts after it
+    "loop:",
+    "addi x2 x2 1",
+    "lw x5 32(x0)",
+    "sw x5 8(x0)",
+    "addi x1 x1 -1",
+    "bne x1 x0 loop",
+    "beq x0 x0 0",
+    "addi x2 x2 100",
+]
+
+
+@pytest.mark.parametrize('trace_format', ['text', 'binary'])
+@pytest.mark.parametrize('policy', ['every', 'every:3', 'change:x3,x4', 'branches', 'final'])
+@pytest.mark.parametrize('source, max_instr', [(MIXED, 9001), (SELF_MODIFYING, 100)],
+                         ids=['mixed', 'self-modifying'])
+def test_translate_engine_traces_like_interpreter(tmp_path, monkeypatch, source, max_instr,
+                                                  policy, trace_format):
+    from simulator import simulate_source
+    # Small binary trace blocks, so runs cross several sync records
+    monkeypatch.setattr(simulator, 'TRACE_SYNC_BYTES', 512)
+    traces = {}
+    for engine in ('interp', 'translate'):
+        path = tmp_path / engine
+        sim = simulate_source(source, str(path), max_instr=max_instr, engine=engine,
+                              trace_policy=policy, trace_format=trace_format)
+        traces[engine] = path.read_bytes(), sim.count, sim.regs
+    assert traces['translate'] == traces['interp']
+    if source is SELF_MODIFYING:
+        assert traces['interp'][2][2] == 201
+
+
+# ----- checkpoints -----
+
+def test_resume_from_own_checkpoint(tmp_path):
+    from simulator import simulate
+    image = assemble_image(LOOP)
+    ckpt = str(tmp_path / 'ckpt')
+    full = simulate(image, str(tmp_path / 'full.txt'), fmt='raw', max_instr=100,
+                    checkpoint_every=4, checkpoint_dir=ckpt)
+    resumed = simulate(image, str(tmp_path / 'resumed.txt'), fmt='raw', max_instr=100, resume=ckpt)
+    assert resumed.count == full.count
+    assert resumed.regs == full.regs
+
+
+def test_resume_rejects_checkpoint_of_another_program(tmp_path):
+    from simulator import simulate
+    ckpt = str(tmp_path / 'ckpt')
+    simulate(assemble_image(LOOP), str(tmp_path / 'a.txt'), fmt='raw', max_instr=100,
+             checkpoint_every=4, checkpoint_dir=ckpt)
+    other = assemble_image(["addi x1 x0 100", "addi x2 x0 7", "addi x3 x0 8", "addi x4 x0 9"])
+    with pytest.raises(ValueError, match='different program'):
+        simulate(other, str(tmp_path / 'b.txt'), fmt='raw', max_instr=100, resume=ckpt)
+
+
+def test_snapshot_file_keeps_program_digest(tmp_path):
+    import io
+    from simulator import load_snapshot, save_snapshot
+    sim = run_source(LOOP, max_instr=3)
+    f = io.BytesIO()
+    save_snapshot(sim.snapshot(), f)
+    f.seek(0)
+    assert load_snapshot(f).program == sim.program
+
+
+
+def test_program_digest_of_memory_with_mapped_pages():
+    sim = Simulator()
+    sim.load(assemble_image(LOOP), fmt='raw')
+    digest = image_digest(sim.memory)
+    # As multihart.py does: pages backed by a shared buffer, as memoryviews
+    pages = sorted(sim.memory.pages)
+    sim.memory.map_buffer(bytearray(len(pages) << PAGE_BITS), pages)
+    assert image_digest(sim.memory) == digest
+
+# ----- batch -----
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='the crash is injected by patching the module before forking')
+def test_batch_reports_killed_worker_as_that_jobs_failure(tmp_path, monkeypatch):
+    read_program = simulator.read_program
+
+    def crashing_read_program(path, fmt):
+        if path.endswith('crash.txt'):
+            os.kill(os.getpid(), signal.SIGKILL)
+        return read_program(path, fmt)
+
+    # Workers are forked, so they inherit the patched module
+    monkeypatch.setattr(simulator, 'read_program', crashing_read_program)
+    prog = tmp_path / 'prog.txt'
+    prog.write_text('00000000010100000000000010010011\n')
+    (tmp_path / 'crash.txt').write_text(prog.read_text())
+    jobs = [(str(prog), str(tmp_path / f'out{i}.txt'), 'binary', 10) for i in range(6)]
+    jobs.insert(2, (str(tmp_path / 'crash.txt'), str(tmp_path / 'crash.out'), 'binary', 10))
+    lines = []
+    assert batch(jobs, workers=2, report=lines.append) == 1
+    assert sum(line.startswith('ok ') for line in lines) == 6
+    failed = [line for line in lines if line.startswith('FAILED')]
+    assert len(failed) == 1 and failed[0].endswith('crash.txt: worker process died')
+    assert all((tmp_path / f'out{i}.txt').exists() for i in range(6))
@@ -0,0 +1,139 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+import simulator
+from assembler_project import assemble_image
+from simulator import BinaryTraceWriter, Simulator, TraceWriter
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# data/straight_line_trace.txt is what the original simulator, which built
+# every line in a list and wrote them out at the end, produced for this
+# program: one line per step, then the full memory dump
+STRAIGHT_LINE = [
+    "addi x1 x0 5",
+    "addi x2 x0 256",
+    "add x3 x1 x1",
+    "sw x3 4(x2)",
+    "lw x4 4(x2)",
+    "bne x4 x0 4",
+    "addi x6 x0 9",
+    "sub x7 x3 x1",
+    "slt x8 x1 x3",
+    "beq x0 x0 0",
+]
+
+# Never halts: stores a counter into each stack word in turn, round and round
+LOOP = [
+    "addi x5 x0 256",
+    "addi x6 x0 384",
+    "addi x1 x5 0",
+    "loop:",
+    "addi x2 x2 1",
+    "sw x2 0(x1)",
+    "addi x1 x1 4",
+    "bne x1 x6 loop",
+    "addi x1 x5 0",
+    "bne x2 x0 loop",
+]
+
+
+def known_good_trace():
+    with open(os.path.join(DATA, 'straight_line_trace.txt'), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('engine', ['interp', 'translate'])
+@pytest.mark.parametrize('chunk_lines', [1, 7, 1024])
+def test_text_trace_matches_known_good_output(tmp_path, engine, chunk_lines):
+    path = tmp_path / 'out.txt'
+    with TraceWriter(str(path), chunk_lines=chunk_lines) as trace:
+        sim = Simulator(engine=engine, trace=trace)
+        sim.load(assemble_image(STRAIGHT_LINE), fmt='raw')
+        sim.run()
+    assert path.read_bytes() == known_good_trace()
+
+
+def test_cli_text_trace_matches_known_good_output(tmp_path):
+    prog = tmp_path / 'prog.txt'
+    image = assemble_image(STRAIGHT_LINE)
+    prog.write_text(''.join(format(int.from_bytes(image[i:i + 4], 'little'), '032b') + '\n'
+                            for i in range(0, len(image), 4)))
+    subprocess.run([sys.executable, 'simulator.py', str(prog), str(tmp_path / 'out.txt')],
+                   check=True, cwd=REPO)
+    assert (tmp_path / 'out.txt').read_bytes() == known_good_trace()
+
+
+def test_trace_writer_hands_target_whole_lines():
+    chunks = []
+    with TraceWriter(chunks.append, chunk_lines=3) as trace:
+        for i in range(7):
+            trace.append(str(i))
+        trace.extend(['a', 'b'])
+        trace.append_text('c\nd\n')
+    assert chunks == ['0\n1\n2\n', '3\n4\n5\n', '6\na\nb\n', 'c\nd\n']
+
+
+def run_cli(tmp_path, name, *options):
+    source = tmp_path / 'loop.s'
+    source.write_text('\n'.join(LOOP) + '\n')
+    path = str(tmp_path / name)
+    subprocess.run([sys.executable, 'simulator.py', 'run', str(source), path, *options],
+                   check=True, cwd=REPO)
+    return path
+
+
+def convert_cli(tmp_path, path):
+    out = str(tmp_path / 'converted.txt')
+    subprocess.run([sys.executable, 'trace_convert.py', path, out], check=True, cwd=REPO)
+    with open(out, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('options', [
+    ['--trace', 'every'],
+    ['--trace', 'every:5', '--engine', 'translate'],
+    ['--trace', 'branches', '--dump', 'changed', '--dump-every', '40'],
+    ['--trace', 'final', '--dump', 'none'],
+], ids=['every', 'every-5', 'branches-changed', 'final'])
+def test_cli_binary_trace_converts_to_text_trace(tmp_path, options):
+    options += ['--max-instr', '300']
+    text = run_cli(tmp_path, 'out.txt', *options)
+    binary = run_cli(tmp_path, 'out.bin', '--trace-format', 'binary', *options)
+    with open(text, 'rb') as f:
+        assert convert_cli(tmp_path, binary) == f.read()
+
+
+def test_cli_binary_trace_over_several_sync_blocks_converts_to_text_trace(tmp_path):
+    # Full dumps of a 256 KiB data segment take the trace past two sync
+    # records at the default block size
+    options = ['--memory-map', 'code=0x0:0xff,stack=0x100:0x17f,data=0x10000:0x4ffff',
+               '--dump-every', '30', '--max-instr', '300']
+    text = run_cli(tmp_path, 'out.txt', *options)
+    binary = run_cli(tmp_path, 'out.bin', '--trace-format', 'binary', *options)
+    with open(binary, 'rb') as f:
+        data = f.read()
+    assert len(data) > 2 * simulator.TRACE_SYNC_BYTES
+    assert all(data[k] == simulator.TRACE_SYNC
+               for k in range(simulator.TRACE_SYNC_BYTES, len(data), simulator.TRACE_SYNC_BYTES))
+    with open(text, 'rb') as f:
+        assert convert_cli(tmp_path, binary) == f.read()
+
+
+def test_binary_trace_writer_chunks_do_not_change_the_trace(monkeypatch):
+    monkeypatch.setattr(simulator, 'TRACE_SYNC_BYTES', 1024)
+    traces = []
+    for chunk_bytes in (64, 1 << 16):
+        out = io.BytesIO()
+        with BinaryTraceWriter(out, chunk_bytes=chunk_bytes) as trace:
+            sim = Simulator(trace=trace, dump='changed', dump_every=100)
+            sim.load(assemble_image(LOOP), fmt='raw')
+            sim.run(max=1000)
+        traces.append(out.getvalue())
+    assert len(traces[0]) > 4 * 1024
+    assert traces[0] == traces[1]
@@ -0,0 +1,86 @@
+import io
+
+import pytest
+
+import simulator
+import tracediff
+from assembler_project import assemble_image
+from trace_convert import convert
+
+SOURCE = [
+    "addi x5 x0 400",
+    "outer:",
+    "addi x6 x0 20",
+    "inner:",
+    "addi x1 x1 3",
+    "sw x1 0(x0)",
+    "addi x6 x6 -1",
+    "bne x6 x0 inner",
+    "addi x5 x5 -1",
+    "bne x5 x0 outer",
+]
+BLOCK = 4096
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(simulator, 'TRACE_SYNC_BYTES', BLOCK)
+    monkeypatch.setattr(tracediff, 'TRACE_SYNC_BYTES', BLOCK)
+
+
+def write_traces(tmp_path, trace_format):
+    path = str(tmp_path / f'a.{trace_format}')
+    simulator.simulate(assemble_image(SOURCE), path, fmt='raw', max_instr=20000,
+                       trace_format=trace_format, dump='changed', dump_every=5000)
+    return path
+
+
+def record_offsets(data):
+    pos = simulator.TRACE_HEADER.size
+    while pos < len(data):
+        if data[pos] == simulator.TRACE_PAD:
+            pos += 1
+        elif data[pos] == simulator.TRACE_SYNC:
+            pos += simulator.TRACE_SYNC_RECORD.size
+        else:
+            yield pos
+            pos += tracediff.read_record(data, pos)[1]
+
+
+def test_binary_trace_with_sync_records_converts_to_text_trace(tmp_path, small_blocks):
+    data = open(write_traces(tmp_path, 'binary'), 'rb').read()
+    assert len(data) > 10 * BLOCK
+    assert all(data[k] == simulator.TRACE_SYNC for k in range(BLOCK, len(data), BLOCK))
+    out = io.StringIO()
+    with simulator.TraceWriter(out.write) as writer:
+        convert(io.BytesIO(data), writer)
+    assert out.getvalue() == open(write_traces(tmp_path, 'text')).read()
+
+
+# Records whose PC is changed: the first of block 8, the last of block 8
+# and the last of the trace
+@pytest.mark.parametrize('pick', [
+    lambda offsets: min(pos for pos in offsets if pos > 8 * BLOCK),
+    lambda offsets: max(pos for pos in offsets if pos < 9 * BLOCK),
+    lambda offsets: offsets[-1],
+])
+def test_binary_compare_decodes_only_the_differing_block(tmp_path, small_blocks, monkeypatch,
+                                                         pick):
+    path_a = write_traces(tmp_path, 'binary')
+    data = bytearray(open(path_a, 'rb').read())
+    pos = pick(list(record_offsets(data)))
+    data[pos + 1] ^= 0x10
+    path_b = str(tmp_path / 'b.binary')
+    open(path_b, 'wb').write(data)
+
+    starts = []
+    walk_records = tracediff.walk_records
+    monkeypatch.setattr(tracediff, 'walk_records',
+                        lambda m, start, *args: starts.append(start) or walk_records(m, start, *args))
+    report = tracediff.compare(path_a, path_b, context=3)
+    assert starts and min(starts) >= pos - 2 * BLOCK > 0
+
+    # The same report as decoding every record from the start
+    monkeypatch.setattr(tracediff, 'TRACE_SYNC_BYTES', 1 << 60)
+    assert tracediff.compare(path_a, path_b, context=3) == report
+    assert report[0].startswith('first difference at ')
@@ -0,0 +1,50 @@
+"""
+Convert a binary simulator trace (simulator.py --trace-format=binary) back
+into the text trace format, streaming record by record.
+
+Usage: python trace_convert.py input.bin output.txt (use - for stdin/stdout)
+"""
+import sys
+import argparse
+
+from simulator import (STATE_FORMAT, TRACE_STEP, TRACE_WORDS, TraceWriter, format_changed,
+                       read_binary_trace)
+
+
+def convert(src, out: TraceWriter):
+    """
+    Write the text form of every record of the binary trace file src.
+    """
+    for record in read_binary_trace(src):
+        if record[0] == TRACE_STEP:
+            out.append(STATE_FORMAT.format(record[1], *record[2]))
+        elif record[0] == TRACE_WORDS:
+            for i, val in enumerate(record[2]):
+                out.append(format_changed(record[1] + 4 * i, val))
+        else:
+            for val in record[1]:
+                out.append(format(val, '032b'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Binary trace to text converter')
+    parser.add_argument('input', help='Binary trace file (use - for stdin)')
+    parser.add_argument('output', help='Text output file (use - for stdout)')
+    args = parser.parse_args()
+
+    try:
+        src = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    except FileNotFoundError:
+        print(f"Error: Could not open input file '{args.input}'")
+        sys.exit(1)
+
+    try:
+        with src, TraceWriter(args.output) as out:
+            convert(src, out)
+    except ValueError as e:
+        print(f"Error: {args.input}: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
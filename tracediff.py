@@ -0,0 +1,531 @@
+"""
+Trace comparison: find where two simulator traces first diverge and say
+why, in constant memory.
+
+Both files are memory-mapped and compared a chunk at a time by slice
+equality, so identical prefixes go by at memory speed and nothing but the
+current chunk is ever copied; only the chunk holding the first difference
+is narrowed down, by bisection. The first divergent step is then decoded:
+the PC and every register that differ, named and shown in hex and signed
+decimal, or the memory word whose dump line differs, with the last few
+steps before it as context.
+
+Both trace formats of simulator.py are understood: text traces (one line
+of 33 32-bit fields per step, then the memory dump lines) and binary
+traces (--trace-format=binary). Text lines are fixed-size, so the step
+number is found by counting bytes of the common prefix. Binary records
+hold register deltas, but the trace carries the full machine state in a
+sync record at the start of every block of TRACE_SYNC_BYTES, so only the
+records of the block holding the difference are decoded, starting from
+its sync record (traces written before sync records existed are walked
+from the start).
+
+Usage: python tracediff.py a.txt b.txt [--context N] [--memory-map SPEC]
+Exits with 0 if the traces are identical, 1 if they differ and 2 on error.
+"""
+import sys
+import mmap
+import struct
+import argparse
+from collections import deque
+
+from simulator import (DEFAULT_MEMORY_MAP, TRACE_DUMP, TRACE_HEADER, TRACE_MAGIC, TRACE_PAD,
+                       TRACE_STEP, TRACE_SYNC, TRACE_SYNC_BYTES, TRACE_SYNC_RECORD, TRACE_WORDS,
+                       parse_memory_map)
+
+# Bytes compared per slice. Slices this size stay in cache while they are
+# copied and compared; much larger ones run at a fraction of the speed
+CHUNK_BYTES = 1 << 18
+
+# Names of the fields of a state line, in order
+FIELD_NAMES = ('pc',) + tuple(f'x{i}' for i in range(32))
+
+# Line lengths (with the newline) of a state line, a full dump line and a
+# changed-word dump line
+STATE_LINE = 33 * 33
+DUMP_LINE = 33
+CHANGED_LINE = 42
+
+
+def open_map(f):
+    """
+    A read-only mapping of the file object f (bytes for an empty file,
+    which cannot be mapped).
+    """
+    f.seek(0, 2)
+    if f.tell() == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def first_mismatch(a, b, chunk: int = CHUNK_BYTES):
+    """
+    Offset of the first byte at which a and b differ, the length of the
+    shorter one if it is a prefix of the other, or None if they are equal.
+    """
+    n = min(len(a), len(b))
+    pos = 0
+    while pos < n:
+        stop = min(pos + chunk, n)
+        if a[pos:stop] != b[pos:stop]:
+            # Bisect down to the first differing byte
+            while stop - pos > 1:
+                mid = (pos + stop) // 2
+                if a[pos:mid] == b[pos:mid]:
+                    pos = mid
+                else:
+                    stop = mid
+            return pos
+        pos = stop
+    return None if len(a) == len(b) else n
+
+
+def value(val: int) -> str:
+    """
+    A 32-bit value in hex and as a signed number.
+    """
+    return f'0x{val:08x} ({val - (1 << 32) if val & 0x80000000 else val})'
+
+
+def dump_address(memory_map, index: int):
+    """
+    Address of the index-th word of a full memory dump, or None if the
+    dump is shorter.
+    """
+    for _, start, end in memory_map:
+        words = (end + 4 - start) >> 2
+        if index < words:
+            return start + 4 * index
+        index -= words
+    return None
+
+
+# ===== TEXT TRACES =====
+
+def parse_state(line: bytes):
+    """
+    The 33 field values of a state line, or None if line is not one.
+    """
+    if len(line) != STATE_LINE - 1:
+        return None
+    try:
+        return [int(field, 2) for field in line.split(b' ')]
+    except ValueError:
+        return None
+
+
+def count_text(m, end: int, chunk: int = CHUNK_BYTES) -> tuple:
+    """
+    (lines, state lines) in m before offset end, which starts a line.
+    Every state line has 32 spaces, a changed-word line one and a full
+    dump line none, so the byte, newline and space counts give the number
+    of state lines without splitting any line: steps is None if they do
+    not fit a well-formed trace.
+    """
+    lines = spaces = 0
+    for pos in range(0, end, chunk):
+        data = m[pos:min(pos + chunk, end)]
+        lines += data.count(b'\n')
+        spaces += data.count(b' ')
+    # end = 1089 s + 33 d + 42 c, lines = s + d + c and spaces = 32 s + c
+    steps, rest = divmod(end - DUMP_LINE * lines - 9 * spaces, 768)
+    if rest or steps < 0 or spaces < 32 * steps or lines < steps + spaces - 32 * steps:
+        steps = None
+    return lines, steps
+
+
+def line_at(m, start: int) -> bytes:
+    """
+    The line starting at offset start, without its newline.
+    """
+    stop = m.find(b'\n', start)
+    return m[start:stop if stop >= 0 else len(m)]
+
+
+def text_dump_index(m, start: int) -> int:
+    """
+    Index within its dump of the full dump line starting at start: dump
+    lines have no spaces, so the dump begins after the last line that has.
+    """
+    space = m.rfind(b' ', 0, start)
+    first = m.find(b'\n', space) + 1 if space >= 0 else 0
+    return (start - first) // DUMP_LINE
+
+
+def describe_text(m, start: int, memory_map) -> tuple:
+    """
+    (kind, key, values) of the line starting at start: ('state', None,
+    fields), ('dump', address, value), ('changed', address, value),
+    ('end', None, None) past the last line, or ('other', None, line).
+    """
+    if start >= len(m):
+        return 'end', None, None
+    line = line_at(m, start)
+    fields = parse_state(line)
+    if fields is not None:
+        return 'state', None, fields
+    try:
+        if len(line) == DUMP_LINE - 1:
+            return 'dump', dump_address(memory_map, text_dump_index(m, start)), int(line, 2)
+        if len(line) == CHANGED_LINE - 1 and line[8:9] == b' ':
+            return 'changed', int(line[:8], 16), int(line[9:], 2)
+    except ValueError:
+        pass
+    return 'other', None, line
+
+
+def text_context(m, start: int, step, n: int, memory_map) -> list:
+    """
+    Report lines for the n lines before offset start; state lines show
+    the PC and the registers that changed from the state line before.
+    """
+    if not n:
+        return []
+    starts = []
+    pos = start
+    while pos > 0 and len(starts) <= n:
+        pos = m.rfind(b'\n', 0, pos - 1) + 1
+        starts.append(pos)
+    starts.reverse()
+
+    described = [describe_text(m, pos, memory_map) for pos in starts]
+    # The state lines shown are the last ones before start
+    count = sum(1 for kind, _, _ in described[-n:] if kind == 'state')
+    lines = []
+    prev = None
+    for i, (kind, key, val) in enumerate(described):
+        if kind == 'state':
+            changes = [] if prev is None else [f'{FIELD_NAMES[r]}=0x{val[r]:08x}'
+                                              for r in range(1, 33) if val[r] != prev[r]]
+            prev = val
+        if i < len(described) - n:
+            continue
+        if kind == 'state':
+            label = '' if step is None else f'step {step - count + 1}: '
+            count -= 1
+            lines.append(' '.join([f'{label}pc=0x{val[0]:08x}'] + changes))
+        elif kind in ('dump', 'changed'):
+            lines.append(context_word(kind, key, val))
+        else:
+            lines.append(describe(kind, key, val))
+    return lines
+
+
+def text_report(a, b, pos: int, context: int, memory_map) -> list:
+    """
+    Report lines for text traces a and b that first differ at offset pos.
+    """
+    start = a.rfind(b'\n', 0, pos) + 1
+    lines, steps = count_text(a, start)
+    kind_a, key_a, val_a = describe_text(a, start, memory_map)
+    kind_b, key_b, val_b = describe_text(b, start, memory_map)
+
+    where = f'line {lines + 1}'
+    if steps is not None:
+        if 'state' in (kind_a, kind_b):
+            where = f'step {steps + 1} ({where})'
+        elif steps:
+            where += f', in the memory dump after step {steps}'
+    report = [f'first difference at {where}, byte {pos}']
+    if kind_a == kind_b == 'state':
+        report += [f'  {FIELD_NAMES[r]}: {value(val_a[r])} != {value(val_b[r])}'
+                   for r in range(33) if val_a[r] != val_b[r]]
+    elif kind_a == kind_b and kind_a in ('dump', 'changed') and key_a == key_b:
+        report.append(f'  {word_name(kind_a, key_a)}: {value(val_a)} != {value(val_b)}')
+    else:
+        report.append(f'  {describe(kind_a, key_a, val_a)} != {describe(kind_b, key_b, val_b)}')
+    report += context_report(text_context(a, start, steps, context, memory_map))
+    return report
+
+
+# ===== BINARY TRACES =====
+
+def read_record(m, pos: int):
+    """
+    (tag, size, fields) of the binary trace record at pos, or of the first
+    one after it if pos holds padding or a sync record: (pc, mask, values)
+    of a step, the words of a dump record, (addr, words) of a changed-word
+    record. None at the end of the trace; raises ValueError for a cut-off
+    or corrupt record.
+    """
+    while pos < len(m) and m[pos] in (TRACE_PAD, TRACE_SYNC):
+        pos += 1 if m[pos] == TRACE_PAD else TRACE_SYNC_RECORD.size
+    if pos >= len(m):
+        return None
+    tag = m[pos]
+    try:
+        if tag == TRACE_STEP:
+            pc, mask = struct.unpack_from('<II', m, pos + 1)
+            n = bin(mask).count('1')
+            return tag, 9 + 4 * n, (pc, mask, struct.unpack_from(f'<{n}I', m, pos + 9))
+        if tag == TRACE_DUMP:
+            count = struct.unpack_from('<I', m, pos + 1)[0]
+            return tag, 5 + 4 * count, struct.unpack_from(f'<{count}I', m, pos + 5)
+        if tag == TRACE_WORDS:
+            addr, count = struct.unpack_from('<II', m, pos + 1)
+            return tag, 9 + 4 * count, (addr, struct.unpack_from(f'<{count}I', m, pos + 9))
+    except struct.error:
+        raise ValueError(f'binary trace cut off in the record at byte {pos}')
+    raise ValueError(f'corrupt binary trace record tag {tag} at byte {pos}')
+
+
+def scan_binary(m, end: int, n: int) -> tuple:
+    """
+    Decode the records of m that end before offset end, starting from the
+    last sync record before it, or from an earlier one if that leaves
+    fewer than n records. Returns (offset of the first record that does
+    not, steps before it, registers x0-x31 before it, dump words since the
+    last step, deque of the last n records as (offset, step number, dump
+    index)).
+    """
+    block = 0
+    if TRACE_HEADER.unpack_from(m)[1] >= 2:
+        block = (end - 1) // TRACE_SYNC_BYTES * TRACE_SYNC_BYTES
+    while True:
+        scan = walk_records(m, block, end, n)
+        if len(scan[4]) >= n or not block:
+            return scan
+        block -= TRACE_SYNC_BYTES
+
+
+def walk_records(m, start: int, end: int, n: int) -> tuple:
+    """
+    scan_binary() from the sync record at offset start, or from the first
+    record of the trace if start is 0 or holds no sync record.
+    """
+    regs = [0] * 32
+    recent = deque(maxlen=n)
+    steps = dumped = 0
+    pos = TRACE_HEADER.size
+    if start and m[start] == TRACE_SYNC:
+        _, steps, dumped, *regs = TRACE_SYNC_RECORD.unpack_from(m, start)
+        pos = start + TRACE_SYNC_RECORD.size
+    unpack_step = struct.Struct('<II').unpack_from
+    unpack_count = struct.Struct('<I').unpack_from
+    while pos < end:
+        tag = m[pos]
+        if tag == TRACE_STEP:
+            if pos + 9 > end:
+                break
+            pc, mask = unpack_step(m, pos + 1)
+            size = 9 + 4 * bin(mask).count('1')
+            if pos + size > end:
+                break
+            recent.append((pos, steps + 1, 0))
+            val = pos + 9
+            while mask:
+                low = mask & -mask
+                regs[low.bit_length() - 1] = unpack_count(m, val)[0]
+                val += 4
+                mask ^= low
+            steps += 1
+            dumped = 0
+        elif tag == TRACE_DUMP or tag == TRACE_WORDS:
+            head = 5 if tag == TRACE_DUMP else 9
+            if pos + head > end:
+                break
+            size = head + 4 * unpack_count(m, pos + head - 4)[0]
+            if pos + size > end:
+                break
+            recent.append((pos, steps, dumped))
+            if tag == TRACE_DUMP:
+                dumped += (size - head) >> 2
+        elif tag == TRACE_PAD:
+            size = 1
+        elif tag == TRACE_SYNC:
+            size = TRACE_SYNC_RECORD.size
+            if pos + size > end:
+                break
+        else:
+            break
+        pos += size
+    return pos, steps, regs, dumped, recent
+
+
+def apply_step(regs: list, fields: tuple) -> list:
+    """
+    The 33 state fields (PC, x0-x31) after the step record fields.
+    """
+    pc, mask, vals = fields
+    state = [pc] + regs
+    for val in vals:
+        low = mask & -mask
+        state[low.bit_length()] = val
+        mask ^= low
+    return state
+
+
+def describe_binary(record, regs: list, dumped: int, memory_map) -> tuple:
+    """
+    (kind, key, values) of a binary record as describe_text() gives them
+    for the equivalent text line; a dump record becomes the list of its
+    (address, value) words.
+    """
+    if record is None:
+        return 'end', None, None
+    tag, _, fields = record
+    if tag == TRACE_STEP:
+        return 'state', None, apply_step(regs, fields)
+    if tag == TRACE_DUMP:
+        return 'dump', None, [(dump_address(memory_map, dumped + i), val) for i, val in enumerate(fields)]
+    return 'changed', None, [(fields[0] + 4 * i, val) for i, val in enumerate(fields[1])]
+
+
+def binary_context(m, recent, memory_map) -> list:
+    """
+    Report lines for the records in recent: steps show the PC and the
+    registers they changed, dump records their words.
+    """
+    lines = []
+    for pos, step, dumped in recent:
+        tag, _, fields = read_record(m, pos)
+        if tag == TRACE_STEP:
+            pc, mask, vals = fields
+            changes = []
+            for val in vals:
+                low = mask & -mask
+                changes.append(f'{FIELD_NAMES[low.bit_length()]}=0x{val:08x}')
+                mask ^= low
+            lines.append(' '.join([f'step {step}: pc=0x{pc:08x}'] + changes))
+        elif tag == TRACE_DUMP:
+            lines += [context_word('dump', dump_address(memory_map, dumped + i), val)
+                      for i, val in enumerate(fields)]
+        else:
+            lines += [context_word('changed', fields[0] + 4 * i, val) for i, val in enumerate(fields[1])]
+    return lines
+
+
+def binary_report(a, b, pos: int, context: int, memory_map) -> list:
+    """
+    Report lines for binary traces a and b that first differ at offset pos.
+    """
+    start, steps, regs, dumped, recent = scan_binary(a, pos, context)
+    kind_a, _, val_a = describe_binary(read_record(a, start), regs, dumped, memory_map)
+    kind_b, _, val_b = describe_binary(read_record(b, start), regs, dumped, memory_map)
+
+    where = f'record at byte {start}'
+    if 'state' in (kind_a, kind_b):
+        where = f'step {steps + 1} ({where})'
+    elif steps:
+        where += f', in the memory dump after step {steps}'
+    report = [f'first difference at {where}']
+    lines = binary_context(a, recent, memory_map)
+    if kind_a == kind_b == 'state':
+        report += [f'  {FIELD_NAMES[r]}: {value(val_a[r])} != {value(val_b[r])}'
+                   for r in range(33) if val_a[r] != val_b[r]]
+    elif kind_a == kind_b and kind_a in ('dump', 'changed'):
+        for (addr_a, word_a), (addr_b, word_b) in zip(val_a, val_b):
+            if addr_a == addr_b and word_a == word_b:
+                # Words of the record before the difference are context too
+                lines.append(context_word(kind_a, addr_a, word_a))
+                continue
+            if addr_a != addr_b:
+                report.append(f'  {word_name(kind_a, addr_a)} != {word_name(kind_b, addr_b)}')
+                break
+            if word_a != word_b:
+                report.append(f'  {word_name(kind_a, addr_a)}: {value(word_a)} != {value(word_b)}')
+                break
+        else:
+            report.append(f'  {describe(kind_a, None, val_a)} != {describe(kind_b, None, val_b)}')
+    else:
+        report.append(f'  {describe(kind_a, None, val_a)} != {describe(kind_b, None, val_b)}')
+    report += context_report(lines[len(lines) - context:] if context else [])
+    return report
+
+
+# ===== REPORTS =====
+
+def word_name(kind: str, addr) -> str:
+    if addr is None:
+        return 'dump word past the memory map'
+    return f"{'dump' if kind == 'dump' else 'changed'} word 0x{addr:08x}"
+
+
+def context_word(kind: str, addr, val: int) -> str:
+    return f'{word_name(kind, addr)} = 0x{val:08x}'
+
+
+def describe(kind: str, key, val) -> str:
+    """
+    What one side has where the traces differ.
+    """
+    if kind == 'end':
+        return 'end of trace'
+    if kind == 'state':
+        return f'step with pc {value(val[0])}'
+    if kind in ('dump', 'changed'):
+        if isinstance(val, list):
+            first = val[0][0] if val else None
+            return f'{kind} record of {len(val)} words' + (f' from 0x{first:08x}' if first is not None else '')
+        return f'{word_name(kind, key)} = {value(val)}'
+    text = val[:40].decode('ascii', 'replace')
+    return f"malformed line '{text}{'...' if len(val) > 40 else ''}'"
+
+
+def context_report(lines: list) -> list:
+    if not lines:
+        return []
+    return [f'last {len(lines)} entries before it:'] + [f'  {line}' for line in lines]
+
+
+def compare(path_a: str, path_b: str, context: int = 5, memory_map=DEFAULT_MEMORY_MAP,
+            chunk: int = CHUNK_BYTES):
+    """
+    Compare two trace files. Returns None if they are identical, else the
+    report lines for their first difference. Raises ValueError if they are
+    not traces of the same format.
+    """
+    with open(path_a, 'rb') as fa, open(path_b, 'rb') as fb:
+        a, b = open_map(fa), open_map(fb)
+        try:
+            binary = [m[:len(TRACE_MAGIC)] == TRACE_MAGIC for m in (a, b)]
+            if binary[0] != binary[1]:
+                raise ValueError('one trace is binary and the other text')
+            pos = first_mismatch(a, b, chunk)
+            if pos is None:
+                return None
+            if binary[0]:
+                return binary_report(a, b, max(pos, TRACE_HEADER.size), context, memory_map)
+            return text_report(a, b, pos, context, memory_map)
+        finally:
+            for m in (a, b):
+                if isinstance(m, mmap.mmap):
+                    m.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulator trace comparator')
+    parser.add_argument('a', help='First trace file (text or binary)')
+    parser.add_argument('b', help='Second trace file, in the same format')
+    parser.add_argument('--context', type=int, default=5,
+                      help='Steps of context to show before the difference (default: 5)')
+    parser.add_argument('--memory-map', default=None,
+                      help='Memory segments as name=start:end,... (to name dump words)')
+    args = parser.parse_args()
+    if args.context < 0:
+        parser.error('--context must not be negative')
+    try:
+        memory_map = parse_memory_map(args.memory_map) if args.memory_map else DEFAULT_MEMORY_MAP
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        report = compare(args.a, args.b, args.context, memory_map)
+    except FileNotFoundError as e:
+        print(f"Error: Could not open input file '{e.filename}'")
+        sys.exit(2)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+
+    if report is None:
+        print(f'{args.a} and {args.b} are identical')
+        sys.exit(0)
+    print(f'{args.a} and {args.b} differ')
+    for line in report:
+        print(line)
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()